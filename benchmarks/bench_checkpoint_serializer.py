@@ -0,0 +1,162 @@
+"""
+Benchmark of the checkpoint serializers (CHECKPOINT_SERIALIZER).
+
+For each serializer it runs the same interview turns against the local fake
+OpenAI server (which returns Azure-like token usage and content filter
+annotations) and reports:
+    - bytes of the messages channel in the latest checkpoint
+    - bytes stored for the whole thread
+    - time to read every checkpoint back through get_checkpoints
+    - encode / decode throughput of the messages channel
+
+Serializers:
+    default       LangGraph JsonPlusSerializer (msgpack)
+    compact       CompactSerializer without compression (message metadata dropped)
+    compact+zstd  CompactSerializer compressing payloads of --threshold bytes or more
+                  (skipped when the zstandard package is not installed)
+
+It also checks that the compact serializer reads a thread written by the
+default one. Checkpoints go to the local Postgres configured in POSTGRES_*
+(--store postgres) or to an in-memory checkpointer (--store memory).
+
+Usage:
+    python benchmarks/bench_checkpoint_serializer.py [--turns 8] [--reads 20] [--store memory|postgres]
+        [--threshold 2048] [--iterations 2000]
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import run_fake_openai
+from bench_endpoints import configure_env, use_memory_store, use_postgres_store
+from bench_checkpoint_size import run_turns, thread_bytes
+
+SERIALIZERS = ("default", "compact", "compact+zstd")
+
+def zstd_available():
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def configure_serializer(name, args):
+    os.environ["CHECKPOINT_SERIALIZER"] = "default" if name == "default" else "compact"
+    os.environ["CHECKPOINT_COMPRESSION_THRESHOLD"] = str(args.threshold if name == "compact+zstd" else 0)
+
+async def open_store(args):
+    """Builds a checkpointer with the configured serializer."""
+    if args.store == "memory":
+        await use_memory_store()
+        return
+    from db_connection import reset_db_connection
+    from interview_flow import clear_graph_cache
+    # The shared checkpointer keeps the serializer it was created with
+    await reset_db_connection()
+    clear_graph_cache()
+    await use_postgres_store()
+
+def throughput(function, payload, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(payload)
+    return iterations / (time.perf_counter() - start)
+
+async def measure(name, args):
+    configure_serializer(name, args)
+    await open_store(args)
+    # Imported after open_store, which replaces get_shared_db_connection in memory runs
+    from interview_flow import get_checkpoints, get_shared_db_connection
+    thread_id = f"serde-{name}-{uuid.uuid4().hex[:8]}"
+    await run_turns(thread_id, args.turns)
+
+    checkpointer, pool = await get_shared_db_connection()
+    latest = await checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+    messages = latest.checkpoint["channel_values"]["messages"]
+    encoded = checkpointer.serde.dumps_typed(messages)
+
+    reads = []
+    for _ in range(args.reads):
+        start = time.perf_counter()
+        await get_checkpoints(thread_id)
+        reads.append(time.perf_counter() - start)
+
+    return {
+        "serializer": name,
+        "thread_id": thread_id,
+        "type": encoded[0],
+        "latest_messages_bytes": len(encoded[1]),
+        "thread_bytes": await thread_bytes(checkpointer, pool, thread_id),
+        "read_ms": statistics.median(reads) * 1000,
+        "encode_per_s": throughput(checkpointer.serde.dumps_typed, messages, args.iterations),
+        "decode_per_s": throughput(checkpointer.serde.loads_typed, encoded, args.iterations),
+    }
+
+async def check_compatibility(results, args):
+    """Reads the thread written by the default serializer with the compact one."""
+    from interview_flow import get_checkpoints
+
+    written = next((result for result in results if result["serializer"] == "default"), None)
+    if written is None or args.store == "memory":
+        # Each memory run has its own store, the default thread is gone
+        return None
+    configure_serializer("compact+zstd" if zstd_available() else "compact", args)
+    await open_store(args)
+    result = await get_checkpoints(written["thread_id"])
+    return result["status"] == "success" and len(result["checkpoints"]) > 0
+
+def print_report(results, compatible):
+    print(f"\n{'serializer':<14}{'type':<14}{'latest msgs':>12}{'thread':>11}{'read p50':>10}{'encode/s':>10}{'decode/s':>10}")
+    for result in results:
+        print(f"{result['serializer']:<14}{result['type']:<14}{result['latest_messages_bytes']:>10} B"
+              f"{result['thread_bytes'] / 1024:>8.1f} KB{result['read_ms']:>8.1f} ms"
+              f"{result['encode_per_s']:>10.0f}{result['decode_per_s']:>10.0f}")
+
+    baseline = results[0]
+    for result in results[1:]:
+        saved = 1 - result["thread_bytes"] / baseline["thread_bytes"]
+        print(f"{result['serializer']}: {saved:.0%} less stored per thread than {baseline['serializer']}")
+    if compatible is not None:
+        print(f"compact serializer reads the default thread: {'yes' if compatible else 'NO'}")
+
+async def main_async(args):
+    async with run_fake_openai() as (fake, base_url):
+        configure_env(base_url, args.store)
+        import interview_flow  # noqa: F401 (reads the environment on import)
+        logging.getLogger().setLevel(logging.WARNING)
+
+        results = []
+        for name in args.serializers.split(","):
+            if name == "compact+zstd" and not zstd_available():
+                print("compact+zstd skipped: the zstandard package is not installed")
+                continue
+            results.append(await measure(name, args))
+        compatible = await check_compatibility(results, args)
+        print_report(results, compatible)
+
+        from llm_clients import close_clients
+        from db_connection import close_db_connection
+        await close_clients()
+        await close_db_connection()
+    return 1 if compatible is False else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=8, help="interview turns per thread")
+    parser.add_argument("--reads", type=int, default=20, help="get_checkpoints calls timed per thread")
+    parser.add_argument("--iterations", type=int, default=2000, help="encode/decode calls timed per serializer")
+    parser.add_argument("--threshold", type=int, default=2048, help="compression threshold of compact+zstd in bytes")
+    parser.add_argument("--serializers", default=",".join(SERIALIZERS), help=f"comma separated, from: {', '.join(SERIALIZERS)}")
+    parser.add_argument("--store", choices=("memory", "postgres"), default="memory")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark of the checkpoint storage used by an interview thread.
+
+Runs the same interview turns against the local fake OpenAI server once per
+mode and reports, for one thread:
+    - bytes of the messages channel in the latest checkpoint
+    - bytes stored for the whole thread (checkpoints, channel blobs and pending writes)
+    - time to read every checkpoint back through get_checkpoints
+
+Modes:
+    stored   the interviewer system prompt is kept in the messages (CHECKPOINT_SYSTEM_PROMPTS=true)
+    rebuilt  the prompt is rebuilt on every turn and only the conversation is stored
+    migrated a thread started in "stored" mode that continues in "rebuilt" mode
+
+Checkpoints go to the local Postgres configured in POSTGRES_* (--store postgres)
+or to an in-memory checkpointer (--store memory, no database needed).
+
+Usage:
+    python benchmarks/bench_checkpoint_size.py [--turns 8] [--reads 20] [--store memory|postgres]
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import run_fake_openai
+from bench_endpoints import configure_env, use_memory_store, use_postgres_store, QUESTION
+
+MODES = ("stored", "rebuilt", "migrated")
+
+# Bytes stored for a thread in the Postgres checkpointer tables
+THREAD_BYTES_SQL = """
+    SELECT
+        (SELECT coalesce(sum(pg_column_size(checkpoint) + pg_column_size(metadata)), 0)
+            FROM checkpoints WHERE thread_id = %(thread_id)s)
+      + (SELECT coalesce(sum(octet_length(blob)), 0)
+            FROM checkpoint_blobs WHERE thread_id = %(thread_id)s)
+      + (SELECT coalesce(sum(octet_length(blob)), 0)
+            FROM checkpoint_writes WHERE thread_id = %(thread_id)s) AS bytes
+"""
+
+def bytes_in(value):
+    """Total length of the serialized payloads found in a MemorySaver entry."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(bytes_in(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(bytes_in(item) for item in value)
+    return 0
+
+async def thread_bytes(checkpointer, pool, thread_id):
+    if pool is not None:
+        async with pool.connection() as conn:
+            row = await (await conn.execute(THREAD_BYTES_SQL, {"thread_id": thread_id})).fetchone()
+        return int(row["bytes"])
+    return (
+        bytes_in(checkpointer.storage.get(thread_id, {}))
+        + sum(bytes_in(value) for key, value in checkpointer.blobs.items() if key[0] == thread_id)
+        + sum(bytes_in(value) for key, value in checkpointer.writes.items() if key[0] == thread_id)
+    )
+
+async def run_turns(thread_id, turns, start=0):
+    from interview_flow import run_interview_async
+
+    for index in range(start, start + turns):
+        result = await run_interview_async(
+            question=QUESTION,
+            user_data={"user_name": "Ana"},
+            user_response=f"I take the bus, it takes {20 + index} minutes" if index else None,
+            thread_id=thread_id,
+            description="urban mobility",
+            language="en",
+        )
+        if result["status"] != "success":
+            raise RuntimeError(f"Turn {index} failed: {result.get('message')}")
+
+def set_mode(stored):
+    os.environ["CHECKPOINT_SYSTEM_PROMPTS"] = "true" if stored else "false"
+
+async def measure(mode, args):
+    from langchain_core.messages import SystemMessage
+    from interview_flow import get_checkpoints, get_shared_db_connection
+
+    thread_id = f"size-{mode}-{uuid.uuid4().hex[:8]}"
+    if mode == "migrated":
+        set_mode(True)
+        await run_turns(thread_id, args.turns // 2)
+        set_mode(False)
+        await run_turns(thread_id, args.turns - args.turns // 2, start=args.turns // 2)
+    else:
+        set_mode(mode == "stored")
+        await run_turns(thread_id, args.turns)
+
+    checkpointer, pool = await get_shared_db_connection()
+    latest = await checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+    messages = latest.checkpoint["channel_values"]["messages"]
+    _, messages_blob = checkpointer.serde.dumps_typed(messages)
+
+    reads = []
+    for _ in range(args.reads):
+        start = time.perf_counter()
+        result = await get_checkpoints(thread_id)
+        reads.append(time.perf_counter() - start)
+
+    return {
+        "mode": mode,
+        "checkpoints": len(result["checkpoints"]),
+        "messages": len(messages),
+        "system_messages": sum(1 for msg in messages if isinstance(msg, SystemMessage)),
+        "latest_messages_bytes": len(messages_blob),
+        "thread_bytes": await thread_bytes(checkpointer, pool, thread_id),
+        "read_ms": statistics.median(reads) * 1000,
+    }
+
+def print_report(results):
+    print(f"\n{'mode':<10}{'checkpoints':>12}{'messages':>10}{'system':>8}{'latest msgs':>13}{'thread':>11}{'read p50':>10}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['checkpoints']:>12}{result['messages']:>10}{result['system_messages']:>8}"
+              f"{result['latest_messages_bytes']:>11} B{result['thread_bytes'] / 1024:>8.1f} KB{result['read_ms']:>8.1f} ms")
+
+    baseline = results[0]
+    for result in results[1:]:
+        saved = 1 - result["thread_bytes"] / baseline["thread_bytes"]
+        print(f"{result['mode']}: {saved:.0%} less stored per thread than {baseline['mode']}")
+
+async def main_async(args):
+    async with run_fake_openai() as (fake, base_url):
+        configure_env(base_url, args.store)
+        import interview_flow  # noqa: F401 (reads the environment on import)
+        logging.getLogger().setLevel(logging.WARNING)
+
+        if args.store == "memory":
+            await use_memory_store()
+        else:
+            await use_postgres_store()
+
+        results = []
+        for mode in args.modes.split(","):
+            results.append(await measure(mode, args))
+        print_report(results)
+
+        from llm_clients import close_clients
+        from db_connection import close_db_connection
+        await close_clients()
+        await close_db_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=8, help="interview turns per thread")
+    parser.add_argument("--reads", type=int, default=20, help="get_checkpoints calls timed per thread")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma separated, from: {', '.join(MODES)}")
+    parser.add_argument("--store", choices=("memory", "postgres"), default="memory")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Concurrency check for the async interview graph.
+
+Runs many interview turns at once against the local fake OpenAI server (in a
+child process) while a heartbeat task measures event loop lag. If the nodes
+blocked the loop while waiting on the LLM, the turns would run one after the
+other and take about turns x single turn. With async nodes the upstream waits
+overlap and the remaining time is the client-side CPU per turn.
+The turns start over --ramp seconds, as requests would arrive, rather than all
+in the same loop iteration. The default upstream latency is Azure-like; with
+much faster fake completions the loop lag measures CPU saturation (every turn
+ready at once) rather than blocking calls.
+Exits with status 1 when the turns were serialized or the loop lagged more
+than --max-lag-ms.
+
+Usage:
+    python benchmarks/bench_concurrency.py [--turns 200] [--latency 2.0] [--ramp 2.0] [--max-lag-ms 250]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from fake_openai import spawn_fake_openai
+
+def configure_env(base_url):
+    """Points every Azure OpenAI client at the fake server."""
+    os.environ["AZURE_OPENAI_ENDPOINT"] = base_url
+    os.environ["AZURE_OPEN_AI_ENDPOINT"] = base_url
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake-key")
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+    os.environ.setdefault("AZURE_DEPLOYMENT_NAME", "fake-deployment")
+
+def initial_state(index):
+    return {
+        "messages": [HumanMessage(content=f"My answer number {index}")],
+        "current_question": {
+            "question": "How do you usually commute to work?",
+            "context": "Means of transport, duration and cost",
+            "question_number": 1,
+            "total_questions": 3,
+        },
+        "is_complete": False,
+        "validation_result": "",
+        "user_data": {"user_name": "Ana"},
+        "description": "urban mobility",
+        "language": "en",
+    }
+
+async def heartbeat(interval, lags, stop):
+    """Records how late each tick wakes up compared to the requested interval."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run_turn(graph, index, delay=0.0):
+    await asyncio.sleep(delay)
+    config = {"configurable": {"thread_id": f"bench-{index}"}}
+    async for _ in graph.astream(initial_state(index), config):
+        pass
+
+async def main_async(args):
+    async with spawn_fake_openai(latency=args.latency, jitter=args.jitter) as base_url:
+        configure_env(base_url)
+
+        from interview_flow import get_interview_graph
+        logging.getLogger().setLevel(logging.WARNING)
+        graph = get_interview_graph(checkpointer=MemorySaver())
+
+        # One turn alone as the reference
+        start = time.perf_counter()
+        await run_turn(graph, -1)
+        single = time.perf_counter() - start
+
+        lags = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(heartbeat(0.01, lags, stop))
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        await asyncio.gather(*(run_turn(graph, i, args.ramp * i / args.turns) for i in range(args.turns)))
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+
+        stop.set()
+        await monitor
+
+    max_lag = max(lags) * 1000 if lags else 0.0
+    print(f"concurrent turns:      {args.turns}")
+    print(f"single turn:           {single:.2f} s")
+    print(f"all turns:             {elapsed:.2f} s (serialized would be ~{single * args.turns:.0f} s, "
+          f"{elapsed / (single * args.turns):.1%} of it)")
+    print(f"CPU per turn:          {cpu / args.turns * 1000:.1f} ms")
+    print(f"max event loop lag:    {max_lag:.1f} ms")
+
+    # Serialized execution would take turns * single, allow generous headroom
+    serialized = elapsed > single * args.turns * args.max_serial_ratio
+    if serialized:
+        print("FAIL: turns ran one after the other")
+    blocked = max_lag > args.max_lag_ms
+    if blocked:
+        print("FAIL: event loop was blocked")
+    return 1 if serialized or blocked else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=2.0, help="fake upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="random extra upstream latency in seconds")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which the turns start")
+    parser.add_argument("--max-lag-ms", type=float, default=250.0, help="fail when the event loop lags more than this")
+    parser.add_argument("--max-serial-ratio", type=float, default=0.2,
+                        help="fail when wall time exceeds this fraction of the serialized time")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
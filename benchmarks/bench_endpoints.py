@@ -0,0 +1,332 @@
+"""
+End-to-end benchmark of the HTTP functions, without Azure.
+
+Calls the function handlers of function_app.py directly (the same Request /
+Response objects the Functions host uses) against the local fake OpenAI server,
+which runs in a child process and can inject 429 and content_filter errors.
+Checkpoints go to the local Postgres configured in POSTGRES_* (--store postgres)
+or to an in-memory checkpointer (--store memory, no database needed).
+
+For every endpoint it reports latency percentiles, time to first byte of the
+body (TTFT for the streaming endpoints), requests per second, status codes and
+database round trips per request.
+
+Usage:
+    python benchmarks/bench_endpoints.py [--endpoints all] [--requests 200] [--concurrency 20]
+        [--store memory|postgres] [--latency 0.3] [--token-latency 0.01]
+        [--rate-429 0.05] [--content-filter-rate 0.01]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import spawn_fake_openai
+
+ENDPOINTS = ("interview_chat", "checkpoints", "interview-gpt-openai", "chat_ia_interview")
+
+QUESTION = {
+    "question": "How do you usually commute to work?",
+    "context": "Means of transport, duration and cost",
+    "question_number": 1,
+    "total_questions": 3,
+}
+
+def configure_env(base_url, store):
+    """Points every Azure OpenAI client at the fake server (and keeps Postgres out of memory runs)."""
+    os.environ["AZURE_OPENAI_ENDPOINT"] = base_url
+    os.environ["AZURE_OPEN_AI_ENDPOINT"] = base_url
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake-key")
+    os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+    os.environ.setdefault("AZURE_OPENAI_API_INSTANCE_NAME", "fake-instance")
+    os.environ.setdefault("AZURE_OPENAI_API_BASE_PATH", "fake-path")
+    os.environ.setdefault("AZURE_DEPLOYMENT_NAME", "fake-deployment")
+    if store == "memory":
+        os.environ["RESPONSE_CACHE_POSTGRES"] = "false"
+        os.environ["INTERVIEW_CONTEXT_POSTGRES"] = "false"
+
+class RoundTripCounter:
+    """
+    Counts database round trips: every statement sent outside a pipeline, plus
+    one per pipeline (its statements are sent together).
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        import psycopg
+        counter = self
+        execute = psycopg.AsyncCursor.execute
+        executemany = psycopg.AsyncCursor.executemany
+        pipeline = psycopg.AsyncConnection.pipeline
+
+        async def counted_execute(cursor, *args, **kwargs):
+            if cursor.connection._pipeline is None:
+                counter.count += 1
+            return await execute(cursor, *args, **kwargs)
+
+        async def counted_executemany(cursor, *args, **kwargs):
+            if cursor.connection._pipeline is None:
+                counter.count += 1
+            return await executemany(cursor, *args, **kwargs)
+
+        def counted_pipeline(connection):
+            if connection._pipeline is None:
+                counter.count += 1
+            return pipeline(connection)
+
+        psycopg.AsyncCursor.execute = counted_execute
+        psycopg.AsyncCursor.executemany = counted_executemany
+        psycopg.AsyncConnection.pipeline = counted_pipeline
+
+async def use_memory_store():
+    """Runs the interview graph on an in-memory checkpointer instead of Postgres."""
+    from langgraph.checkpoint.memory import MemorySaver
+    from checkpoint_serializer import get_checkpoint_serializer
+    import interview_flow
+    checkpointer = MemorySaver(serde=get_checkpoint_serializer())
+
+    async def get_memory_connection():
+        return checkpointer, None
+
+    interview_flow.get_shared_db_connection = get_memory_connection
+
+async def use_postgres_store():
+    """Opens the shared pool and creates the checkpoint tables if needed."""
+    from db_connection import get_shared_db_connection
+    checkpointer, _ = await get_shared_db_connection()
+    await checkpointer.setup()
+
+def make_request(method, path, body=None, query=None):
+    """Builds the Request object the Functions host passes to the handlers."""
+    from urllib.parse import urlencode
+    from azurefunctions.extensions.http.fastapi import Request
+
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # Like the server, block until the client disconnects (it never does here)
+        await asyncio.Event().wait()
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": f"/api/{path}",
+        "query_string": urlencode(query or {}).encode("utf-8"),
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+def interview_data(participants):
+    return [
+        {
+            "participant": f"P{index}",
+            "answers": [
+                {"question": QUESTION["question"], "answer": f"I take the bus, it takes {20 + index % 40} minutes and costs {index % 5 + 1} dollars."},
+                {"question": "What would improve your commute?", "answer": "More frequent buses and safer bike lanes."},
+            ],
+        }
+        for index in range(participants)
+    ]
+
+class Workload:
+    """Builds the request for each endpoint and call number."""
+
+    def __init__(self, args):
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.data = interview_data(args.participants)
+
+    def thread_id(self, index):
+        return f"bench-{self.run_id}-{index % self.args.threads}"
+
+    def request(self, endpoint, index):
+        import function_app
+
+        if endpoint == "interview_chat":
+            body = {
+                "thread_id": self.thread_id(index),
+                "question": QUESTION,
+                "user_data": {"user_name": "Ana"},
+                "user_response": f"I take the bus, answer {index}",
+                "description": "urban mobility",
+                "language": "en",
+                "stream": self.args.stream,
+            }
+            return function_app.run_interview, make_request("POST", endpoint, body)
+
+        if endpoint == "checkpoints":
+            query = {"thread_id": self.thread_id(index)}
+            if self.args.checkpoint_limit:
+                query["limit"] = self.args.checkpoint_limit
+            return function_app.get_interview_checkpoints, make_request("GET", endpoint, query=query)
+
+        if endpoint == "interview-gpt-openai":
+            body = {"prompt": f"Summarize the interview results of participant {index}", "temperature": self.args.temperature}
+            return function_app.stream_openai_text, make_request("POST", endpoint, body)
+
+        body = {
+            "inputUser": f"How long is the commute of participant P{index % self.args.participants}?",
+            "interviewData": self.data,
+            "messageHistory": [
+                {"role": "user", "content": "How do most participants commute?"},
+                {"role": "assistant", "content": "Most of them take the bus."},
+            ],
+            "temperature": self.args.temperature,
+        }
+        return function_app.chat_ia_interview, make_request("POST", endpoint, body)
+
+async def timed_call(handler, request):
+    """
+    Runs a handler and reads its whole body.
+
+    Returns:
+        tuple: (status code, seconds to first body chunk, total seconds)
+    """
+    start = time.perf_counter()
+    response = await handler(request)
+    first = None
+    if hasattr(response, "body_iterator"):
+        async for _ in response.body_iterator:
+            if first is None:
+                first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return response.status_code, first if first is not None else total, total
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+async def run_endpoint(workload, endpoint, args, counter):
+    """Sends args.requests calls to an endpoint, args.concurrency at a time."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, ttfts, statuses = [], [], {}
+
+    async def one(index):
+        async with semaphore:
+            handler, request = workload.request(endpoint, index)
+            try:
+                status, ttft, total = await timed_call(handler, request)
+            except Exception as e:
+                logging.error(f"{endpoint} call failed: {str(e)}")
+                status, ttft, total = "exception", 0.0, 0.0
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(total)
+                ttfts.append(ttft)
+
+    round_trips = counter.count
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    round_trips = counter.count - round_trips
+
+    return {
+        "endpoint": endpoint,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "statuses": statuses,
+        "rps": args.requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "ttft_p50_ms": percentile(ttfts, 50) * 1000,
+        "ttft_p95_ms": percentile(ttfts, 95) * 1000,
+        "db_round_trips_per_request": round_trips / args.requests,
+    }
+
+def print_report(result):
+    print(f"\n{result['endpoint']}  ({result['requests']} requests, concurrency {result['concurrency']})")
+    print(f"  statuses:              {result['statuses']}")
+    print(f"  requests per second:   {result['rps']:.1f}")
+    print(f"  latency p50/p95/p99:   {result['p50_ms']:.0f} / {result['p95_ms']:.0f} / {result['p99_ms']:.0f} ms")
+    print(f"  first byte p50/p95:    {result['ttft_p50_ms']:.0f} / {result['ttft_p95_ms']:.0f} ms")
+    print(f"  DB round trips/request: {result['db_round_trips_per_request']:.1f}")
+
+async def main_async(args):
+    endpoints = ENDPOINTS if args.endpoints == "all" else tuple(args.endpoints.split(","))
+    fake_options = dict(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        content_filter_rate=args.content_filter_rate,
+    )
+
+    async with spawn_fake_openai(**fake_options) as base_url:
+        configure_env(base_url, args.store)
+        counter = RoundTripCounter()
+        counter.install()
+
+        import function_app  # noqa: F401 (reads the environment on import)
+        logging.getLogger().setLevel(logging.WARNING)
+
+        if args.store == "memory":
+            await use_memory_store()
+        else:
+            await use_postgres_store()
+
+        workload = Workload(args)
+        if "checkpoints" in endpoints and "interview_chat" not in endpoints:
+            # Give every thread some history to read
+            seed = argparse.Namespace(**{**vars(args), "requests": args.threads})
+            await run_endpoint(workload, "interview_chat", seed, RoundTripCounter())
+
+        results = []
+        for endpoint in endpoints:
+            results.append(await run_endpoint(workload, endpoint, args, counter))
+
+        for result in results:
+            print_report(result)
+
+        from rate_limiter import get_rate_limit_stats
+        print(f"\nrate limiter: {get_rate_limit_stats()}")
+
+        from llm_clients import close_clients
+        from db_connection import close_db_connection
+        await close_clients()
+        await close_db_connection()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="all", help=f"comma separated, from: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--store", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--threads", type=int, default=50, help="interview threads the turns are spread over")
+    parser.add_argument("--stream", action="store_true", help="use the streaming mode of interview_chat")
+    parser.add_argument("--checkpoint-limit", type=int, default=0, help="limit parameter of the checkpoints calls")
+    parser.add_argument("--participants", type=int, default=200, help="participants in interviewData")
+    parser.add_argument("--temperature", type=float, default=0.7, help="temperature of the result endpoints")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake upstream latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--jitter", type=float, default=0.1, help="random extra upstream latency in seconds")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of upstream calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the 429 responses in seconds")
+    parser.add_argument("--content-filter-rate", type=float, default=0.0,
+                        help="fraction of upstream calls rejected by the content filter")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
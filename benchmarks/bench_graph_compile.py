@@ -0,0 +1,46 @@
+"""
+Micro-benchmark: per-request cost of building the interview graph versus
+reusing the cached compiled graph.
+
+Usage:
+    python benchmarks/bench_graph_compile.py [--iterations 200]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langgraph.checkpoint.memory import MemorySaver
+from interview_flow import build_graph, get_interview_graph, clear_graph_cache
+
+def measure(fn, iterations):
+    """Returns the average CPU time per call in milliseconds."""
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) * 1000 / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    checkpointer = MemorySaver()
+    clear_graph_cache()
+
+    # Warm up imports and the cache
+    build_graph(checkpointer)
+    get_interview_graph(checkpointer=checkpointer)
+
+    uncached = measure(lambda: build_graph(checkpointer), args.iterations)
+    cached = measure(lambda: get_interview_graph(checkpointer=checkpointer), args.iterations)
+
+    print(f"iterations:             {args.iterations}")
+    print(f"build_graph per call:   {uncached:.3f} ms CPU")
+    print(f"cached graph per call:  {cached:.4f} ms CPU")
+    print(f"saved per request:      {uncached - cached:.3f} ms CPU")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark of speculative execution (INTERVIEW_SPECULATIVE).
+
+Runs the same interview turns against the local fake OpenAI server with
+speculation off and on and reports the median turn time and the hit rate.
+Incremental validation summaries and the coverage rubric are enabled, so the
+turns also exercise the state that validate_response writes.
+
+It also checks that a turn leaves the same validation state in both modes:
+a committed speculative result must not replace what validation wrote
+(coverage rubric and covered aspects, conversation summary, is_complete,
+validation_result). Exits with status 1 when the states differ.
+
+Usage:
+    python benchmarks/bench_speculation.py [--turns 8] [--threads 5] [--latency 0.3]
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import run_fake_openai
+from bench_endpoints import configure_env, use_memory_store, QUESTION
+
+MODES = ("off", "on")
+
+# Channels written by validate_response, compared between modes
+STATE_KEYS = (
+    "is_complete",
+    "validation_result",
+    "coverage_rubric",
+    "rubric_hash",
+    "covered_aspects",
+    "conversation_summary",
+    "coverage_notes",
+    "summarized_count",
+    "summary_hash",
+)
+
+VALIDATION_REPLY = "INCOMPLETE: the participant has not said how much the trip costs.\nCOVERED: 1"
+
+def configure_features():
+    os.environ["VALIDATION_SUMMARY_ENABLED"] = "true"
+    os.environ["VALIDATION_SUMMARY_THRESHOLD"] = "4"
+    os.environ["VALIDATION_SUMMARY_KEEP_RECENT"] = "2"
+    os.environ["COVERAGE_RUBRIC_ENABLED"] = "true"
+
+async def run_thread(thread_id, turns):
+    """Runs the turns of a thread, returning their times and the state after each one."""
+    from interview_flow import run_interview_async, get_shared_db_connection
+
+    checkpointer, _ = await get_shared_db_connection()
+    times, states = [], []
+    for index in range(turns):
+        start = time.perf_counter()
+        result = await run_interview_async(
+            question=QUESTION,
+            user_data={"user_name": "Ana"},
+            user_response=f"I take the bus, it takes {20 + index} minutes" if index else None,
+            thread_id=thread_id,
+            description="urban mobility",
+            language="en",
+        )
+        times.append(time.perf_counter() - start)
+        if result["status"] != "success":
+            raise RuntimeError(f"Turn {index} failed: {result.get('message')}")
+
+        latest = await checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+        values = latest.checkpoint["channel_values"]
+        states.append({key: values.get(key) for key in STATE_KEYS})
+    return times, states
+
+async def measure(mode, args):
+    from interview_flow import speculation_stats
+
+    os.environ["INTERVIEW_SPECULATIVE"] = "true" if mode == "on" else "false"
+    before = dict(speculation_stats)
+    runs = await asyncio.gather(*(
+        run_thread(f"spec-{mode}-{uuid.uuid4().hex[:8]}", args.turns) for _ in range(args.threads)
+    ))
+    # The first turn has no answer to validate, it is the same in both modes
+    times = [t for thread_times, _ in runs for t in thread_times[1:]]
+    attempts = speculation_stats["attempts"] - before["attempts"]
+    return {
+        "mode": mode,
+        "turn_ms": statistics.median(times) * 1000,
+        "attempts": attempts,
+        "hit_rate": (speculation_stats["hits"] - before["hits"]) / attempts if attempts else 0.0,
+        "states": [states for _, states in runs],
+    }
+
+def compare_states(baseline, result):
+    """Lists the (thread, turn, key) whose value differs from the baseline run."""
+    differences = []
+    for thread, (expected_states, states) in enumerate(zip(baseline["states"], result["states"])):
+        for turn, (expected, state) in enumerate(zip(expected_states, states)):
+            for key in STATE_KEYS:
+                if expected[key] != state[key]:
+                    differences.append((thread, turn, key, expected[key], state[key]))
+    return differences
+
+def print_report(results, differences):
+    print(f"\n{'speculation':<13}{'turn p50':>10}{'attempts':>10}{'hit rate':>10}")
+    for result in results:
+        print(f"{result['mode']:<13}{result['turn_ms']:>7.0f} ms{result['attempts']:>10}{result['hit_rate']:>10.0%}")
+
+    baseline = results[0]
+    for result in results[1:]:
+        saved = 1 - result["turn_ms"] / baseline["turn_ms"]
+        print(f"speculation {result['mode']}: {saved:.0%} faster turns than {baseline['mode']}")
+
+    for thread, turn, key, expected, value in differences[:10]:
+        print(f"thread {thread} turn {turn}: {key} is {value!r}, expected {expected!r}")
+    print(f"validation state kept by speculative turns: {'NO' if differences else 'yes'}")
+
+async def main_async(args):
+    async with run_fake_openai(latency=args.latency, validation_reply=VALIDATION_REPLY) as (fake, base_url):
+        configure_env(base_url, "memory")
+        configure_features()
+        import interview_flow  # noqa: F401 (reads the environment on import)
+        logging.getLogger().setLevel(logging.WARNING)
+        await use_memory_store()
+
+        results = [await measure(mode, args) for mode in MODES]
+        differences = compare_states(results[0], results[1])
+        print_report(results, differences)
+
+        from llm_clients import close_clients
+        await close_clients()
+    return 1 if differences else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=8, help="interview turns per thread")
+    parser.add_argument("--threads", type=int, default=5, help="threads run concurrently per mode")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake upstream latency in seconds")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Checks that a client disconnect closes the upstream Azure OpenAI stream.
+
+Runs the fake OpenAI server in this process with a long, slow reply, starts a
+streamed interview-gpt-openai and chat_ia_interview response, reads a few
+events and then disconnects the client. The fake server must see its socket
+closed shortly after (its writes fail), long before the reply would have ended.
+Exits with status 1 otherwise.
+
+Usage:
+    python benchmarks/check_disconnect.py [--tokens 400] [--token-latency 0.02] [--events 3]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import run_fake_openai
+from bench_endpoints import configure_env
+
+def make_streaming_request(path, body, disconnected):
+    """Request whose receive() reports http.disconnect once the event is set, like uvicorn does."""
+    from azurefunctions.extensions.http.fastapi import Request
+
+    messages = [{"type": "http.request", "body": json.dumps(body).encode("utf-8"), "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": f"/api/{path}",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+async def wait_for(condition, timeout):
+    """Seconds until condition() holds, or None after timeout."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if condition():
+            return time.perf_counter() - start
+        await asyncio.sleep(0.005)
+    return None
+
+async def check_endpoint(fake, handler, path, body, args):
+    disconnected = asyncio.Event()
+    response = await handler(make_streaming_request(path, body, disconnected))
+    if response.status_code != 200:
+        print(f"{path}: unexpected status {response.status_code}")
+        return False
+
+    iterator = response.body_iterator.__aiter__()
+    for _ in range(args.events):
+        await iterator.__anext__()
+
+    closed_before = fake.streams_disconnected
+    tokens_before = fake.tokens_streamed
+    disconnected.set()
+
+    # The server keeps pulling the body until the generator ends
+    async for _ in iterator:
+        pass
+    elapsed = await wait_for(lambda: fake.streams_disconnected > closed_before, args.timeout)
+
+    sent = fake.tokens_streamed - tokens_before
+    if elapsed is None:
+        print(f"{path}: FAIL, upstream stream still open {args.timeout:.0f} s after the disconnect")
+        return False
+    print(f"{path}: upstream socket closed {elapsed * 1000:.0f} ms after the disconnect "
+          f"({sent} more tokens sent, {args.tokens} in the full reply)")
+    return True
+
+async def main_async(args):
+    reply = " ".join(f"word{index}" for index in range(args.tokens))
+    async with run_fake_openai(token_latency=args.token_latency, reply=reply) as (fake, base_url):
+        configure_env(base_url, "memory")
+        os.environ["STREAM_MIN_CHUNK_CHARS"] = "0"
+
+        import function_app
+        from streaming import get_stream_stats
+        logging.getLogger().setLevel(logging.WARNING)
+
+        ok = await check_endpoint(
+            fake, function_app.stream_openai_text, "interview-gpt-openai",
+            {"prompt": "Summarize the interview results", "temperature": 0.7}, args
+        )
+        ok = await check_endpoint(
+            fake, function_app.chat_ia_interview, "chat_ia_interview",
+            {"inputUser": "How do participants commute?", "interviewData": [{"participant": "P1", "answer": "By bus"}]}, args
+        ) and ok
+
+        print(f"stream stats: {get_stream_stats()}")
+
+        from llm_clients import close_clients
+        await close_clients()
+    return 0 if ok else 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=400, help="tokens in the fake reply")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--events", type=int, default=3, help="events read before disconnecting")
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds allowed for the upstream to close")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Local stand-in for the Azure OpenAI chat completions API.
+
+Serves /openai/deployments/{deployment}/chat/completions (and /v1/chat/completions)
+with canned answers, in both JSON and streaming (SSE) form, after a configurable
+latency. It lets the benchmarks exercise the real clients without reaching Azure.
+A fraction of the requests can be answered with a 429 (with Retry-After) or a
+content_filter error, as Azure OpenAI does.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8089 --latency 0.5
+
+Then point the API at it:
+    AZURE_OPEN_AI_ENDPOINT=http://127.0.0.1:8089
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089
+"""
+import sys
+import json
+import time
+import socket
+import uuid
+import random
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from aiohttp import web
+
+DEFAULT_REPLY = "Thank you for your answer. Could you tell me a bit more about it?"
+DEFAULT_VALIDATION_REPLY = "INCOMPLETE: the participant has not covered the required context yet."
+DEFAULT_RUBRIC_REPLY = '["main experience", "concrete example", "impact"]'
+DEFAULT_SUMMARY_REPLY = "SUMMARY: the participant described their experience briefly.\nCOVERAGE: the required context is still missing."
+
+class FakeOpenAI:
+    """Configurable fake chat completions server."""
+
+    def __init__(self, latency=0.0, token_latency=0.0, jitter=0.0, reply=DEFAULT_REPLY,
+                 validation_reply=DEFAULT_VALIDATION_REPLY, summary_reply=DEFAULT_SUMMARY_REPLY,
+                 rubric_reply=DEFAULT_RUBRIC_REPLY, rate_429=0.0, retry_after=1.0,
+                 content_filter_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.reply = reply
+        self.validation_reply = validation_reply
+        self.summary_reply = summary_reply
+        self.rubric_reply = rubric_reply
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.content_filter_rate = content_filter_rate
+        self.requests = 0
+        self.rate_limited = 0
+        self.content_filtered = 0
+        self.streams_completed = 0
+        self.streams_disconnected = 0
+        self.tokens_streamed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def choose_reply(self, messages):
+        """Validation, summary and rubric prompts get their own replies, everything else the default reply."""
+        system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        if "expert analyst in evaluating responses" in system:
+            return self.validation_reply
+        if "running summary of an interview" in system:
+            return self.summary_reply
+        if "checklist of the aspects" in system:
+            return self.rubric_reply
+        return self.reply
+
+    @staticmethod
+    def tokenize(text):
+        """Splits a reply into word-sized deltas, keeping the spaces."""
+        words = text.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    @staticmethod
+    def tool_arguments(text):
+        """Turns a "STATUS: reason" verdict (and an optional COVERED: line) into validation arguments."""
+        verdict, _, covered = text.partition("\nCOVERED:")
+        status, _, reason = verdict.partition(":")
+        return {
+            "status": status.strip(),
+            "reason": reason.strip(),
+            "missing_aspects": [],
+            "covered_aspects": [int(n) for n in covered.replace(",", " ").split() if n.isdigit()],
+        }
+
+    def tool_call_body(self, model, tool, text, prompt_tokens):
+        body = self.completion_body(model, "", prompt_tokens)
+        arguments = json.dumps(self.tool_arguments(text))
+        body["choices"][0]["finish_reason"] = "tool_calls"
+        body["choices"][0]["message"] = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool["function"]["name"], "arguments": arguments},
+            }],
+        }
+        body["usage"]["completion_tokens"] = len(self.tokenize(arguments))
+        body["usage"]["total_tokens"] = prompt_tokens + body["usage"]["completion_tokens"]
+        return body
+
+    @staticmethod
+    def filter_results(*categories):
+        """Content filter annotations Azure OpenAI adds to every prompt and choice."""
+        return {category: {"filtered": False, "severity": "safe"} for category in categories}
+
+    def completion_body(self, model, text, prompt_tokens):
+        completion_tokens = len(self.tokenize(text))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "system_fingerprint": "fp_fake0001",
+            "prompt_filter_results": [{
+                "prompt_index": 0,
+                "content_filter_results": {
+                    **self.filter_results("hate", "self_harm", "sexual", "violence"),
+                    "jailbreak": {"filtered": False, "detected": False},
+                },
+            }],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "logprobs": None,
+                "message": {"role": "assistant", "content": text, "refusal": None},
+                "content_filter_results": {
+                    **self.filter_results("hate", "self_harm", "sexual", "violence"),
+                    "protected_material_code": {"filtered": False, "detected": False},
+                    "protected_material_text": {"filtered": False, "detected": False},
+                },
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0, "audio_tokens": 0},
+                "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0,
+                                              "accepted_prediction_tokens": 0, "rejected_prediction_tokens": 0},
+            },
+        }
+
+    def rate_limited_response(self):
+        self.rate_limited += 1
+        return web.json_response(
+            {"error": {
+                "code": "429",
+                "message": "Requests to the ChatCompletions_Create Operation have exceeded the token rate limit. "
+                           f"Please retry after {self.retry_after:g} seconds.",
+            }},
+            status=429,
+            headers={
+                "retry-after": str(max(1, round(self.retry_after))),
+                "retry-after-ms": str(int(self.retry_after * 1000)),
+            },
+        )
+
+    def content_filter_response(self):
+        self.content_filtered += 1
+        return web.json_response(
+            {"error": {
+                "message": "The response was filtered due to the prompt triggering Azure OpenAI's content management policy.",
+                "type": None,
+                "param": "prompt",
+                "code": "content_filter",
+                "status": 400,
+                "innererror": {
+                    "code": "ResponsibleAIPolicyViolation",
+                    "content_filter_result": {"violence": {"filtered": True, "severity": "medium"}},
+                },
+            }},
+            status=400,
+        )
+
+    def chunk_body(self, chunk_id, model, delta, finish_reason=None):
+        return {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    async def handle(self, request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = request.match_info.get("deployment") or body.get("model", "fake")
+        text = self.choose_reply(messages)
+        if body.get("max_tokens"):
+            # Word-sized tokens, like the usage figures
+            text = "".join(self.tokenize(text)[:body["max_tokens"]])
+        prompt_tokens = sum(len((m.get("content") or "").split()) for m in messages)
+
+        self.requests += 1
+        # Rejections are immediate, before any generation latency
+        if random.random() < self.rate_429:
+            return self.rate_limited_response()
+        if random.random() < self.content_filter_rate:
+            return self.content_filter_response()
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+            if body.get("tools") and not body.get("stream"):
+                return web.json_response(self.tool_call_body(model, body["tools"][0], text, prompt_tokens))
+
+            if not body.get("stream"):
+                return web.json_response(self.completion_body(model, text, prompt_tokens))
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+            try:
+                await self.send(response, self.chunk_body(chunk_id, model, {"role": "assistant", "content": ""}))
+                for token in self.tokenize(text):
+                    if self.token_latency:
+                        await asyncio.sleep(self.token_latency)
+                    await self.send(response, self.chunk_body(chunk_id, model, {"content": token}))
+                    self.tokens_streamed += 1
+                await self.send(response, self.chunk_body(chunk_id, model, {}, "stop"))
+                await response.write(b"data: [DONE]\n\n")
+                await response.write_eof()
+            except ConnectionResetError:
+                # The client closed the connection, stop generating like Azure does
+                self.streams_disconnected += 1
+                return response
+            except asyncio.CancelledError:
+                self.streams_disconnected += 1
+                raise
+            self.streams_completed += 1
+            return response
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    async def send(response, payload):
+        await response.write(f"data: {json.dumps(payload)}\n\n".encode())
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/openai/deployments/{deployment}/chat/completions", self.handle)
+        app.router.add_post("/v1/chat/completions", self.handle)
+        app.router.add_post("/chat/completions", self.handle)
+        return app
+
+@asynccontextmanager
+async def run_fake_openai(host="127.0.0.1", port=0, **options):
+    """
+    Runs the fake server in the current event loop.
+
+    Yields:
+        tuple: (FakeOpenAI instance, base URL)
+    """
+    fake = FakeOpenAI(**options)
+    runner = web.AppRunner(fake.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield fake, f"http://{host}:{bound_port}"
+    finally:
+        await runner.cleanup()
+
+@asynccontextmanager
+async def spawn_fake_openai(host="127.0.0.1", **options):
+    """
+    Runs the fake server in a child process, so its CPU time does not compete
+    with the code being measured.
+
+    Args:
+        **options: Command line options (latency=0.5 becomes --latency 0.5)
+
+    Yields:
+        str: Base URL of the server
+    """
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+
+    args = [sys.executable, __file__, "--host", host, "--port", str(port)]
+    for name, value in options.items():
+        args += [f"--{name.replace('_', '-')}", str(value)]
+
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        # Wait until the server accepts connections
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection(host, port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        yield f"http://{host}:{port}"
+    finally:
+        process.terminate()
+        await process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency in seconds")
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    parser.add_argument("--validation-reply", default=DEFAULT_VALIDATION_REPLY)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the 429 responses in seconds")
+    parser.add_argument("--content-filter-rate", type=float, default=0.0,
+                        help="fraction of requests rejected with a content_filter error")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        jitter=args.jitter,
+        reply=args.reply,
+        validation_reply=args.validation_reply,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        content_filter_rate=args.content_filter_rate,
+    )
+    web.run_app(fake.make_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
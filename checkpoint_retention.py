@@ -0,0 +1,239 @@
+import os
+import logging
+from typing import Dict, List, Optional
+from psycopg import Rollback
+from db_connection import get_shared_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Threads that have more than one checkpoint, in thread_id order (keyset pagination),
+# with the completion fields of their latest checkpoint. Primitive channel values
+# are stored inline in the checkpoint, so no blob has to be read or deserialized.
+SELECT_THREADS_SQL = """
+    SELECT t.thread_id, t.checkpoint_count, l.is_complete, l.question_number, l.total_questions
+    FROM (
+        SELECT thread_id, count(*) AS checkpoint_count
+        FROM checkpoints
+        WHERE thread_id > %s
+        GROUP BY thread_id
+        HAVING count(*) > 1
+        ORDER BY thread_id
+        LIMIT %s
+    ) t
+    LEFT JOIN LATERAL (
+        SELECT (c.checkpoint -> 'channel_values' ->> 'is_complete')::boolean AS is_complete,
+               (c.checkpoint -> 'channel_values' ->> 'question_number')::int AS question_number,
+               (c.checkpoint -> 'channel_values' ->> 'total_questions')::int AS total_questions
+        FROM checkpoints c
+        WHERE c.thread_id = t.thread_id AND c.checkpoint_ns = ''
+        ORDER BY c.checkpoint_id DESC
+        LIMIT 1
+    ) l ON true
+    ORDER BY t.thread_id
+"""
+
+# Deletes every checkpoint of the given thread past the newest `keep`
+DELETE_OLD_CHECKPOINTS_SQL = """
+    WITH ranked AS (
+        SELECT thread_id, checkpoint_ns, checkpoint_id,
+               row_number() OVER (
+                   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+               ) AS rn
+        FROM checkpoints
+        WHERE thread_id = %s
+    )
+    DELETE FROM checkpoints c
+    USING ranked r
+    WHERE c.thread_id = r.thread_id
+        AND c.checkpoint_ns = r.checkpoint_ns
+        AND c.checkpoint_id = r.checkpoint_id
+        AND r.rn > %s
+    RETURNING pg_column_size(c.checkpoint) + pg_column_size(c.metadata) AS size
+"""
+
+# Pending writes whose checkpoint no longer exists
+DELETE_ORPHAN_WRITES_SQL = """
+    DELETE FROM checkpoint_writes w
+    WHERE w.thread_id = ANY(%s)
+        AND NOT EXISTS (
+            SELECT 1 FROM checkpoints c
+            WHERE c.thread_id = w.thread_id
+                AND c.checkpoint_ns = w.checkpoint_ns
+                AND c.checkpoint_id = w.checkpoint_id
+        )
+    RETURNING coalesce(octet_length(w.blob), 0) AS size
+"""
+
+# Channel blobs no remaining checkpoint points to
+DELETE_ORPHAN_BLOBS_SQL = """
+    DELETE FROM checkpoint_blobs b
+    WHERE b.thread_id = ANY(%s)
+        AND NOT EXISTS (
+            SELECT 1
+            FROM checkpoints c, jsonb_each_text(c.checkpoint -> 'channel_versions') v
+            WHERE c.thread_id = b.thread_id
+                AND c.checkpoint_ns = b.checkpoint_ns
+                AND v.key = b.channel
+                AND v.value = b.version
+        )
+    RETURNING coalesce(octet_length(b.blob), 0) AS size
+"""
+
+def get_retention_settings() -> Dict:
+    """
+    Retention settings read from the environment:
+        CHECKPOINT_KEEP_LAST (checkpoints kept per thread, unset keeps all)
+        CHECKPOINT_COLLAPSE_COMPLETED (keep only the final checkpoint of finished threads, default true)
+        CHECKPOINT_RETENTION_BATCH_SIZE (threads per transaction, default 50)
+        CHECKPOINT_RETENTION_MAX_BATCHES (batches per run, unset processes everything)
+    """
+    keep_last = os.getenv("CHECKPOINT_KEEP_LAST")
+    max_batches = os.getenv("CHECKPOINT_RETENTION_MAX_BATCHES")
+    return {
+        "keep_last": int(keep_last) if keep_last else None,
+        "collapse_completed": os.getenv("CHECKPOINT_COLLAPSE_COMPLETED", "true").lower() in ("1", "true", "yes"),
+        "batch_size": int(os.getenv("CHECKPOINT_RETENTION_BATCH_SIZE", "50")),
+        "max_batches": int(max_batches) if max_batches else None,
+    }
+
+def _row_is_finished(row) -> Optional[bool]:
+    """
+    Reads whether a thread is finished from its scan row. None when the latest
+    checkpoint is complete but predates the inline question_number/total_questions.
+    """
+    if row["is_complete"] is not True:
+        return False
+    if row["question_number"] is None or row["total_questions"] is None:
+        return None
+    return row["question_number"] >= row["total_questions"]
+
+def _is_finished(checkpoint_tuple) -> bool:
+    """
+    A thread is finished when its last question was completed.
+    """
+    if checkpoint_tuple is None:
+        return False
+    channel_values = checkpoint_tuple.checkpoint.get("channel_values", {})
+    current_question = channel_values.get("current_question") or {}
+    return (
+        channel_values.get("is_complete") is True
+        and current_question.get("question_number", 1) >= current_question.get("total_questions", 1)
+    )
+
+async def _prune_batch(conn, threads: List[tuple], report: Dict):
+    """
+    Deletes old checkpoints of a batch of threads, plus the writes and blobs
+    left without a checkpoint, in one transaction.
+
+    Args:
+        conn: Connection from the pool
+        threads (List[tuple]): (thread_id, checkpoints to keep)
+        report (Dict): Counters updated in place
+    """
+    thread_ids = [thread_id for thread_id, _ in threads]
+
+    async with conn.cursor() as cur:
+        for thread_id, keep in threads:
+            await cur.execute(DELETE_OLD_CHECKPOINTS_SQL, (thread_id, keep))
+            rows = await cur.fetchall()
+            report["checkpoints_deleted"] += len(rows)
+            report["bytes_reclaimed"] += sum(row["size"] or 0 for row in rows)
+
+        await cur.execute(DELETE_ORPHAN_WRITES_SQL, (thread_ids,))
+        rows = await cur.fetchall()
+        report["writes_deleted"] += len(rows)
+        report["bytes_reclaimed"] += sum(row["size"] for row in rows)
+
+        await cur.execute(DELETE_ORPHAN_BLOBS_SQL, (thread_ids,))
+        rows = await cur.fetchall()
+        report["blobs_deleted"] += len(rows)
+        report["bytes_reclaimed"] += sum(row["size"] for row in rows)
+
+async def run_retention(keep_last: Optional[int] = None, collapse_completed: Optional[bool] = None,
+                        batch_size: Optional[int] = None, max_batches: Optional[int] = None,
+                        dry_run: bool = False) -> Dict:
+    """
+    Removes old checkpoints in batches. Unset arguments use get_retention_settings().
+
+    Args:
+        keep_last (int): Checkpoints to keep per thread (None keeps all)
+        collapse_completed (bool): Keep only the final checkpoint of finished threads
+        batch_size (int): Threads per transaction
+        max_batches (int): Stop after this many batches (None processes every thread)
+        dry_run (bool): Roll back every transaction and only report what would be reclaimed
+
+    Returns:
+        Dict: Report with the status and the reclaimed rows and bytes
+    """
+    settings = get_retention_settings()
+    keep_last = settings["keep_last"] if keep_last is None else keep_last
+    collapse_completed = settings["collapse_completed"] if collapse_completed is None else collapse_completed
+    batch_size = batch_size or settings["batch_size"]
+    max_batches = settings["max_batches"] if max_batches is None else max_batches
+
+    report = {
+        "status": "success",
+        "dry_run": dry_run,
+        "batches": 0,
+        "threads_scanned": 0,
+        "threads_pruned": 0,
+        "threads_collapsed": 0,
+        "checkpoints_deleted": 0,
+        "writes_deleted": 0,
+        "blobs_deleted": 0,
+        "bytes_reclaimed": 0,
+    }
+
+    if keep_last is not None and keep_last < 1:
+        return {"status": "error", "message": "keep_last must be at least 1"}
+    if keep_last is None and not collapse_completed:
+        return report
+
+    try:
+        checkpointer, pool = await get_shared_db_connection()
+        cursor_thread_id = ""
+
+        while max_batches is None or report["batches"] < max_batches:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(SELECT_THREADS_SQL, (cursor_thread_id, batch_size))
+                    rows = await cur.fetchall()
+            if not rows:
+                break
+
+            cursor_thread_id = rows[-1]["thread_id"]
+            report["threads_scanned"] += len(rows)
+
+            to_prune = []
+            for row in rows:
+                thread_id = row["thread_id"]
+                if collapse_completed:
+                    finished = _row_is_finished(row)
+                    if finished is None:
+                        # Older checkpoints only keep the question numbers in current_question
+                        latest = await checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+                        finished = _is_finished(latest)
+                    if finished:
+                        to_prune.append((thread_id, 1))
+                        report["threads_collapsed"] += 1
+                        continue
+                if keep_last is not None and row["checkpoint_count"] > keep_last:
+                    to_prune.append((thread_id, keep_last))
+                    report["threads_pruned"] += 1
+
+            if to_prune:
+                # One bounded transaction per batch
+                async with pool.connection() as conn:
+                    async with conn.transaction():
+                        await _prune_batch(conn, to_prune, report)
+                        if dry_run:
+                            raise Rollback()
+
+            report["batches"] += 1
+            logger.info(f"Checkpoint retention batch {report['batches']}: {report}")
+
+        return report
+
+    except Exception as e:
+        logger.error(f"Error in checkpoint retention: {str(e)}")
+        return {**report, "status": "error", "message": str(e)}
@@ -0,0 +1,129 @@
+import os
+import logging
+import importlib
+from typing import Any, Dict, Optional, Tuple
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the type tag of compressed payloads ("msgpack+zstd")
+COMPRESSED_SUFFIX = "+zstd"
+
+# Types whose payload may be compressed (null/bytes payloads are stored as they are)
+_COMPRESSIBLE_TYPES = ("msgpack", "json")
+
+_zstd = None
+_zstd_loaded = False
+
+def get_serializer_settings() -> Dict:
+    """
+    Checkpoint serializer settings read from the environment:
+        CHECKPOINT_SERIALIZER ("default" for the LangGraph serializer, "compact", or
+            "module:attribute" for a custom serializer class or factory, default "default")
+        CHECKPOINT_COMPRESSION_THRESHOLD (compact serializer, payloads of at least this many bytes
+            are zstd-compressed with the zstandard package, 0 disables, default 2048)
+        CHECKPOINT_COMPRESSION_LEVEL (zstd level, default 3)
+    """
+    return {
+        "serializer": os.getenv("CHECKPOINT_SERIALIZER", "default"),
+        "compression_threshold": int(os.getenv("CHECKPOINT_COMPRESSION_THRESHOLD", "2048")),
+        "compression_level": int(os.getenv("CHECKPOINT_COMPRESSION_LEVEL", "3")),
+    }
+
+def _get_zstd():
+    global _zstd, _zstd_loaded
+    if not _zstd_loaded:
+        _zstd_loaded = True
+        try:
+            import zstandard
+            _zstd = zstandard
+        except ImportError:
+            logger.warning("zstandard not installed, checkpoint compression is unavailable")
+    return _zstd
+
+def strip_message(message: BaseMessage) -> BaseMessage:
+    """
+    Copy of a message without the metadata the interview never reads back:
+    response_metadata (token usage, model, content filter results) and usage_metadata.
+    Content, ID (needed by add_messages), name and tool calls are kept.
+    """
+    update = {}
+    if message.response_metadata:
+        update["response_metadata"] = {}
+    if getattr(message, "usage_metadata", None):
+        update["usage_metadata"] = None
+    return message.model_copy(update=update) if update else message
+
+def _compact(value: Any) -> Any:
+    # Channel values and pending writes hold a message or a list of messages
+    if isinstance(value, BaseMessage):
+        return strip_message(value)
+    if isinstance(value, list) and any(isinstance(item, BaseMessage) for item in value):
+        return [strip_message(item) if isinstance(item, BaseMessage) else item for item in value]
+    return value
+
+class CompactSerializer(JsonPlusSerializer):
+    """
+    LangGraph serializer that strips message metadata before encoding (msgpack, like
+    the default serializer) and zstd-compresses large payloads. Compressed payloads
+    are tagged "<type>+zstd"; every other type is read by the default serializer,
+    so checkpoints written before it was enabled stay readable.
+    """
+
+    def __init__(self, compression_threshold: int = 2048, compression_level: int = 3, **kwargs):
+        super().__init__(**kwargs)
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = super().dumps_typed(_compact(obj))
+        if (self.compression_threshold > 0
+                and len(data) >= self.compression_threshold
+                and type_ in _COMPRESSIBLE_TYPES
+                and _get_zstd() is not None):
+            compressed = _get_zstd().ZstdCompressor(level=self.compression_level).compress(data)
+            if len(compressed) < len(data):
+                return type_ + COMPRESSED_SUFFIX, compressed
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(COMPRESSED_SUFFIX):
+            if _get_zstd() is None:
+                raise RuntimeError("Checkpoint is zstd-compressed, install zstandard to read it")
+            payload = _get_zstd().ZstdDecompressor().decompress(payload)
+            type_ = type_[:-len(COMPRESSED_SUFFIX)]
+        return super().loads_typed((type_, payload))
+
+def get_checkpoint_serializer() -> Optional[SerializerProtocol]:
+    """
+    Gets the serializer for the checkpointers, as chosen by CHECKPOINT_SERIALIZER.
+
+    Returns:
+        The serializer, or None for the LangGraph default
+
+    Raises:
+        RuntimeError: compression is enabled but zstandard is not installed
+    """
+    settings = get_serializer_settings()
+    name = settings["serializer"]
+    if name == "default":
+        return None
+    if name == "compact":
+        if settings["compression_threshold"] > 0 and _get_zstd() is None:
+            # Failing here rather than silently storing every checkpoint uncompressed
+            raise RuntimeError("CHECKPOINT_COMPRESSION_THRESHOLD needs the zstandard package, "
+                               "install it or set the threshold to 0")
+        return CompactSerializer(
+            compression_threshold=settings["compression_threshold"],
+            compression_level=settings["compression_level"],
+        )
+
+    module_name, _, attribute = name.partition(":")
+    try:
+        return getattr(importlib.import_module(module_name), attribute)()
+    except Exception as e:
+        logger.error(f"Error loading checkpoint serializer {name}: {str(e)}")
+        raise
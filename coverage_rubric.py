@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Tuple
+from langchain_core.messages import SystemMessage, HumanMessage
+from memory_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+RUBRIC_PROMPT = """You turn the context of an interview question into a checklist of the aspects a complete answer must cover.
+
+INSTRUCTIONS:
+1. Each aspect must be short, concrete and checkable in the participant's answer
+2. Do not repeat aspects and do not add aspects that are not in the question or context
+3. Use at most {max_items} aspects
+4. Write the aspects in the same language as the context
+
+Respond EXACTLY with a JSON array of strings, for example: ["aspect 1", "aspect 2"]
+"""
+
+rubric_stats = {
+    "cache_hits": 0,
+    "generated": 0,
+    "errors": 0,
+}
+
+_rubric_cache = None
+_pending_rubrics: Dict[str, asyncio.Future] = {}
+
+def get_rubric_settings() -> Dict:
+    """
+    Coverage rubric settings read from the environment:
+        COVERAGE_RUBRIC_ENABLED (track required aspects as a checklist, default false)
+        COVERAGE_RUBRIC_MAX_ITEMS (aspects per question, default 8)
+        COVERAGE_RUBRIC_CACHE_SIZE (rubrics kept in memory, default 1024)
+    """
+    return {
+        "enabled": os.getenv("COVERAGE_RUBRIC_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "max_items": int(os.getenv("COVERAGE_RUBRIC_MAX_ITEMS", "8")),
+        "cache_size": int(os.getenv("COVERAGE_RUBRIC_CACHE_SIZE", "1024")),
+    }
+
+def _get_cache(settings: Dict) -> MemoryCache:
+    global _rubric_cache
+    if _rubric_cache is None:
+        _rubric_cache = MemoryCache(max_entries=settings["cache_size"])
+    return _rubric_cache
+
+def rubric_hash(question: str, context: str) -> str:
+    """Content hash of a question and its context, shared by every thread using it."""
+    payload = "\x1f".join([question or "", context or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def parse_rubric(text: str, max_items: int) -> List[str]:
+    """
+    Parses the checklist returned by the LLM. Accepts a JSON array or,
+    failing that, one aspect per (bulleted or numbered) line.
+    """
+    text = (text or "").strip()
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    items = None
+    if match:
+        try:
+            items = json.loads(match.group(0))
+        except ValueError:
+            items = None
+    if not isinstance(items, list):
+        items = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line) for line in text.splitlines()]
+
+    aspects = []
+    for item in items:
+        aspect = str(item).strip()
+        if aspect and aspect not in aspects:
+            aspects.append(aspect)
+    return aspects[:max_items]
+
+async def _generate_rubric(llm, question: str, context: str, max_items: int) -> List[str]:
+    response = await llm.ainvoke([
+        SystemMessage(content=RUBRIC_PROMPT.format(max_items=max_items)),
+        HumanMessage(content=f"QUESTION:\n{question}\n\nCONTEXT:\n{context}")
+    ])
+    return parse_rubric(response.content, max_items)
+
+async def get_rubric(llm, question: str, context: str) -> List[str]:
+    """
+    Gets the checklist of required aspects of a question, generating it once per
+    content hash. Concurrent requests for the same question share one LLM call.
+
+    Args:
+        llm: Language model instance
+        question (str): Question text
+        context (str): Required context of the question
+
+    Returns:
+        List[str]: Aspects to cover (empty when there is no context or on error)
+    """
+    if not (context or "").strip():
+        return []
+
+    settings = get_rubric_settings()
+    cache = _get_cache(settings)
+    key = rubric_hash(question, context)
+
+    rubric = cache.get(key)
+    if rubric is not None:
+        rubric_stats["cache_hits"] += 1
+        return rubric
+
+    pending = _pending_rubrics.get(key)
+    if pending is not None:
+        rubric_stats["cache_hits"] += 1
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _pending_rubrics[key] = future
+    rubric = []
+    try:
+        rubric = await _generate_rubric(llm, question, context, settings["max_items"])
+        rubric_stats["generated"] += 1
+        cache.set(key, rubric)
+    except Exception as e:
+        rubric_stats["errors"] += 1
+        logger.error(f"Error generating coverage rubric: {str(e)}")
+    finally:
+        # Waiters always get an answer, even if this request was cancelled
+        _pending_rubrics.pop(key, None)
+        future.set_result(rubric)
+    return rubric
+
+async def ensure_rubric(llm, state: Dict) -> Dict:
+    """
+    Gets the rubric fields for the state, resetting the covered aspects when the
+    question changed.
+
+    Returns:
+        Dict: coverage_rubric, rubric_hash and covered_aspects (empty when disabled)
+    """
+    if not get_rubric_settings()["enabled"]:
+        return {}
+
+    current_question = state["current_question"]
+    key = rubric_hash(current_question.get("question", ""), current_question.get("context", ""))
+    if state.get("rubric_hash") == key and state.get("coverage_rubric"):
+        return {
+            "coverage_rubric": state["coverage_rubric"],
+            "rubric_hash": key,
+            "covered_aspects": state.get("covered_aspects") or 0
+        }
+
+    rubric = await get_rubric(llm, current_question.get("question", ""), current_question.get("context", ""))
+    return {
+        "coverage_rubric": rubric,
+        "rubric_hash": key,
+        "covered_aspects": 0
+    }
+
+def missing_aspects(rubric: List[str], covered: int) -> List[Tuple[int, str]]:
+    """Aspects whose bit is not set in the covered bitmap, with their index."""
+    return [(index, aspect) for index, aspect in enumerate(rubric) if not (covered or 0) >> index & 1]
+
+def format_aspects(aspects: List[Tuple[int, str]]) -> str:
+    """Numbered list of aspects, keeping their rubric numbers."""
+    return "\n".join(f"{index + 1}. {aspect}" for index, aspect in aspects)
+
+def parse_covered(text: str, rubric: List[str], covered: int) -> int:
+    """
+    Sets the bits of the aspects listed on the "COVERED:" line of a validation result.
+    """
+    match = re.search(r"\bCOVERED:\s*([^\n]*)", text or "")
+    if not match:
+        return covered or 0
+    for number in re.findall(r"\d+", match.group(1)):
+        index = int(number) - 1
+        if 0 <= index < len(rubric):
+            covered = (covered or 0) | (1 << index)
+    return covered or 0
+
+def strip_covered(text: str) -> str:
+    """
+    Removes the "COVERED:" line from a validation result once it has been parsed,
+    so the text returned to clients keeps the "STATUS: reason" format.
+    """
+    return re.sub(r"[^\S\n]*\bCOVERED:[^\n]*", "", text or "").strip()
+
+def get_rubric_stats() -> Dict:
+    """
+    Gets rubric cache counters.
+    """
+    return {
+        **rubric_stats,
+        "cached_rubrics": len(_rubric_cache) if _rubric_cache is not None else 0
+    }
@@ -1,39 +1,261 @@
 import os
+import time
+import asyncio
+import atexit
+import logging
+from psycopg import AsyncConnection
 from psycopg_pool import AsyncConnectionPool
 from psycopg.rows import dict_row
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from metrics import histogram, timed, observe, register_collector
+from checkpoint_serializer import get_checkpoint_serializer
 
-async def get_db_connection():
+logger = logging.getLogger(__name__)
+
+checkpoint_duration = histogram(
+    "checkpoint_operation_duration_seconds", "Duration of checkpoint reads and writes", ("operation",)
+)
+
+# Process-wide pool and checkpointer shared by every request of the worker
+_shared_pool = None
+_shared_checkpointer = None
+_shared_loop = None
+_shared_lock = asyncio.Lock()
+# Close tasks of discarded pools, referenced until they finish
+_closing_pools = set()
+
+# Dedicated connection holding the interview thread advisory locks, kept out of
+# the shared pool so lock holders never use up the checkpoint connections
+_lock_connection = None
+_lock_connection_loop = None
+_lock_connection_lock = asyncio.Lock()
+
+class InstrumentedPostgresSaver(AsyncPostgresSaver):
+    """
+    AsyncPostgresSaver that records the duration of every checkpoint read and write.
+    """
+
+    async def aget_tuple(self, config):
+        with timed(checkpoint_duration, "checkpoint get", operation="get"):
+            return await super().aget_tuple(config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with timed(checkpoint_duration, "checkpoint put", operation="put"):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with timed(checkpoint_duration, "checkpoint put_writes", operation="put_writes"):
+            return await super().aput_writes(config, writes, task_id, task_path)
+
+    async def alist(self, config, **kwargs):
+        # Timed until the caller stops iterating
+        start = time.perf_counter()
+        try:
+            async for item in super().alist(config, **kwargs):
+                yield item
+        finally:
+            observe(checkpoint_duration, time.perf_counter() - start, operation="list")
+
+def _get_conn_string():
+    """
+    Builds the PostgreSQL connection string from environment variables.
+    """
+    return (
+        f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+        f"@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
+        f"?sslmode={os.getenv('POSTGRES_SSLMODE', 'prefer')}"
+    )
+
+def _get_connection_kwargs():
+    """
+    Connection options shared by every pool.
+    """
+    return {
+        "autocommit": True,
+        "prepare_threshold": 0,
+        "row_factory": dict_row,
+        "connect_timeout": 10,  # Add connection timeout
+    }
+
+def _on_reconnect_failed(pool):
+    """
+    Called by the pool when a connection could not be re-established within
+    reconnect_timeout. The shared pool is discarded so the next request builds a new one.
+    """
+    logger.error("PostgreSQL pool could not reconnect, it will be rebuilt on next request")
+    _discard_shared_pool(pool)
+    _close_pool_later(pool, asyncio.get_running_loop())
+
+def _discard_shared_pool(pool):
+    """
+    Forgets the shared pool if it is the one given.
+    """
+    global _shared_pool, _shared_checkpointer, _shared_loop
+    if pool is _shared_pool:
+        _shared_pool = None
+        _shared_checkpointer = None
+        _shared_loop = None
+
+def _close_pool_later(pool, loop):
+    """
+    Schedules closing a discarded pool on the event loop it belongs to, without
+    waiting for it. Nothing can be done once that loop is closed.
     """
-    Helper function that gets the asynchronous checkpointer for PostgreSQL.
+    if pool.closed or loop is None or loop.is_closed():
+        return
+
+    def close():
+        task = loop.create_task(pool.close())
+        _closing_pools.add(task)
+        task.add_done_callback(_on_pool_closed)
+
+    loop.call_soon_threadsafe(close)
+
+def _on_pool_closed(task):
+    _closing_pools.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Error closing discarded PostgreSQL pool: {str(task.exception())}")
+
+async def get_shared_db_connection():
+    """
+    Gets the process-wide checkpointer and connection pool for PostgreSQL.
+
+    The pool is opened lazily on first use and reused by every request of the
+    worker. It must not be closed by callers; use close_db_connection() on shutdown.
+
+    Pool settings are read from the environment:
+        POSTGRES_POOL_MIN_SIZE (default 1)
+        POSTGRES_POOL_MAX_SIZE (default 20)
+        POSTGRES_POOL_TIMEOUT (seconds to wait for a connection, default 30)
+        POSTGRES_POOL_MAX_IDLE (seconds before an idle connection is closed, default 300)
+        POSTGRES_POOL_MAX_LIFETIME (seconds before a connection is recycled, default 3600)
+        POSTGRES_POOL_RECONNECT_TIMEOUT (seconds to retry a lost connection, default 60)
+
+    Returns:
+        tuple: (checkpointer, pool)
     """
+    global _shared_pool, _shared_checkpointer, _shared_loop
+
+    pool = _shared_pool
+    if pool is not None and not pool.closed and _shared_loop is asyncio.get_running_loop():
+        return _shared_checkpointer, pool
+
+    async with _shared_lock:
+        # Another request may have opened the pool while we were waiting
+        if _shared_pool is not None and not _shared_pool.closed and _shared_loop is asyncio.get_running_loop():
+            return _shared_checkpointer, _shared_pool
+
+        if _shared_pool is not None:
+            # Pool of another event loop (or already closed): close it on its own loop
+            _close_pool_later(_shared_pool, _shared_loop)
+            _discard_shared_pool(_shared_pool)
+
+        try:
+            logger.info(f"Opening shared PostgreSQL pool: {os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}")
+
+            pool = AsyncConnectionPool(
+                conninfo=_get_conn_string(),
+                min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "20")),
+                timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")),
+                max_idle=float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+                max_lifetime=float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "3600")),
+                reconnect_timeout=float(os.getenv("POSTGRES_POOL_RECONNECT_TIMEOUT", "60")),
+                reconnect_failed=_on_reconnect_failed,
+                # Health check before handing out a connection
+                check=AsyncConnectionPool.check_connection,
+                kwargs=_get_connection_kwargs(),
+                open=False,
+            )
+            await pool.open(wait=True, timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")))
+
+            _shared_pool = pool
+            _shared_checkpointer = InstrumentedPostgresSaver(pool, serde=get_checkpoint_serializer())
+            _shared_loop = asyncio.get_running_loop()
+
+            return _shared_checkpointer, _shared_pool
+
+        except Exception as e:
+            logger.error(f"Error in get_shared_db_connection: {str(e)}")
+            raise
+
+async def reset_db_connection():
+    """
+    Closes the shared pool after a connection failure so the next request reconnects.
+    """
+    pool = _shared_pool
+    if pool is None:
+        return
+
+    _discard_shared_pool(pool)
     try:
-        # Build connection string
-        conn_string = (
-            f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
-            f"@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
-            f"?sslmode={os.getenv('POSTGRES_SSLMODE', 'prefer')}"
-        )
-        
-        print(f"Attempting to connect to: {conn_string}")
-        
-        # Create an asynchronous connection pool
-        pool = AsyncConnectionPool(
-            conninfo=conn_string,
-            max_size=20,
-            kwargs={
-                "autocommit": True,
-                "prepare_threshold": 0,
-                "row_factory": dict_row,
-                "connect_timeout": 10,  # Add connection timeout
-            },
-        )
-        
-        # Create the asynchronous checkpointer
-        checkpointer = AsyncPostgresSaver(pool)
-        
-        return checkpointer, pool
-        
+        await pool.close()
     except Exception as e:
-        print(f"Error in get_db_connection: {str(e)}")
-        raise 
\ No newline at end of file
+        logger.error(f"Error closing shared PostgreSQL pool: {str(e)}")
+
+async def get_lock_connection() -> AsyncConnection:
+    """
+    Gets the process-wide connection used for session advisory locks
+    (autocommit, so the locks outlive each statement). It is reopened when it was
+    closed or broken; PostgreSQL releases the locks of a lost connection.
+    """
+    global _lock_connection, _lock_connection_loop
+
+    conn = _lock_connection
+    if conn is not None and not conn.closed and not conn.broken and _lock_connection_loop is asyncio.get_running_loop():
+        return conn
+
+    async with _lock_connection_lock:
+        conn = _lock_connection
+        if conn is not None and not conn.closed and not conn.broken and _lock_connection_loop is asyncio.get_running_loop():
+            return conn
+        try:
+            _lock_connection = await AsyncConnection.connect(_get_conn_string(), **_get_connection_kwargs())
+            _lock_connection_loop = asyncio.get_running_loop()
+            return _lock_connection
+        except Exception as e:
+            logger.error(f"Error in get_lock_connection: {str(e)}")
+            raise
+
+async def close_db_connection():
+    """
+    Closes the shared pool and the lock connection. Safe to call when they were never opened.
+    """
+    global _lock_connection, _lock_connection_loop
+    await reset_db_connection()
+
+    conn = _lock_connection
+    _lock_connection = None
+    _lock_connection_loop = None
+    if conn is not None and not conn.closed:
+        try:
+            await conn.close()
+        except Exception as e:
+            logger.error(f"Error closing PostgreSQL lock connection: {str(e)}")
+
+def _close_at_exit():
+    """
+    Closes the shared pool on worker shutdown if its event loop is still usable.
+    """
+    pool = _shared_pool
+    loop = _shared_loop
+    if pool is None or loop is None or loop.is_closed() or loop.is_running():
+        return
+    try:
+        loop.run_until_complete(close_db_connection())
+    except Exception as e:
+        logger.error(f"Error closing shared PostgreSQL pool at exit: {str(e)}")
+
+atexit.register(_close_at_exit)
+
+def _pool_metrics():
+    """
+    Gauges of the shared pool, read at scrape time. db_pool_requests_wait_ms is the
+    total time requests waited for a connection, db_pool_requests_num the requests served.
+    """
+    pool = _shared_pool
+    if pool is None:
+        return []
+    return [f"db_pool_{key} {value}" for key, value in pool.get_stats().items()]
+
+register_collector(_pool_metrics)
@@ -0,0 +1,215 @@
+import os
+import re
+import logging
+import unicodedata
+from typing import Callable, Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+# Short replies that match validate_response's special cases exactly.
+# Only unambiguous full phrases: lone words ("listo", "next", "pass") and
+# hedges ("not sure") can mean something else and are left to the LLM.
+# Patterns are written against normalized text: lowercase, no accents,
+# no apostrophes and punctuation replaced by spaces.
+RULE_PATTERNS = {
+    "es": {
+        "NS-NR": [
+            r"no (lo )?se",
+            r"no (lo )?se (que (decir|responder|contestar))",
+            r"no sabria (que )?(decir|responder|contestar)",
+            r"no (tengo )?(ni )?idea",
+            r"ni idea",
+            r"(prefiero|quisiera|me gustaria) no (responder|contestar|decir(lo)?|opinar)",
+            r"no (quiero|deseo|voy a) (responder|contestar|decir(lo)?)",
+            r"sin comentarios",
+            r"ns ?nr",
+        ],
+        "COMPLETED": [
+            r"(no )?(tengo )?nada mas( que (agregar|anadir|decir|comentar))?",
+            r"no tengo (nada )?mas que (agregar|anadir|decir|comentar)",
+            r"(eso )?es todo",
+            r"(ya )?(eso|esto) (es todo|seria todo)",
+            r"(pasemos|pasamos|vamos|sigamos) a la siguiente( pregunta)?",
+            r"siguiente pregunta",
+            r"(quiero|quisiera|me gustaria) (terminar|finalizar|pasar a la siguiente( pregunta)?)",
+            r"ya termine",
+        ],
+    },
+    "en": {
+        "NS-NR": [
+            r"(i )?(dont|do not) know",
+            r"(i )?(have )?no idea",
+            r"(i )?(would|d) rather not (say|answer|respond)",
+            r"id rather not (say|answer|respond)",
+            r"(i )?prefer not to (say|answer|respond)",
+            r"(i )?(dont|do not) want to (say|answer|respond)",
+            r"no comment",
+        ],
+        "COMPLETED": [
+            r"(i have )?nothing (else|more)( to add)?",
+            r"(i have )?nothing more to (add|say)",
+            r"(thats|that is) (all|it)",
+            r"(lets )?move on( to the next question)?",
+            r"next question",
+            r"(lets go to|go to) the next question",
+            r"(im|i am) (done|finished)",
+            r"(i )?(want|would like) to (finish|stop|move on)",
+        ],
+    },
+    "pt": {
+        "NS-NR": [
+            r"(eu )?nao sei",
+            r"(eu )?nao faco (a menor )?ideia",
+            r"nao tenho ideia",
+            r"(eu )?prefiro nao (responder|dizer|comentar)",
+            r"(eu )?nao quero (responder|dizer|comentar)",
+            r"sem comentarios",
+        ],
+        "COMPLETED": [
+            r"(nao tenho )?nada mais( a (acrescentar|adicionar|dizer))?",
+            r"(e isso|so isso|e so isso|isso e tudo)( e tudo)?",
+            r"(proxima|seguinte) pergunta",
+            r"(vamos|podemos passar) para a (proxima|seguinte)( pergunta)?",
+            r"(quero|gostaria de) (terminar|finalizar)",
+            r"(eu )?ja terminei",
+        ],
+    },
+    "fr": {
+        "NS-NR": [
+            r"je (ne )?sais pas",
+            r"(je nai )?aucune idee",
+            r"je prefere ne pas (repondre|le dire)",
+            r"je ne veux pas (repondre|le dire)",
+            r"sans commentaire",
+        ],
+        "COMPLETED": [
+            r"(je nai )?rien (dautre|de plus)( a ajouter)?",
+            r"(je nai )?rien a ajouter",
+            r"cest tout",
+            r"question suivante",
+            r"(passons|on passe) a la (question )?suivante",
+            r"jai fini",
+        ],
+    },
+}
+
+# Courtesy words allowed around the reply ("ok, no sé, gracias")
+FILLERS = r"(?:ok|okay|bueno|pues|vale|gracias|muchas gracias|well|thanks|thank you|sorry|perdon|lo siento|obrigad[oa]|merci|desole|por favor|please|hmm+|mmm+|eh|ah)"
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercases, strips accents, apostrophes and punctuation, and collapses spaces.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"['’`´]", "", text)
+    text = re.sub(r"[^\w\s]|_", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def _compile(patterns: List[str]):
+    body = "|".join(f"(?:{p})" for p in patterns)
+    return re.compile(rf"^(?:{FILLERS} )*(?:{body})(?: {FILLERS})*$")
+
+COMPILED_PATTERNS = {
+    language: {status: _compile(patterns) for status, patterns in rules.items()}
+    for language, rules in RULE_PATTERNS.items()
+}
+
+fast_validation_stats = {
+    "fast_path_ns_nr": 0,
+    "fast_path_completed": 0,
+    "llm_path": 0,
+}
+
+def is_fast_validation_enabled() -> bool:
+    """The fast path can be turned off with FAST_VALIDATION_ENABLED=false."""
+    return os.getenv("FAST_VALIDATION_ENABLED", "true").lower() in ("1", "true", "yes")
+
+def _pattern_sets(language: str):
+    """
+    Pattern sets to try: the interview language, or all of them when it has no rules.
+    """
+    code = (language or "es").split("-")[0].split("_")[0].lower()
+    if code in COMPILED_PATTERNS:
+        return [COMPILED_PATTERNS[code]]
+    return list(COMPILED_PATTERNS.values())
+
+def rule_pre_classifier(messages: List[BaseMessage], language: str) -> Optional[Dict]:
+    """
+    Classifies the participant's last reply with the rule patterns.
+
+    Args:
+        messages (List[BaseMessage]): Conversation messages
+        language (str): Interview language
+
+    Returns:
+        Optional[Dict]: {"is_complete", "validation_result"} when confident, None otherwise
+    """
+    user_messages = [msg for msg in messages if isinstance(msg, HumanMessage)]
+    if not user_messages:
+        return None
+
+    reply = normalize_text(user_messages[-1].content)
+    if not reply or len(reply) > 80:
+        return None
+
+    for patterns in _pattern_sets(language):
+        # NS-NR only applies to the first response, like in validate_response
+        if len(user_messages) == 1 and patterns["NS-NR"].match(reply):
+            return {
+                "is_complete": "NS-NR",
+                "validation_result": "NS-NR: The participant indicated they don't know or prefer not to respond (rule-based)."
+            }
+        if patterns["COMPLETED"].match(reply):
+            return {
+                "is_complete": True,
+                "validation_result": "COMPLETED: The participant indicated they have nothing more to add or want to move on (rule-based)."
+            }
+    return None
+
+# Pre-classifiers are tried in order; the first confident decision wins
+_pre_classifiers: List[Callable[[List[BaseMessage], str], Optional[Dict]]] = [rule_pre_classifier]
+
+def register_pre_classifier(classifier: Callable[[List[BaseMessage], str], Optional[Dict]], first: bool = False):
+    """
+    Adds a pre-classifier. It receives (messages, language) and returns
+    {"is_complete", "validation_result"} or None to fall through.
+    """
+    if first:
+        _pre_classifiers.insert(0, classifier)
+    else:
+        _pre_classifiers.append(classifier)
+
+def pre_classify(messages: List[BaseMessage], language: str) -> Optional[Dict]:
+    """
+    Runs the pre-classifiers and updates the path counters.
+
+    Returns:
+        Optional[Dict]: The decision, or None when the LLM must validate
+    """
+    if is_fast_validation_enabled():
+        for classifier in _pre_classifiers:
+            try:
+                decision = classifier(messages, language)
+            except Exception as e:
+                logger.error(f"Error in pre-classifier: {str(e)}")
+                continue
+            if decision is not None:
+                key = "fast_path_ns_nr" if decision["is_complete"] == "NS-NR" else "fast_path_completed"
+                fast_validation_stats[key] += 1
+                return decision
+
+    fast_validation_stats["llm_path"] += 1
+    return None
+
+def get_fast_validation_stats() -> Dict:
+    """
+    Gets how often each validation path was taken.
+    """
+    total = sum(fast_validation_stats.values())
+    fast = fast_validation_stats["fast_path_ns_nr"] + fast_validation_stats["fast_path_completed"]
+    return {
+        **fast_validation_stats,
+        "fast_path_rate": fast / total if total else 0.0
+    }
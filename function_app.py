@@ -1,11 +1,24 @@
 import os
-import openai
+import time
+import functools
+import contextlib
 import azure.functions as func
 import logging
 import json
-import asyncio
-from azurefunctions.extensions.http.fastapi import Request, StreamingResponse, JSONResponse
-from interview_flow import run_interview_async, get_checkpoints
+from azurefunctions.extensions.http.fastapi import Request, StreamingResponse, JSONResponse, PlainTextResponse
+from interview_flow import run_interview_async, stream_interview_async, get_checkpoints, get_node_latency_stats, get_speculation_stats
+from llm_clients import get_openai_client
+from checkpoint_retention import run_retention
+from response_cache import cache_key, get_cached_response, caching_deltas, replay_deltas, get_response_cache_stats
+from token_budget import fit_history, preload_encoding
+from interview_retrieval import build_interview_context, get_retrieval_stats
+from interview_context import register_context, get_context, get_interview_context_stats
+from rate_limiter import set_llm_priority, PRIORITY_ADMIN, PRIORITY_BULK, get_rate_limit_stats
+from fast_validator import get_fast_validation_stats
+from coverage_rubric import get_rubric_stats
+from metrics import histogram, observe, span, register_stats, render_metrics
+from streaming import format_sse, openai_deltas, sse_text_stream, cancel_on_disconnect, get_stream_stats
+from turn_guard import guarded_turn, request_fingerprint, check_idempotency_key, get_turn_guard_stats
 
 from dotenv import load_dotenv
 
@@ -20,11 +33,8 @@ base_path = os.environ["AZURE_OPENAI_API_BASE_PATH"]
 # Azure Open AI
 deployment = os.environ["AZURE_DEPLOYMENT_NAME"]
 
-client = openai.AsyncAzureOpenAI(
-    azure_endpoint=endpoint,
-    api_key=api_key,
-    api_version=api_version
-)
+# Token counting encoding, loaded off the event loop
+preload_encoding()
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -32,9 +42,77 @@ logger = logging.getLogger(__name__)
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
+# Metrics exported at /api/metrics
+request_duration = histogram(
+    "http_request_duration_seconds", "Duration of HTTP functions, including streamed bodies", ("route", "status")
+)
+register_stats("response_cache", get_response_cache_stats)
+register_stats("fast_validation", get_fast_validation_stats)
+register_stats("speculation", get_speculation_stats)
+register_stats("coverage_rubric", get_rubric_stats)
+register_stats("interview_retrieval", get_retrieval_stats)
+register_stats("interview_context", get_interview_context_stats)
+register_stats("interview_node", get_node_latency_stats, label="node")
+register_stats("llm_limiter", get_rate_limit_stats, label="deployment")
+register_stats("stream", get_stream_stats)
+register_stats("interview_turn", get_turn_guard_stats)
+
+def instrumented(route):
+    """
+    Records the duration of an HTTP function under route. Streaming responses are
+    measured until their last chunk is sent.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(req: Request):
+            start = time.perf_counter()
+            with span(f"http {route}", route=route):
+                response = await handler(req)
+            
+            if isinstance(response, StreamingResponse):
+                body = response.body_iterator
+                
+                async def measured_body():
+                    try:
+                        async with contextlib.aclosing(body):
+                            async for chunk in body:
+                                yield chunk
+                    finally:
+                        observe(request_duration, time.perf_counter() - start, route=route, status=response.status_code)
+                
+                response.body_iterator = measured_body()
+            else:
+                observe(request_duration, time.perf_counter() - start, route=route, status=response.status_code)
+            return response
+        return wrapper
+    return decorator
+
 # Langgraph endpoints for user interview chat
 
+async def interview_event_stream(events):
+    """
+    Streams an interview turn as SSE: "token" events while the interviewer/farewell
+    message is generated, then one "final" (or "error") event with the turn result.
+    """
+    try:
+        async for event, data in events:
+            yield format_sse(data, event=event)
+    except TimeoutError as e:
+        logger.error(f"Error in interview_event_stream: {str(e)}")
+        yield format_sse({"status": "error", "message": "Another turn of this thread is still running"}, event="error")
+    except Exception as e:
+        logger.error(f"Error in interview_event_stream: {str(e)}")
+        yield format_sse({"status": "error", "message": str(e)}, event="error")
+
+async def interview_result_events(**interview_args):
+    """
+    Runs a turn with run_interview_async and yields its result as a single event.
+    """
+    result = await run_interview_async(**interview_args)
+    yield ("final" if result["status"] == "success" else "error"), result
+
 @app.route(route="interview_chat", methods=["POST"])
+@instrumented("interview_chat")
 async def run_interview(req: Request) -> JSONResponse:
     """
     HTTP function that handles requests to run an interview.
@@ -42,7 +120,8 @@ async def run_interview(req: Request) -> JSONResponse:
     try:
         logger.info("Received request for run_interview")
         req_body = await req.json()
-        logger.info(f"Request body: {json.dumps(req_body)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Request body: {json.dumps(req_body)}")
         
       
         if 'thread_id' not in req_body:
@@ -54,17 +133,44 @@ async def run_interview(req: Request) -> JSONResponse:
         thread_id = req_body['thread_id']
         logger.info(f"Processing request for thread_id: {thread_id}")
         
+        interview_args = dict(
+            question=req_body.get('question'),
+            user_data=req_body.get('user_data'),
+            user_response=req_body.get('user_response'),
+            thread_id=thread_id,
+            description=req_body.get('description', ''),
+            language=req_body.get('language', 'es')
+        )
+        
+        # Retries of a turn send the same key and get the first result back
+        idempotency_key = req.headers.get('idempotency-key') or req_body.get('idempotency_key')
+        fingerprint = request_fingerprint(interview_args)
+        if idempotency_key and not check_idempotency_key(thread_id, idempotency_key, fingerprint):
+            return JSONResponse(
+                content={"status": "error", "message": "Idempotency key already used for a different request"},
+                status_code=422
+            )
+        
+        # Streaming mode: send tokens as they are generated
+        stream = req_body.get('stream', req.query_params.get('stream'))
+        if str(stream).lower() in ("true", "1"):
+            return StreamingResponse(
+                interview_event_stream(guarded_turn(
+                    thread_id, idempotency_key, fingerprint,
+                    lambda: stream_interview_async(**interview_args)
+                )),
+                media_type="text/event-stream"
+            )
+        
         try:
             # Execute the interview
             logger.info("Executing interview...")
-            result = await run_interview_async(
-                question=req_body.get('question'),
-                user_data=req_body.get('user_data'),
-                user_response=req_body.get('user_response'),
-                thread_id=thread_id,
-                description=req_body.get('description', ''),
-                language=req_body.get('language', 'es')
-            )
+            result = None
+            async for _, result in guarded_turn(
+                thread_id, idempotency_key, fingerprint,
+                lambda: interview_result_events(**interview_args)
+            ):
+                pass
            
             
            
@@ -74,6 +180,12 @@ async def run_interview(req: Request) -> JSONResponse:
                 status_code=status_code
             )
             
+        except TimeoutError as e:
+            logger.error(f"Error in interview execution: {str(e)}")
+            return JSONResponse(
+                content={"status": "error", "message": "Another turn of this thread is still running"},
+                status_code=409
+            )
         except Exception as e:
             logger.error(f"Error in interview execution: {str(e)}")
             return JSONResponse(
@@ -89,6 +201,7 @@ async def run_interview(req: Request) -> JSONResponse:
         )
 
 @app.route(route="checkpoints", methods=["GET"])
+@instrumented("checkpoints")
 async def get_interview_checkpoints(req: Request) -> JSONResponse:
     """
     HTTP function that gets interview checkpoints.
@@ -104,10 +217,26 @@ async def get_interview_checkpoints(req: Request) -> JSONResponse:
                 status_code=400
             )
         
+        # Optional pagination and lightweight modes
+        limit = req.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit() or int(limit) <= 0:
+                return JSONResponse(
+                    content={"status": "error", "message": "limit must be a positive integer"},
+                    status_code=400
+                )
+            limit = int(limit)
+        
         logger.info(f"Getting checkpoints for thread_id: {thread_id}")
         
       
-        result = await get_checkpoints(thread_id)
+        result = await get_checkpoints(
+            thread_id,
+            limit=limit,
+            before=req.query_params.get('before'),
+            latest_only=req.query_params.get('latest_only', '').lower() in ("true", "1"),
+            summary=req.query_params.get('summary', '').lower() in ("true", "1")
+        )
         
      
         status_code = 200 if result["status"] == "success" else 500
@@ -123,19 +252,137 @@ async def get_interview_checkpoints(req: Request) -> JSONResponse:
             status_code=500
         )
 
+# Checkpoint retention: scheduled cleanup and on-demand admin endpoint
+
+@app.timer_trigger(schedule=os.getenv("CHECKPOINT_RETENTION_SCHEDULE", "0 0 3 * * *"), arg_name="timer", run_on_startup=False)
+async def checkpoint_retention_timer(timer: func.TimerRequest) -> None:
+    """
+    Timer function that compacts checkpoints when CHECKPOINT_RETENTION_ENABLED is true.
+    """
+    if os.getenv("CHECKPOINT_RETENTION_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return
+    
+    logger.info("Running scheduled checkpoint retention")
+    report = await run_retention()
+    logger.info(f"Checkpoint retention report: {json.dumps(report)}")
+
+def parse_flag(body: dict, name: str, default=None):
+    """
+    Reads a boolean from the request body: true/false, or the strings "true"/"false".
+    Raises ValueError for anything else, so "false" never turns into True.
+    """
+    value = body.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError(f"{name} must be true or false")
+
+def parse_positive_int(body: dict, name: str):
+    """
+    Reads an optional positive integer (or digit string) from the request body.
+    Raises ValueError for anything else.
+    """
+    value = body.get(name)
+    if value is None:
+        return None
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+@app.route(route="checkpoint_retention", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+async def run_checkpoint_retention(req: Request) -> JSONResponse:
+    """
+    HTTP function (function key required) that compacts checkpoints on demand.
+    """
+    try:
+        try:
+            body = await req.json()
+        except Exception:
+            body = {}
+        
+        try:
+            options = {
+                "keep_last": parse_positive_int(body, 'keep_last'),
+                "collapse_completed": parse_flag(body, 'collapse_completed'),
+                "batch_size": parse_positive_int(body, 'batch_size'),
+                "max_batches": parse_positive_int(body, 'max_batches'),
+                "dry_run": parse_flag(body, 'dry_run', default=False),
+            }
+        except ValueError as e:
+            return JSONResponse(
+                content={"status": "error", "message": str(e)},
+                status_code=400
+            )
+        
+        report = await run_retention(**options)
+        
+        status_code = 200 if report["status"] == "success" else 500
+        return JSONResponse(
+            content=report,
+            status_code=status_code
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in checkpoint retention: {str(e)}")
+        return JSONResponse(
+            content={"status": "error", "message": str(e)},
+            status_code=500
+        )
+
 
 # AI Endpoints for interview results in user side and Admin interview results (sumary and chat with interview)
 
-async def stream_processor(response):
-    async for chunk in response:
-        if len(chunk.choices) > 0:
-            delta = chunk.choices[0].delta
-            if delta.content: # Get remaining generated response if applicable
-                await asyncio.sleep(0.1)
-                yield delta.content
+@app.route(route="interview_context", methods=["POST"])
+@instrumented("interview_context")
+async def register_interview_context(req: Request) -> JSONResponse:
+    """
+    HTTP function that registers interview data once and returns its content-addressed ID,
+    to be sent as contextId to /api/chat_ia_interview instead of interviewData.
+    """
+    try:
+        body = await req.json()
+        interview_data = body.get('interviewData')
+        
+        if not interview_data:
+            return JSONResponse(
+                content={"status": "error", "message": "interviewData is required"},
+                status_code=400
+            )
+        
+        result = await register_context(interview_data)
+        return JSONResponse(
+            content={"status": "success", **result},
+            status_code=200
+        )
+        
+    except Exception as e:
+        logger.error(f"Error registering interview context: {str(e)}")
+        return JSONResponse(
+            content={"status": "error", "message": str(e)},
+            status_code=500
+        )
+
+def stream_processor(response, req: Request, key: str = None):
+    """
+    Streams an Azure OpenAI completion as SSE data: events, coalescing small
+    deltas according to STREAM_MIN_CHUNK_CHARS / STREAM_MAX_DELAY_MS.
+    The upstream stream is closed as soon as the client disconnects, and with
+    a cache key the complete text is stored in the response cache.
+    """
+    usage = {"completion_tokens": 0}
+    deltas = openai_deltas(response, usage)
+    if key is not None:
+        deltas = caching_deltas(deltas, key)
+    return cancel_on_disconnect(req, sse_text_stream(deltas), usage)
 
 # HTTP streaming Azure Function
 @app.route(route="interview-gpt-openai", methods=["POST"])
+@instrumented("interview-gpt-openai")
 async def stream_openai_text(req: Request) -> StreamingResponse:
    
     # Get variables from the http request body
@@ -146,16 +393,28 @@ async def stream_openai_text(req: Request) -> StreamingResponse:
         prompt = body.get('prompt')
         temperature = body.get('temperature')
         
-        logging.info(f'Python HTTP request body: {prompt}')
+        logging.debug(f'Python HTTP request body: {prompt}')
+        
+        # Bulk result generation yields to interview turns when the deployment is saturated
+        set_llm_priority(PRIORITY_BULK)
+        
+        # Deterministic prompts (temperature 0) are answered from the cache when possible
+        key = cache_key(deployment, prompt, temperature)
+        if key is not None:
+            cached_text = await get_cached_response(key)
+            if cached_text is not None:
+                return StreamingResponse(sse_text_stream(replay_deltas(cached_text)), media_type="text/event-stream")
         
+        # Shared client, uses the same pooled keep-alive transport as the interview graph
+        client = get_openai_client()
         azure_open_ai_response = await client.chat.completions.create(
             model=deployment,
             temperature=temperature,
             messages=[{"role": "user", "content": prompt}],
             stream=True
         )
-
-        return StreamingResponse(stream_processor(azure_open_ai_response), media_type="text/event-stream")
+        
+        return StreamingResponse(stream_processor(azure_open_ai_response, req, key), media_type="text/event-stream")
     
     except Exception as e:
         logging.error(f"Error: {e}")
@@ -165,6 +424,7 @@ async def stream_openai_text(req: Request) -> StreamingResponse:
         )
         
 @app.route(route="chat_ia_interview", methods=["POST"])
+@instrumented("chat_ia_interview")
 async def chat_ia_interview(req: Request) -> StreamingResponse:
     logging.info('Python HTTP trigger function processed a request.')
 
@@ -173,25 +433,47 @@ async def chat_ia_interview(req: Request) -> StreamingResponse:
         input_user = body.get('inputUser')
         system_message_param = body.get('systemMessage')
         interview_data = body.get('interviewData')
+        context_id = body.get('contextId')
         message_history = body.get('messageHistory', [])
         temperature = body.get('temperature')
 
-        if not input_user or not interview_data:
+        if not input_user or not (interview_data or context_id):
             return JSONResponse(
                 content={"error": "Invalid input"},
                 status_code=400
             )
+        
+        # Data registered through /api/interview_context is referenced by its ID
+        data_text = None
+        if not interview_data:
+            context = await get_context(context_id)
+            if context is None:
+                return JSONResponse(
+                    content={"error": "Unknown or expired contextId"},
+                    status_code=404
+                )
+            interview_data, data_text = context["data"], context["text"]
+        else:
+            context_id = None
 
-        system_message = f"You're an assistant who's good at answering questions. Always consider the chat history when answering. Here's the context for this interview: {json.dumps(interview_data)}"
+        set_llm_priority(PRIORITY_ADMIN)
+
+        # Large interviewData is narrowed to the fragments relevant to the question
+        last_user_turn = next((m.get("content") for m in reversed(message_history) if m.get("role") == "user"), "")
+        interview_context, retrieval_info = await build_interview_context(
+            interview_data, f"{input_user} {last_user_turn or ''}", data_text=data_text, key=context_id
+        )
+        logging.info(f"chat_ia_interview context: {retrieval_info}")
+        
+        system_message = f"You're an assistant who's good at answering questions. Always consider the chat history when answering. Here's the context for this interview: {interview_context}"
         
         if system_message_param:
             system_message += f" {system_message_param}"
         
-        messages = [
-            {"role": "system", "content": system_message},
-            *message_history,
-            {"role": "user", "content": input_user}
-        ]
+        # Keep the newest turns within CHAT_HISTORY_TOKEN_BUDGET (older ones optionally summarized)
+        client = get_openai_client()
+        messages, token_counts = await fit_history(client, deployment, system_message, message_history, input_user)
+        logging.info(f"chat_ia_interview token counts: {token_counts}")
 
         response = await client.chat.completions.create(
             model=deployment,
@@ -201,9 +483,16 @@ async def chat_ia_interview(req: Request) -> StreamingResponse:
         )
 
         return StreamingResponse(
-            stream_processor(response),
+            stream_processor(response, req),
             media_type="text/event-stream",
-            status_code=200
+            status_code=200,
+            headers={
+                "X-Prompt-Tokens": str(token_counts["prompt_tokens"]),
+                "X-History-Tokens": str(token_counts["history_tokens"]),
+                "X-Summary-Tokens": str(token_counts["summary_tokens"]),
+                "X-Trimmed-Messages": str(token_counts["trimmed_messages"]),
+                "X-Token-Count-Estimated": "true" if token_counts["estimated"] else "false"
+            }
         )
 
     except Exception as e:
@@ -212,3 +501,24 @@ async def chat_ia_interview(req: Request) -> StreamingResponse:
             content={"error": "Internal Server Error"},
             status_code=500
         )
+
+# Monitoring
+
+@app.route(route="metrics", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+async def get_metrics(req: Request) -> PlainTextResponse:
+    """
+    HTTP function (function key required) that exports node, LLM, checkpoint, pool and
+    cache metrics in the Prometheus text format.
+    """
+    try:
+        return PlainTextResponse(
+            content=render_metrics(),
+            media_type="text/plain; version=0.0.4"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {str(e)}")
+        return JSONResponse(
+            content={"status": "error", "message": str(e)},
+            status_code=500
+        )
@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+from memory_cache import MemoryCache
+from db_connection import get_shared_db_connection
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS interview_context (
+        context_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        expires_at TIMESTAMPTZ NOT NULL
+    )
+"""
+
+UPSERT_SQL = """
+    INSERT INTO interview_context (context_id, data, size, expires_at)
+    VALUES (%s, %s, %s, now() + make_interval(secs => %s))
+    ON CONFLICT (context_id) DO UPDATE SET expires_at = EXCLUDED.expires_at
+"""
+
+# Reading a context extends its lifetime (sliding expiration) in the same round trip
+SELECT_SQL = """
+    UPDATE interview_context
+    SET expires_at = now() + make_interval(secs => %s)
+    WHERE context_id = %s AND expires_at > now()
+    RETURNING data
+"""
+
+DELETE_EXPIRED_SQL = "DELETE FROM interview_context WHERE expires_at <= now()"
+
+interview_context_stats = {
+    "registered": 0,
+    "memory_hits": 0,
+    "postgres_hits": 0,
+    "misses": 0,
+}
+
+_memory_tier = None
+_postgres_ready = False
+
+def get_context_settings() -> Dict:
+    """
+    Interview context store settings read from the environment:
+        INTERVIEW_CONTEXT_TTL (seconds since last use, default 604800 = 7 days)
+        INTERVIEW_CONTEXT_CACHE_SIZE (contexts kept in memory, default 64)
+        INTERVIEW_CONTEXT_CACHE_MAX_BYTES (memory tier, default 256 MB)
+        INTERVIEW_CONTEXT_POSTGRES (persist contexts in Postgres so every instance can
+            resolve them, default true)
+    """
+    return {
+        "ttl": float(os.getenv("INTERVIEW_CONTEXT_TTL", "604800")),
+        "cache_size": int(os.getenv("INTERVIEW_CONTEXT_CACHE_SIZE", "64")),
+        "max_bytes": int(os.getenv("INTERVIEW_CONTEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        "postgres": os.getenv("INTERVIEW_CONTEXT_POSTGRES", "true").lower() in ("1", "true", "yes"),
+    }
+
+def _get_memory_tier(settings: Dict) -> MemoryCache:
+    global _memory_tier
+    if _memory_tier is None:
+        _memory_tier = MemoryCache(
+            max_entries=settings["cache_size"],
+            max_bytes=settings["max_bytes"],
+            ttl=settings["ttl"],
+            sizeof=lambda entry: len(entry["text"]),
+        )
+    return _memory_tier
+
+def context_id_for(interview_data: Any) -> str:
+    """Content-addressed ID: the same data always gets the same ID."""
+    canonical = json.dumps(interview_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _make_entry(interview_data: Any, text: Optional[str] = None) -> Dict:
+    # The serialized text is kept so requests do not re-serialize the data
+    return {"data": interview_data, "text": text or json.dumps(interview_data)}
+
+async def _ensure_table(pool):
+    global _postgres_ready
+    if not _postgres_ready:
+        async with pool.connection() as conn:
+            await conn.execute(CREATE_TABLE_SQL)
+        _postgres_ready = True
+
+async def register_context(interview_data: Any) -> Dict:
+    """
+    Stores interview data and gets its ID. Registering the same data again only
+    extends its lifetime.
+
+    Args:
+        interview_data: interviewData as sent to /api/chat_ia_interview
+
+    Returns:
+        Dict: context_id and size in bytes
+    """
+    settings = get_context_settings()
+    context_id = context_id_for(interview_data)
+    entry = _make_entry(interview_data)
+    _get_memory_tier(settings).set(context_id, entry)
+    interview_context_stats["registered"] += 1
+
+    if settings["postgres"]:
+        _, pool = await get_shared_db_connection()
+        await _ensure_table(pool)
+        async with pool.connection() as conn:
+            await conn.execute(UPSERT_SQL, (context_id, entry["text"], len(entry["text"]), settings["ttl"]))
+            # Clean up now and then rather than on every registration
+            if interview_context_stats["registered"] % 50 == 1:
+                await conn.execute(DELETE_EXPIRED_SQL)
+
+    return {"context_id": context_id, "size": len(entry["text"])}
+
+async def get_context(context_id: str) -> Optional[Dict]:
+    """
+    Looks a context up in memory, then in Postgres.
+
+    Returns:
+        Optional[Dict]: {"data", "text"} or None when unknown or expired
+    """
+    settings = get_context_settings()
+    memory = _get_memory_tier(settings)
+
+    entry = memory.get(context_id)
+    if entry is not None:
+        interview_context_stats["memory_hits"] += 1
+        # Sliding expiration, as in Postgres: storing it again restarts its TTL
+        memory.set(context_id, entry)
+        return entry
+
+    if settings["postgres"]:
+        try:
+            _, pool = await get_shared_db_connection()
+            await _ensure_table(pool)
+            async with pool.connection() as conn:
+                row = await (await conn.execute(SELECT_SQL, (settings["ttl"], context_id))).fetchone()
+            if row is not None:
+                interview_context_stats["postgres_hits"] += 1
+                entry = _make_entry(json.loads(row["data"]), row["data"])
+                memory.set(context_id, entry)
+                return entry
+        except Exception as e:
+            logger.error(f"Error reading interview context: {str(e)}")
+
+    interview_context_stats["misses"] += 1
+    return None
+
+def get_interview_context_stats() -> Dict:
+    """
+    Gets registration and lookup counters.
+    """
+    return {
+        **interview_context_stats,
+        "memory_entries": len(_memory_tier) if _memory_tier is not None else 0,
+        "memory_bytes": _memory_tier.total_bytes if _memory_tier is not None else 0
+    }
@@ -2,13 +2,24 @@ import os
 import sys
 import asyncio
 import json
+import time
 import logging
+import functools
+from collections import OrderedDict, deque
 from typing import Dict, List, Optional, Any, TypedDict, Annotated, Literal
-from langchain_openai import AzureChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage, AIMessage
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage, AIMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from db_connection import get_db_connection
+from langgraph.constants import TAG_NOSTREAM
+from psycopg import OperationalError
+from db_connection import get_shared_db_connection, reset_db_connection
+from llm_clients import get_chat_model, get_node_profile
+from fast_validator import pre_classify
+from coverage_rubric import ensure_rubric, rubric_hash, missing_aspects, format_aspects, parse_covered, strip_covered
+from metrics import histogram, timed
+from token_budget import count_prompt_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,16 +36,100 @@ class InterviewState(TypedDict):
     user_data: Optional[Dict[str, Any]]  # User data
     description: str  # General interview description (optional)
     language: str  # Language in which the interview will be conducted (default 'es')
+    conversation_summary: str  # Running summary of the messages already folded (incremental validation)
+    coverage_notes: str  # Aspects of the question/context covered and missing so far
+    summarized_count: int  # Number of conversation messages folded into the summary
+    summary_hash: str  # Content hash of the question the summary and coverage notes belong to
+    coverage_rubric: List[str]  # Checklist of required aspects derived from the question context
+    rubric_hash: str  # Content hash of the question the rubric belongs to
+    covered_aspects: int  # Bitmap of the rubric aspects already covered
 
-def get_llm():
-    """LLM configuration."""
-    return AzureChatOpenAI(
-        deployment_name=os.getenv("AZURE_DEPLOYMENT_NAME"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        temperature=0.0
+def get_llm(node: Optional[str] = None, max_tokens: Optional[int] = None):
+    """
+    LLM configuration (shared instance, reuses the pooled HTTP clients).
+    
+    Args:
+        node (str): Node whose profile to use (see llm_clients.get_node_profile), None for the default model
+        max_tokens (int): Output cap used when the profile does not set one
+    """
+    profile = get_node_profile(node) if node else {}
+    max_tokens = profile.get("max_tokens") or max_tokens
+    options = {"max_tokens": max_tokens} if max_tokens else {}
+    if profile.get("model"):
+        options["model"] = profile["model"]
+    return get_chat_model(
+        deployment_name=profile.get("deployment_name") or os.getenv("AZURE_DEPLOYMENT_NAME"),
+        temperature=profile.get("temperature", 0.0),
+        **options
     )
 
+def get_output_settings() -> Dict:
+    """
+    Output settings read from the environment:
+        VALIDATION_STRUCTURED_OUTPUT (validation answers through a function call, default false)
+        VALIDATION_MAX_TOKENS (cap on the validation output, 0 disables, default 150)
+        FAREWELL_MAX_TOKENS (cap on the farewell message, 0 disables, default 100)
+    """
+    return {
+        "structured": os.getenv("VALIDATION_STRUCTURED_OUTPUT", "false").lower() in ("1", "true", "yes"),
+        "validation_max_tokens": int(os.getenv("VALIDATION_MAX_TOKENS", "150")),
+        "farewell_max_tokens": int(os.getenv("FAREWELL_MAX_TOKENS", "100")),
+    }
+
+def get_prompt_settings() -> Dict:
+    """
+    Prompt settings read from the environment:
+        CHECKPOINT_SYSTEM_PROMPTS (store the interviewer system prompt in the thread messages,
+            as older versions did, default false: it is rebuilt from the state on every turn)
+    """
+    return {
+        "checkpoint_system_prompts": os.getenv("CHECKPOINT_SYSTEM_PROMPTS", "false").lower() in ("1", "true", "yes"),
+    }
+
+# Function schema used by the structured validation mode
+VALIDATION_SCHEMA = {
+    "title": "validation_verdict",
+    "description": "Verdict on whether the conversation covers the question and its required context.",
+    "type": "object",
+    "properties": {
+        "status": {
+            "type": "string",
+            "enum": ["NS-NR", "COMPLETED", "INCOMPLETE"],
+            "description": "NS-NR only when there is exactly 1 user message"
+        },
+        "reason": {
+            "type": "string",
+            "description": "One short sentence, at most 25 words"
+        },
+        "missing_aspects": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Short names of the aspects still missing, empty unless INCOMPLETE"
+        },
+        "covered_aspects": {
+            "type": "array",
+            "items": {"type": "integer"},
+            "description": "Numbers of the numbered required aspects that the conversation covers"
+        }
+    },
+    "required": ["status", "reason", "missing_aspects"]
+}
+
+def format_validation_output(output) -> str:
+    """
+    Gets the validation text from a structured verdict or a free-text reply.
+    Structured verdicts are written in the free-text format ("STATUS: reason").
+    """
+    if not isinstance(output, dict):
+        return output.content
+    
+    text = f"{output.get('status', 'INCOMPLETE')}: {output.get('reason', '')}".strip()
+    if output.get("missing_aspects"):
+        text += f" Missing: {'; '.join(output['missing_aspects'])}"
+    if output.get("covered_aspects"):
+        text += f"\nCOVERED: {', '.join(str(number) for number in output['covered_aspects'])}"
+    return text
+
 def process_chunks(chunk: Dict) -> Dict:
     """
     Processes agent chunks and extracts relevant messages.
@@ -50,16 +145,16 @@ def process_chunks(chunk: Dict) -> Dict:
     # Check if chunk has expected structure
     if "interviewer" in chunk and "messages" in chunk["interviewer"]:
         for message in chunk["interviewer"]["messages"]:
-            # Only process messages that are not SystemMessage
-            if not isinstance(message, SystemMessage):
+            # Only process conversation messages (no SystemMessage or removals)
+            if not isinstance(message, (SystemMessage, RemoveMessage)):
                 processed_messages.append({
                     "role": "assistant" if isinstance(message, AIMessage) else "user",
                     "content": message.content
                 })
     elif "farewell" in chunk and "messages" in chunk["farewell"]:
         for message in chunk["farewell"]["messages"]:
-            # Only process messages that are not SystemMessage
-            if not isinstance(message, SystemMessage):
+            # Only process conversation messages (no SystemMessage or removals)
+            if not isinstance(message, (SystemMessage, RemoveMessage)):
                 processed_messages.append({
                     "role": "assistant" if isinstance(message, AIMessage) else "user",
                     "content": message.content
@@ -69,8 +164,8 @@ def process_chunks(chunk: Dict) -> Dict:
     is_complete = chunk.get("interviewer", {}).get("is_complete", False) or chunk.get("farewell", {}).get("is_complete", False)
     validation_result = chunk.get("interviewer", {}).get("validation_result", "") or chunk.get("farewell", {}).get("validation_result", "")
     
-    print(f"is_complete value in process_chunks: {is_complete}")
-    print(f"validation_result value in process_chunks: {validation_result}")
+    logger.debug(f"is_complete value in process_chunks: {is_complete}")
+    logger.debug(f"validation_result value in process_chunks: {validation_result}")
     
     return {
         "messages": processed_messages,
@@ -78,12 +173,12 @@ def process_chunks(chunk: Dict) -> Dict:
         "validation_result": validation_result
     }
 
-def rephrase_message(llm, messages, error_data, system_message=None):
+async def rephrase_message(llm, messages, error_data, system_message=None):
     """
     Helper function to rephrase messages when content filter error is detected.
     
     Args:
-        llm: Language model instance
+        llm: Language model instance used for the retried call
         messages: List of messages to process
         error_data: Content filter error data
         system_message: System message with original instructions (optional)
@@ -92,6 +187,9 @@ def rephrase_message(llm, messages, error_data, system_message=None):
         tuple: (updated messages, success)
     """
     try:
+        # The rephrasing prompts use their own profile
+        rephrase_llm = get_llm("rephrase")
+        
         # Get filter results
         filter_result = error_data.get('error', {}).get('innererror', {}).get('content_filter_result', {})
         
@@ -118,7 +216,7 @@ Reformulate the instructions so that:
 4. Is clear and direct, maintaining a professional tone""")
                     
                     # Get the rephrased version of the system_message
-                    rephrased_system_response = llm.invoke([rephrase_system_prompt])
+                    rephrased_system_response = await rephrase_llm.ainvoke([rephrase_system_prompt], config={"tags": [TAG_NOSTREAM]})
                     rephrased_system_content = rephrased_system_response.content
                     
                     # Update the system_message
@@ -148,7 +246,7 @@ Reformulate the response so that:
 4. Is natural and conversational, without being excessively formal""")
                 
                 # Get the rephrased version
-                rephrased_response = llm.invoke([rephrase_prompt])
+                rephrased_response = await rephrase_llm.ainvoke([rephrase_prompt], config={"tags": [TAG_NOSTREAM]})
                 rephrased_message = rephrased_response.content
                 
                 # Update the message in the list
@@ -169,7 +267,7 @@ Reformulate the response so that:
                             messages[0] = system_message
                         
                         # Try the LLM call with updated messages
-                        response = llm.invoke(messages)
+                        response = await llm.ainvoke(messages)
                         logger.info(f"LLM call successful after rephrasing")
                         return messages, True, response
                     except Exception as e:
@@ -184,28 +282,29 @@ Reformulate the response so that:
         logger.error(f"Error rephrasing message: {str(e)}")
         return messages, False, None
 
-def interviewer_node(state: InterviewState) -> InterviewState:
-    """Main node that handles the interview."""
-    try:
-        llm = get_llm()
-        current_question = state["current_question"]
-        user_data = state.get("user_data", {})
-        user_name = user_data.get("user_name", "").split()[0] if user_data and user_data.get("user_name") else ""
-        is_complete = state.get("is_complete", False)
-        description = state.get("description", "")
-        language = state.get("language", "es")
-        
-        logger.info(f"is_complete state in interviewer_node: {is_complete}")
-        
-        # Prepare participant section
-        participant_section = f"PARTICIPANT:\nName: {user_name}\n" if user_name else ""
-        
-        # Determine current state for prompt
-        current_state = "COMPLETED" if is_complete is True else "DOESN'T KNOW/DOESN'T RESPOND" if is_complete == "NS-NR" else "INCOMPLETE"
-        
-        # System prompt
-        system_message = SystemMessage(
-            content=f"""You are a professional, friendly and approachable interviewer. Your goal is to make the participant feel comfortable while getting a complete answer to the question.
+def build_interviewer_prompt(state: InterviewState) -> SystemMessage:
+    """Builds the interviewer system prompt for the current question and coverage."""
+    current_question = state["current_question"]
+    user_data = state.get("user_data", {})
+    user_name = user_data.get("user_name", "").split()[0] if user_data and user_data.get("user_name") else ""
+    is_complete = state.get("is_complete", False)
+    description = state.get("description", "")
+    language = state.get("language", "es")
+    
+    # Prepare participant section
+    participant_section = f"PARTICIPANT:\nName: {user_name}\n" if user_name else ""
+    
+    # Determine current state for prompt
+    current_state = "COMPLETED" if is_complete is True else "DOESN'T KNOW/DOESN'T RESPOND" if is_complete == "NS-NR" else "INCOMPLETE"
+    
+    # With a rubric, only the aspects still missing are listed
+    rubric = state.get("coverage_rubric") or []
+    missing = missing_aspects(rubric, state.get("covered_aspects"))
+    context_to_explore = format_aspects(missing) if rubric else current_question['context']
+    
+    # System prompt
+    return SystemMessage(
+        content=f"""You are a professional, friendly and approachable interviewer. Your goal is to make the participant feel comfortable while getting a complete answer to the question.
 
 IMPORTANT ABOUT LANGUAGE:
 1. YOU MUST RESPOND IN THE SAME LANGUAGE IN WHICH THE QUESTION IS FORMULATED
@@ -217,7 +316,7 @@ CURRENT QUESTION:
 {current_question['question']}
 
 SPECIFIC CONTEXT TO EXPLORE ABOUT CURRENT QUESTION:
-{current_question['context']}
+{context_to_explore}
 
 INTERVIEW INFORMATION:
 This is an interview about {description}
@@ -266,11 +365,40 @@ IMPORTANT:
 - DO NOT ALLOW DEVIATIONS FROM THE CURRENT QUESTION AND CONTEXT
 - RESPOND IN THE SAME LANGUAGE AS THE QUESTION, or in {language.upper()} if not clear
 """
-        )
+    )
+
+async def interviewer_node(state: InterviewState) -> InterviewState:
+    """Main node that handles the interview."""
+    try:
+        llm = get_llm("interviewer")
+        is_complete = state.get("is_complete", False)
+        logger.info(f"is_complete state in interviewer_node: {is_complete}")
         
+        # With a rubric, only the aspects still missing are listed
+        rubric = state.get("coverage_rubric") or []
+        missing = missing_aspects(rubric, state.get("covered_aspects"))
+        
+        # System prompt
+        system_message = build_interviewer_prompt(state)
+        
+        llm_messages = None
+        stored_prompts = []
+        checkpoint_prompts = get_prompt_settings()["checkpoint_system_prompts"]
+        if not checkpoint_prompts:
+            # Only the conversation is checkpointed, the prompt is sent in front of it. Prompts
+            # stored by older versions are skipped and removed from the thread on this turn
+            stored_prompts = [msg for msg in state["messages"] if isinstance(msg, SystemMessage)]
+            state["messages"] = [msg for msg in state["messages"] if not isinstance(msg, SystemMessage)]
+            llm_messages = [system_message] + state["messages"]
         # If there are no previous messages or the first message is not the system message
-        if not state["messages"] or not isinstance(state["messages"][0], SystemMessage):
+        elif not state["messages"] or not isinstance(state["messages"][0], SystemMessage):
             state["messages"] = [system_message] + state["messages"]
+        elif rubric:
+            # The stored system message lists the aspects missing at the first turn, send the current ones
+            coverage_note = SystemMessage(
+                content=f"SPECIFIC CONTEXT STILL TO EXPLORE ABOUT CURRENT QUESTION:\n{format_aspects(missing) or 'All aspects are covered.'}"
+            )
+            llm_messages = state["messages"] + [coverage_note]
         
         # Maximum number of attempts
         max_retries = 3
@@ -279,7 +407,7 @@ IMPORTANT:
         while retry_count < max_retries:
             try:
                 # Get LLM response
-                response = llm.invoke(state["messages"])
+                response = await llm.ainvoke(llm_messages or state["messages"])
               
                 break
             except Exception as e:
@@ -290,7 +418,11 @@ IMPORTANT:
                     
                     
                     # Try to rephrase the message and get LLM response
-                    state["messages"], success, llm_response = rephrase_message(llm, state["messages"], error_data, system_message)
+                    state["messages"], success, llm_response = await rephrase_message(llm, state["messages"], error_data, system_message)
+                    if not checkpoint_prompts:
+                        # The rephrased prompt comes first, keep it out of the stored messages
+                        llm_messages = state["messages"]
+                        state["messages"] = [msg for msg in llm_messages if not isinstance(msg, SystemMessage)]
                     
                     if success and llm_response:
                         response = llm_response
@@ -304,7 +436,7 @@ IMPORTANT:
         
         return {
             **state,
-            "messages": state["messages"] + [response]
+            "messages": state["messages"] + [response] + [RemoveMessage(id=msg.id) for msg in stored_prompts if msg.id]
         }
         
     except Exception as e:
@@ -315,20 +447,214 @@ IMPORTANT:
             "messages": state["messages"] + [error_message]
         }
 
-def validate_response(state: InterviewState) -> InterviewState:
+def get_summary_settings() -> Dict:
+    """
+    Incremental validation settings read from the environment:
+        VALIDATION_SUMMARY_ENABLED (validate a running summary plus the new messages, default false)
+        VALIDATION_SUMMARY_THRESHOLD (unsummarized messages that trigger a summary update, default 8)
+        VALIDATION_SUMMARY_KEEP_RECENT (latest messages always sent verbatim, default 4)
+    """
+    return {
+        "enabled": os.getenv("VALIDATION_SUMMARY_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "threshold": int(os.getenv("VALIDATION_SUMMARY_THRESHOLD", "8")),
+        "keep_recent": int(os.getenv("VALIDATION_SUMMARY_KEEP_RECENT", "4")),
+    }
+
+def format_transcript(messages: List[BaseMessage]) -> str:
+    """Formats conversation messages as Interviewer/Participant lines."""
+    return "\n".join([
+        f"{'Interviewer' if isinstance(msg, AIMessage) else 'Participant'}: {msg.content}"
+        for msg in messages
+    ])
+
+async def update_conversation_summary(llm, current_question: Dict, summary: str, coverage_notes: str, new_messages: List[BaseMessage]) -> Dict:
+    """
+    Folds messages into the running conversation summary and coverage notes.
+    
+    Args:
+        llm: Language model instance
+        current_question (Dict): Current question and its context
+        summary (str): Previous summary (empty when starting)
+        coverage_notes (str): Previous coverage notes
+        new_messages (List[BaseMessage]): Messages to fold into the summary
+        
+    Returns:
+        Dict: Updated conversation_summary and coverage_notes
+    """
+    system_message = SystemMessage(
+        content=f"""You keep a running summary of an interview so it can be evaluated without the full transcript.
+
+QUESTION:
+{current_question['question']}
+
+REQUIRED CONTEXT:
+{current_question['context']}
+
+INSTRUCTIONS:
+1. Merge the new messages into the previous summary
+2. Keep every fact, example and detail the participant gave that is relevant to the question and context
+3. Keep any statement where the participant says they don't know, don't want to respond, have nothing more to add or want to move on
+4. Do not add interpretations or information that was not said
+5. Be concise
+
+Respond EXACTLY with this format:
+SUMMARY: [summary of the conversation so far]
+COVERAGE: [aspects of the question and context already covered, and aspects still missing]
+"""
+    )
+    
+    response = await llm.ainvoke([
+        system_message,
+        HumanMessage(content=f"""Previous summary:
+{summary or '(none)'}
+
+Previous coverage notes:
+{coverage_notes or '(none)'}
+
+New messages:
+{format_transcript(new_messages)}""")
+    ])
+    
+    new_summary, _, new_coverage = response.content.strip().partition("COVERAGE:")
+    new_summary = new_summary.strip()
+    if new_summary.startswith("SUMMARY:"):
+        new_summary = new_summary[len("SUMMARY:"):].strip()
+    
+    if not new_summary:
+        raise ValueError("Empty conversation summary")
+    
+    return {
+        "conversation_summary": new_summary,
+        "coverage_notes": new_coverage.strip()
+    }
+
+async def build_validation_input(llm, state: InterviewState, conversation_messages: List[BaseMessage]):
+    """
+    Builds the conversation text sent for validation.
+    
+    With VALIDATION_SUMMARY_ENABLED, once more than VALIDATION_SUMMARY_THRESHOLD messages
+    are not covered by the summary, the older ones are folded into it and only the summary,
+    the coverage notes and the latest messages are sent. Short conversations, and any
+    failure while summarizing, fall back to the complete transcript. The summary is keyed
+    to the question (summary_hash) and starts over when the question changes.
+    
+    Returns:
+        tuple: (text for the validation prompt, state updates to persist)
+    """
+    full_transcript = f"Complete conversation to analyze:\n{format_transcript(conversation_messages)}"
+    settings = get_summary_settings()
+    if not settings["enabled"]:
+        return full_transcript, {}
+    
+    current_question = state["current_question"]
+    key = rubric_hash(current_question.get("question", ""), current_question.get("context", ""))
+    reset = {}
+    summarized_count = state.get("summarized_count") or 0
+    if state.get("summary_hash") != key:
+        # The summary belongs to another question, start over
+        summarized_count = 0
+        reset = {"conversation_summary": "", "coverage_notes": "", "summarized_count": 0, "summary_hash": key}
+    elif summarized_count > len(conversation_messages):
+        # Messages were removed or rewritten since the summary was built
+        summarized_count = 0
+    
+    updates = dict(reset)
+    summary = (state.get("conversation_summary") or "") if summarized_count else ""
+    coverage = (state.get("coverage_notes") or "") if summarized_count else ""
+    
+    if len(conversation_messages) - summarized_count > settings["threshold"]:
+        fold_until = max(summarized_count, len(conversation_messages) - settings["keep_recent"])
+        try:
+            updates = await update_conversation_summary(
+                llm, current_question, summary, coverage,
+                conversation_messages[summarized_count:fold_until]
+            )
+            updates["summarized_count"] = fold_until
+            updates["summary_hash"] = key
+            summary, coverage, summarized_count = updates["conversation_summary"], updates["coverage_notes"], fold_until
+        except Exception as e:
+            logger.error(f"Error in update_conversation_summary: {str(e)}")
+            return full_transcript, reset
+    
+    if not summarized_count or not summary:
+        return full_transcript, updates
+    
+    text = f"""Summary of the earlier conversation:
+{summary}
+
+Coverage notes:
+{coverage or '(none)'}
+
+Latest messages:
+{format_transcript(conversation_messages[summarized_count:])}"""
+    return text, updates
+
+async def validate_response(state: InterviewState) -> InterviewState:
     """Node that validates if the response is complete according to context, considering the entire conversation."""
     try:
-        llm = get_llm()
+        llm = get_llm("validate_response")
         current_question = state["current_question"]
         messages = state["messages"]
-        print(f"current_question: {current_question['context']}")
+        logger.debug(f"current_question: {current_question['context']}")
+        
+        # Checklist of required aspects (COVERAGE_RUBRIC_ENABLED), generated once per question
+        rubric_updates = await ensure_rubric(get_llm("rubric"), state)
+        rubric = rubric_updates.get("coverage_rubric") or []
+        covered = rubric_updates.get("covered_aspects") or 0
         
         # Only validate if there are user messages
         if not messages or not any(isinstance(msg, HumanMessage) for msg in messages):
-            return state
+            return {
+                **state,
+                **rubric_updates
+            }
             
+        # Obvious replies ("no sé", "nothing more to add") are decided without the LLM
+        fast_result = pre_classify(messages, state.get("language", "es"))
+        if fast_result is not None:
+            logger.info(f"State set to: {fast_result['is_complete']} (fast path)")
+            return {
+                **state,
+                **rubric_updates,
+                **fast_result
+            }
+        
         # Calculate number of user messages
         user_messages_count = len([msg for msg in messages if isinstance(msg, HumanMessage)])
+        
+        # Capped output, optionally as a structured verdict
+        output_settings = get_output_settings()
+        capped_llm = get_llm("validate_response", max_tokens=output_settings["validation_max_tokens"])
+        if output_settings["structured"]:
+            validator = capped_llm.with_structured_output(VALIDATION_SCHEMA, method="function_calling")
+            response_instruction = """4. Answer through the validation_verdict function:
+   - status: "NS-NR" (only when there are exactly 1 user message), "COMPLETED" or "INCOMPLETE"
+   - reason: one short sentence explaining the status
+   - missing_aspects: the aspects still missing (empty unless INCOMPLETE)
+"""
+        else:
+            validator = capped_llm
+            response_instruction = """4. Respond EXACTLY with one of these formats:
+   a) "NS-NR: [explanation]" - Only for first response (when there are exactly 1 user message)
+   b) "COMPLETED: [explanation of how the conversation covered everything]"
+   c) "INCOMPLETE: [list of missing aspects]"
+"""
+        
+        # With a rubric, only the aspects not covered yet are evaluated
+        if rubric:
+            missing = missing_aspects(rubric, covered)
+            required_context = (
+                f"Aspects still to cover (aspects already covered are omitted):\n{format_aspects(missing)}"
+                if missing else "All required aspects are already covered, only the question must be answered."
+            )
+            coverage_instruction = """
+5. Fill covered_aspects with the numbers of the aspects listed in REQUIRED CONTEXT that the conversation covers
+""" if output_settings["structured"] else """
+5. On a last separate line write "COVERED: " followed by the numbers of the aspects listed in REQUIRED CONTEXT that the conversation covers (for example "COVERED: 1, 3"), or "COVERED: none"
+"""
+        else:
+            required_context = current_question['context']
+            coverage_instruction = ""
             
         # System prompt for validation
         system_message = SystemMessage(
@@ -341,7 +667,7 @@ QUESTION TO EVALUATE:
 
 ====================================================================
 REQUIRED CONTEXT:
-{current_question['context']}
+{required_context}
 ====================================================================
 
 ====================================================================
@@ -369,20 +695,15 @@ INSTRUCTIONS:
      * Mark as "COMPLETED" if the user expresses they have nothing more to add or want to finish
    - If there are more than 1 user message, ignore this special case and evaluate according to normal criteria
 
-4. Respond EXACTLY with one of these formats:
-   a) "NS-NR: [explanation]" - Only for first response (when there are exactly 1 user message)
-   b) "COMPLETED: [explanation of how the conversation covered everything]"
-   c) "INCOMPLETE: [list of missing aspects]"
-
+{response_instruction}
+{coverage_instruction}
 """
         )
         
-        # Get the entire conversation in text format
-        conversation = "\n".join([
-            f"{'Interviewer' if isinstance(msg, AIMessage) else 'Participant'}: {msg.content}"
-            for msg in messages
-            if not isinstance(msg, SystemMessage)
-        ])
+        # Get the conversation in text format (the full transcript, or summary plus latest messages)
+        conversation, summary_updates = await build_validation_input(
+            get_llm("summary"), state, [msg for msg in messages if not isinstance(msg, SystemMessage)]
+        )
         
         # Maximum number of attempts
         max_retries = 3
@@ -391,13 +712,23 @@ INSTRUCTIONS:
         while retry_count < max_retries:
             try:
                 # Invoke LLM for validation
-                validation_result = llm.invoke([
+                validation_output = await validator.ainvoke([
                     system_message, 
-                    HumanMessage(content=f"Complete conversation to analyze:\n{conversation}")
+                    HumanMessage(content=conversation)
                 ])
-                print(f"Validation result: {validation_result.content}")
+                if validation_output is None:
+                    # No function call in the reply, ask again in free text
+                    raise OutputParserException("Validation verdict missing")
+                validation_result = format_validation_output(validation_output)
+                logger.debug(f"Validation result: {validation_result}")
                 break
             except Exception as e:
+                if isinstance(e, OutputParserException) and validator is not capped_llm:
+                    logger.info(f"Structured validation failed, falling back to free text: {str(e)}")
+                    validator = capped_llm
+                    retry_count += 1
+                    continue
+                
                 error_data = getattr(e, 'response', {}).json() if hasattr(e, 'response') else {}
                 
                 # Check if it's a content filter error
@@ -405,10 +736,10 @@ INSTRUCTIONS:
                     logger.info(f"[ERROR] --> Content filter activated (Attempt {retry_count + 1}/{max_retries})")
                     
                     # Try to rephrase the message and get LLM response
-                    messages, success, llm_response = rephrase_message(llm, messages, error_data, system_message)
+                    messages, success, llm_response = await rephrase_message(llm, messages, error_data, system_message)
                     
                     if success and llm_response:
-                        validation_result = llm_response
+                        validation_result = llm_response.content
                         break
                     elif success:
                         retry_count += 1
@@ -418,45 +749,49 @@ INSTRUCTIONS:
                 raise
         
         # Determine response status
-        if "NS-NR:" in validation_result.content and len([m for m in messages if isinstance(m, HumanMessage)]) <= 1:
+        if "NS-NR:" in validation_result and len([m for m in messages if isinstance(m, HumanMessage)]) <= 1:
             # Only assign NS-NR if it's the user's first response
             is_complete = "NS-NR"
-        elif "COMPLETED:" in validation_result.content:
+        elif "COMPLETED:" in validation_result:
             is_complete = True
         else:
             is_complete = False
         
         logger.info(f"State set to: {is_complete}")
         
+        if rubric:
+            rubric_updates["covered_aspects"] = parse_covered(validation_result, rubric, covered)
+        validation_result = strip_covered(validation_result)
+        
         return {
             **state,
+            **rubric_updates,
+            **summary_updates,
             "is_complete": is_complete,
-            "validation_result": validation_result.content
+            "validation_result": validation_result
         }
         
     except Exception as e:
         logger.error(f"Error in validate_response: {str(e)}")
         return state
 
-def farewell_node(state: InterviewState) -> InterviewState:
-    """Node that handles farewell messages when the response is complete."""
-    try:
-        llm = get_llm()
-        current_question = state["current_question"]
-        user_data = state.get("user_data", {})
-        user_name = user_data.get("user_name", "").split()[0] if user_data and user_data.get("user_name") else ""
-        language = state.get("language", "es")
-        
-        # Get the last participant message
-        last_user_message = None
-        for msg in reversed(state["messages"]):
-            if isinstance(msg, HumanMessage):
-                last_user_message = msg.content
-                break
-        
-        # Prompt to generate the farewell message
-        farewell_prompt = SystemMessage(
-            content=f"""You are a professional and friendly interviewer. Your task is to generate an appropriate farewell message based on the following information:
+def build_farewell_prompt(state: InterviewState) -> SystemMessage:
+    """Builds the prompt that asks for the farewell message."""
+    current_question = state["current_question"]
+    user_data = state.get("user_data", {})
+    user_name = user_data.get("user_name", "").split()[0] if user_data and user_data.get("user_name") else ""
+    language = state.get("language", "es")
+    
+    # Get the last participant message
+    last_user_message = None
+    for msg in reversed(state["messages"]):
+        if isinstance(msg, HumanMessage):
+            last_user_message = msg.content
+            break
+    
+    # Prompt to generate the farewell message
+    return SystemMessage(
+        content=f"""You are a professional and friendly interviewer. Your task is to generate an appropriate farewell message based on the following information:
 
 IMPORTANT ABOUT LANGUAGE:
 1. YOU MUST RESPOND IN THE SAME LANGUAGE IN WHICH THE QUESTION IS FORMULATED
@@ -490,10 +825,16 @@ IMPORTANT:
 - YOU MUST respond with the farewell message directly
 - DO NOT include any other text or format
 """
-        )
+    )
+
+async def farewell_node(state: InterviewState) -> InterviewState:
+    """Node that handles farewell messages when the response is complete."""
+    try:
+        llm = get_llm("farewell", max_tokens=get_output_settings()["farewell_max_tokens"])
+        farewell_prompt = build_farewell_prompt(state)
         
         # Get the farewell message from LLM
-        response = llm.invoke([farewell_prompt])
+        response = await llm.ainvoke([farewell_prompt])
         
         return {
             **state,
@@ -510,12 +851,207 @@ IMPORTANT:
             "is_complete": True
         }
 
-def build_graph(checkpointer=None) -> StateGraph:
+# Per-node latency, used to tune the node -> deployment mapping (LLM_PROFILE_<NODE>)
+_NODE_LATENCY_SAMPLES = 500
+node_latency_stats: Dict[str, Dict] = {}
+node_duration = histogram("interview_node_duration_seconds", "Duration of each interview graph node", ("node",))
+
+def _record_node_latency(node_name: str, seconds: float):
+    stats = node_latency_stats.setdefault(node_name, {
+        "calls": 0,
+        "total_seconds": 0.0,
+        "max_seconds": 0.0,
+        "samples": deque(maxlen=_NODE_LATENCY_SAMPLES)
+    })
+    stats["calls"] += 1
+    stats["total_seconds"] += seconds
+    stats["max_seconds"] = max(stats["max_seconds"], seconds)
+    stats["samples"].append(seconds)
+    logger.info(f"Node {node_name} took {seconds * 1000:.0f} ms")
+
+def timed_node(node_name: str, node):
+    """Wraps a graph node so its latency is recorded under node_name."""
+    @functools.wraps(node)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with timed(node_duration, f"node {node_name}", node=node_name):
+                return await node(*args, **kwargs)
+        finally:
+            _record_node_latency(node_name, time.perf_counter() - start)
+    return wrapper
+
+def get_node_latency_stats() -> Dict:
+    """
+    Gets the latency of each graph node (milliseconds) with the deployment it is mapped to.
+    p50/p95 are computed over the last samples.
+    """
+    report = {}
+    for node_name, stats in node_latency_stats.items():
+        samples = sorted(stats["samples"])
+        profile = get_node_profile(node_name)
+        report[node_name] = {
+            "profile": profile["profile"],
+            "deployment": profile["deployment_name"],
+            "calls": stats["calls"],
+            "avg_ms": stats["total_seconds"] / stats["calls"] * 1000,
+            "p50_ms": samples[len(samples) // 2] * 1000,
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            "max_ms": stats["max_seconds"] * 1000
+        }
+    return report
+
+# Speculative execution: while validate_response runs, the node that will most
+# likely follow is started with the same input. If validation routes there (with
+# the same is_complete the speculative run assumed) its result is committed,
+# otherwise it is cancelled and the right node runs as usual.
+_speculative_runs = {}  # thread_id -> (node name, assumed is_complete, task, input state)
+_SPECULATION_HINTS_MAX_SIZE = 10000
+_speculation_hints = OrderedDict()  # thread_id -> is_complete of the previous turn
+speculation_stats = {
+    "attempts": 0,
+    "hits": 0,
+    "misses": 0,
+    "cancelled": 0,
+    "wasted_prompt_tokens": 0,
+    "wasted_completion_tokens": 0,
+}
+
+def is_speculative_enabled() -> bool:
+    """Speculative mode is enabled with INTERVIEW_SPECULATIVE=true."""
+    return os.getenv("INTERVIEW_SPECULATIVE", "false").lower() in ("1", "true", "yes")
+
+def get_speculation_stats() -> Dict:
+    """
+    Gets speculation counters and the hit rate.
+    """
+    attempts = speculation_stats["attempts"]
+    return {
+        **speculation_stats,
+        "hit_rate": speculation_stats["hits"] / attempts if attempts else 0.0
+    }
+
+def _predict_next_node(thread_id: str):
+    """
+    Predicts the node after validation from the previous turn's is_complete.
+    
+    Returns:
+        tuple: (node name, is_complete value the speculative run assumes)
+    """
+    if _speculation_hints.get(thread_id) is True:
+        return "farewell", True
+    return "interviewer", False
+
+def _remember_hint(thread_id: str, is_complete):
+    _speculation_hints[thread_id] = is_complete
+    _speculation_hints.move_to_end(thread_id)
+    while len(_speculation_hints) > _SPECULATION_HINTS_MAX_SIZE:
+        _speculation_hints.popitem(last=False)
+
+def _count_wasted_tokens(task: asyncio.Task):
+    """Adds the usage of a discarded speculative result to the waste counters."""
+    if task.cancelled() or task.exception() is not None:
+        return
+    # The reply is followed by the removals of stored prompts, if any
+    response = next((msg for msg in reversed(task.result()["messages"]) if isinstance(msg, AIMessage)), None)
+    usage = getattr(response, "usage_metadata", None) or {}
+    speculation_stats["wasted_prompt_tokens"] += usage.get("input_tokens", 0)
+    speculation_stats["wasted_completion_tokens"] += usage.get("output_tokens", 0)
+
+def _estimate_prompt_tokens(node_name: str, state: InterviewState) -> int:
+    """Estimates the prompt a speculative node sends, for runs cancelled before their usage is known."""
+    try:
+        if node_name == "farewell":
+            prompt = [build_farewell_prompt(state)]
+        else:
+            conversation = [msg for msg in state["messages"] if not isinstance(msg, SystemMessage)]
+            prompt = [build_interviewer_prompt(state)] + conversation
+        return count_prompt_tokens([{"role": msg.type, "content": msg.content} for msg in prompt])
+    except Exception as e:
+        logger.error(f"Error estimating speculative prompt tokens: {str(e)}")
+        return 0
+
+def _discard_speculative_run(run):
+    """
+    Cancels a speculative run whose result will not be used, or discards its
+    result, and adds its cost to the waste counters. A cancelled call counts its
+    estimated prompt: it may already have been sent, and billed.
+    """
+    node_name, _, task, speculative_state = run
+    if task.done():
+        _count_wasted_tokens(task)
+        return
+    speculation_stats["cancelled"] += 1
+    task.cancel()
+    speculation_stats["wasted_prompt_tokens"] += _estimate_prompt_tokens(node_name, speculative_state)
+
+def cancel_speculative_run(thread_id: str):
+    """Cancels the pending speculative run of a thread, e.g. when its graph run was aborted."""
+    run = _speculative_runs.pop(thread_id, None)
+    if run is not None:
+        _discard_speculative_run(run)
+
+async def speculative_validate_response(state: InterviewState, config: RunnableConfig) -> InterviewState:
+    """validate_response that starts the predicted next node concurrently."""
+    thread_id = config.get("configurable", {}).get("thread_id")
+    messages = state.get("messages") or []
+    
+    if thread_id is not None and any(isinstance(msg, HumanMessage) for msg in messages):
+        node_name, assumed_is_complete = _predict_next_node(thread_id)
+        node = farewell_node if node_name == "farewell" else interviewer_node
+        
+        # Own copy of the state, the nodes mutate their input
+        speculative_state = {**state, "messages": list(messages), "is_complete": assumed_is_complete}
+        cancel_speculative_run(thread_id)
+        task = asyncio.create_task(node(speculative_state))
+        # The node mutates its input, keep a copy to estimate the prompt if it is cancelled
+        _speculative_runs[thread_id] = (node_name, assumed_is_complete, task, {**speculative_state, "messages": list(messages)})
+        speculation_stats["attempts"] += 1
+    
+    return await validate_response(state)
+
+async def _take_speculative_result(node_name: str, state: InterviewState, config: RunnableConfig):
+    """
+    Returns the speculative result for this node if the prediction was right,
+    otherwise cancels or discards it and returns None.
+    """
+    thread_id = config.get("configurable", {}).get("thread_id")
+    _remember_hint(thread_id, state.get("is_complete"))
+    
+    run = _speculative_runs.pop(thread_id, None)
+    if run is None:
+        return None
+    
+    predicted_node, assumed_is_complete, task, _ = run
+    if predicted_node == node_name and assumed_is_complete == state.get("is_complete"):
+        speculation_stats["hits"] += 1
+        result = await task
+        # The node only adds messages; the rest of its copy predates validation
+        # (summary, coverage and rubric updates), keep the validated state
+        return {**state, "messages": result["messages"]}
+    
+    speculation_stats["misses"] += 1
+    _discard_speculative_run(run)
+    return None
+
+async def speculative_interviewer_node(state: InterviewState, config: RunnableConfig) -> InterviewState:
+    """interviewer_node that reuses the speculative result when it matches."""
+    result = await _take_speculative_result("interviewer", state, config)
+    return result if result is not None else await interviewer_node(state)
+
+async def speculative_farewell_node(state: InterviewState, config: RunnableConfig) -> InterviewState:
+    """farewell_node that reuses the speculative result when it matches."""
+    result = await _take_speculative_result("farewell", state, config)
+    return result if result is not None else await farewell_node(state)
+
+def build_graph(checkpointer=None, speculative: bool = False, **compile_options) -> StateGraph:
     """
     Builds the interview graph.
     
     Args:
         checkpointer: The graph checkpointer
+        speculative (bool): Start the likely next node concurrently with validation
+        **compile_options: Extra options for StateGraph.compile (debug, interrupt_before, ...)
         
     Returns:
         StateGraph: The compiled graph
@@ -523,9 +1059,14 @@ def build_graph(checkpointer=None) -> StateGraph:
     workflow = StateGraph(InterviewState)
     
     # Add nodes
-    workflow.add_node("validate_response", validate_response)
-    workflow.add_node("interviewer", interviewer_node)
-    workflow.add_node("farewell", farewell_node)
+    if speculative:
+        workflow.add_node("validate_response", timed_node("validate_response", speculative_validate_response))
+        workflow.add_node("interviewer", timed_node("interviewer", speculative_interviewer_node))
+        workflow.add_node("farewell", timed_node("farewell", speculative_farewell_node))
+    else:
+        workflow.add_node("validate_response", timed_node("validate_response", validate_response))
+        workflow.add_node("interviewer", timed_node("interviewer", interviewer_node))
+        workflow.add_node("farewell", timed_node("farewell", farewell_node))
     
     # Define flow: START -> validate_response -> conditional_edge -> interviewer/farewell -> END
     workflow.add_edge(START, "validate_response")
@@ -550,21 +1091,87 @@ def build_graph(checkpointer=None) -> StateGraph:
     workflow.add_edge("interviewer", END)
     workflow.add_edge("farewell", END)
     
-    return workflow.compile(checkpointer=checkpointer)
+    return workflow.compile(checkpointer=checkpointer, **compile_options)
+
+# Compiled graphs cached by checkpointer and compile options.
+# The graph is stateless (state lives in the checkpointer), so one compiled
+# instance can serve every request of the worker.
+_GRAPH_CACHE_MAX_SIZE = 8
+_graph_cache = OrderedDict()
+
+def _freeze_option(value):
+    """Makes a compile option hashable so it can be part of the cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze_option(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze_option(v) for v in value)
+    return value
 
-def get_interview_graph(checkpointer=None):
+def get_interview_graph(checkpointer=None, **compile_options):
     """
-    Gets the compiled graph.
+    Gets the compiled graph, building it only the first time for a given
+    checkpointer and options.
     
     Args:
         checkpointer: The graph checkpointer
+        **compile_options: Options for build_graph (speculative, ...) and StateGraph.compile
         
     Returns:
         StateGraph: The compiled graph
     """
-    graph = build_graph(checkpointer)
+    key = (id(checkpointer), _freeze_option(compile_options))
+    cached = _graph_cache.get(key)
+    
+    # Compare identity too, id() can be reused once a checkpointer is discarded
+    if cached is not None and cached[0] is checkpointer:
+        _graph_cache.move_to_end(key)
+        return cached[1]
+    
+    graph = build_graph(checkpointer, **compile_options)
+    _graph_cache[key] = (checkpointer, graph)
+    _graph_cache.move_to_end(key)
+    
+    while len(_graph_cache) > _GRAPH_CACHE_MAX_SIZE:
+        _graph_cache.popitem(last=False)
+    
     return graph
 
+def clear_graph_cache():
+    """Drops every cached compiled graph."""
+    _graph_cache.clear()
+
+def build_initial_state(question: Dict = None, user_data: Dict = None, user_response: str = None, description: str = "", language: str = "es") -> Dict:
+    """
+    Builds the graph input for one interview turn.
+    
+    Args:
+        question (Dict): Current question and its context, including question_number and total_questions
+        user_data (Dict): User data
+        user_response (str): User response if exists
+        description (str): General interview description (optional)
+        language (str): Language in which the interview will be conducted (default 'es')
+        
+    Returns:
+        Dict: Initial state
+    """
+    return {
+        "messages": [HumanMessage(content=user_response)] if user_response else [],
+        "current_question": {
+            "question": question.get("question", "") if question else "",
+            "context": question.get("context", "") if question else "",
+            "question_number": question.get("question_number", 1) if question else 1,
+            "total_questions": question.get("total_questions", 1) if question else 1
+        },
+        # Also kept as plain channels, stored inline so retention can read them in SQL
+        "question_number": question.get("question_number", 1) if question else 1,
+        "total_questions": question.get("total_questions", 1) if question else 1,
+        "is_complete": False,
+        "validation_result": "",
+        "user_data": user_data or {},
+        "description": description,
+        "language": language
+    }
+
 async def run_interview_async(question: Dict = None, user_data: Dict = None, user_response: str = None, thread_id: str = "test-thread", description: str = "", language: str = "es"):
     """
     Main function that runs the interview asynchronously.
@@ -582,30 +1189,17 @@ async def run_interview_async(question: Dict = None, user_data: Dict = None, use
     """
     try:
         # Form initial state
-        state = {
-            "messages": [HumanMessage(content=user_response)] if user_response else [],
-            "current_question": {
-                "question": question.get("question", "") if question else "",
-                "context": question.get("context", "") if question else "",
-                "question_number": question.get("question_number", 1) if question else 1,
-                "total_questions": question.get("total_questions", 1) if question else 1
-            },
-            "is_complete": False,
-            "validation_result": "",
-            "user_data": user_data or {},
-            "description": description,
-            "language": language
-        }
+        state = build_initial_state(question, user_data, user_response, description, language)
         
         # Configuration for checkpointer
         config = {"configurable": {"thread_id": thread_id}}
         
-        # Get checkpointer
-        checkpointer, pool = await get_db_connection()
+        # Get shared checkpointer (the pool stays open for the next requests)
+        checkpointer, pool = await get_shared_db_connection()
         
         try:
             # Get graph with checkpointer
-            graph = get_interview_graph(checkpointer=checkpointer)
+            graph = get_interview_graph(checkpointer=checkpointer, speculative=is_speculative_enabled())
             
             # List to store processed messages
             processed_messages = []
@@ -637,9 +1231,11 @@ async def run_interview_async(question: Dict = None, user_data: Dict = None, use
                 "messages": processed_messages
                 
             }
-        finally:
-            # Close connection
-            await pool.close()
+        except OperationalError:
+            # Drop the shared pool (and graphs bound to it) so the next request reconnects
+            await reset_db_connection()
+            clear_graph_cache()
+            raise
             
     except Exception as e:
         logger.error(f"Error in run_interview: {str(e)}")
@@ -647,72 +1243,206 @@ async def run_interview_async(question: Dict = None, user_data: Dict = None, use
             "status": "error",
             "message": str(e)
         }
+    finally:
+        # A speculative run left over by an aborted or rerouted turn would keep its LLM call going
+        cancel_speculative_run(thread_id)
+
+# Nodes whose LLM tokens are sent to the participant while streaming
+STREAMED_NODES = ("interviewer", "farewell")
 
-async def get_checkpoints(thread_id: str):
+async def stream_interview_async(question: Dict = None, user_data: Dict = None, user_response: str = None, thread_id: str = "test-thread", description: str = "", language: str = "es"):
     """
-    Gets checkpoints for a specific interview.
+    Runs the interview like run_interview_async, but yields the interviewer/farewell
+    tokens as they are generated.
     
     Args:
+        question (Dict): Current question and its context, including question_number and total_questions
+        user_data (Dict): User data
+        user_response (str): User response if exists
         thread_id (str): Interview thread ID
+        description (str): General interview description (optional)
+        language (str): Language in which the interview will be conducted (default 'es')
+        
+    Yields:
+        tuple: (event, data) where event is "token" ({"node", "content"}),
+        "final" (same result as run_interview_async) or "error" ({"status", "message"})
+    """
+    try:
+        state = build_initial_state(question, user_data, user_response, description, language)
+        config = {"configurable": {"thread_id": thread_id}}
+        
+        checkpointer, pool = await get_shared_db_connection()
+        
+        try:
+            graph = get_interview_graph(checkpointer=checkpointer, speculative=is_speculative_enabled())
+            
+            processed_messages = []
+            last_is_complete = False
+            last_validation_result = ""
+            streamed_tokens = False
+            
+            # "messages" gives LLM tokens, "updates" gives the node outputs used for the final event
+            async for mode, chunk in graph.astream(
+                state,
+                config,
+                stream_mode=["messages", "updates"]
+            ):
+                if mode == "messages":
+                    message_chunk, metadata = chunk
+                    # Only assistant output, state writes (system/user messages) are skipped
+                    if (metadata.get("langgraph_node") in STREAMED_NODES
+                            and isinstance(message_chunk, AIMessage)
+                            and message_chunk.content):
+                        streamed_tokens = True
+                        yield "token", {
+                            "node": metadata["langgraph_node"],
+                            "content": message_chunk.content
+                        }
+                    continue
+                
+                chunk_result = process_chunks(chunk)
+                processed_messages.extend(chunk_result["messages"])
+                last_is_complete = chunk_result["is_complete"]
+                last_validation_result = chunk_result["validation_result"]
+                
+                # A speculative result was generated before its node ran, send it whole
+                node_name = next((name for name in STREAMED_NODES if name in chunk), None)
+                if node_name and not streamed_tokens and chunk_result["messages"]:
+                    last_message = chunk_result["messages"][-1]
+                    if last_message["role"] == "assistant":
+                        yield "token", {"node": node_name, "content": last_message["content"]}
+            
+            yield "final", {
+                "status": "success",
+                "thread_id": thread_id,
+                "is_complete": last_is_complete,
+                "validation_result": last_validation_result,
+                "current_question": state["current_question"],
+                "messages": processed_messages
+            }
+        except OperationalError:
+            # Drop the shared pool (and graphs bound to it) so the next request reconnects
+            await reset_db_connection()
+            clear_graph_cache()
+            raise
+            
+    except Exception as e:
+        logger.error(f"Error in stream_interview: {str(e)}")
+        yield "error", {
+            "status": "error",
+            "message": str(e)
+        }
+    finally:
+        # Also runs when the client disconnects and the stream is closed
+        cancel_speculative_run(thread_id)
+
+def format_checkpoint(checkpoint_tuple, summary: bool = False) -> Dict:
+    """
+    Converts a checkpoint tuple into the API representation.
+    
+    Args:
+        checkpoint_tuple: CheckpointTuple returned by the checkpointer
+        summary (bool): Replace the message bodies with their count
+        
+    Returns:
+        Dict: Checkpoint data
+    """
+    checkpoint_data = checkpoint_tuple.checkpoint
+    channel_values = checkpoint_data["channel_values"]
+    current_question = channel_values.get("current_question", {})
+    conversation = [
+        msg for msg in channel_values.get("messages", [])
+        if not isinstance(msg, SystemMessage)
+    ]
+    
+    result = {
+        "id": checkpoint_data["id"],
+        "timestamp": checkpoint_data["ts"],
+        "is_complete": channel_values.get("is_complete", False),
+        "current_question": {
+            "question": current_question.get("question", ""),
+            "context": current_question.get("context", ""),
+            "question_number": current_question.get("question_number", 1),
+            "total_questions": current_question.get("total_questions", 1)
+        }
+    }
+    
+    if summary:
+        result["message_count"] = len(conversation)
+    else:
+        result["messages"] = [
+            {
+                "role": "user" if isinstance(msg, HumanMessage) else "assistant",
+                "content": msg.content
+            }
+            for msg in conversation
+        ]
+    
+    return result
+
+async def get_checkpoints(thread_id: str, limit: Optional[int] = None, before: Optional[str] = None, latest_only: bool = False, summary: bool = False):
+    """
+    Gets checkpoints for a specific interview, newest first.
+    
+    Args:
+        thread_id (str): Interview thread ID
+        limit (int): Maximum number of checkpoints to return (optional)
+        before (str): Only return checkpoints older than this checkpoint ID (pagination cursor)
+        latest_only (bool): Only read the newest checkpoint
+        summary (bool): Return message counts instead of message bodies
         
     Returns:
-        Dict: Dictionary with checkpoints and last checkpoint
+        Dict: Dictionary with checkpoints, the newest checkpoint of the thread (whatever the page)
+              and the cursor for the next page
     """
     try:
-        # Get checkpointer
-        checkpointer, pool = await get_db_connection()
+        # Get shared checkpointer (the pool stays open for the next requests)
+        checkpointer, pool = await get_shared_db_connection()
         
         try:
             # Configuration for checkpointer
             config = {"configurable": {"thread_id": thread_id}}
-            
-            # Get checkpoints
-            checkpoints = checkpointer.alist(config)
             checkpoints_list = []
             
-            # Process checkpoints
-            async for checkpoint in checkpoints:
-                checkpoint_data = checkpoint.checkpoint
-                channel_values = checkpoint_data["channel_values"]
-                current_question = channel_values.get("current_question", {})
+            if latest_only:
+                # Single read of the newest checkpoint
+                checkpoint = await checkpointer.aget_tuple(config)
+                if checkpoint is not None:
+                    checkpoints_list.append(format_checkpoint(checkpoint, summary))
+            else:
+                before_config = {"configurable": {"thread_id": thread_id, "checkpoint_id": before}} if before else None
                 
-                checkpoints_list.append({
-                    "id": checkpoint_data["id"],
-                    "timestamp": checkpoint_data["ts"],
-                    "is_complete": channel_values.get("is_complete", False),
-                    "current_question": {
-                        "question": current_question.get("question", ""),
-                        "context": current_question.get("context", ""),
-                        "question_number": current_question.get("question_number", 1),
-                        "total_questions": current_question.get("total_questions", 1)
-                    },
-                    "messages": [
-                        {
-                            "role": "user" if isinstance(msg, HumanMessage) else "assistant",
-                            "content": msg.content
-                        }
-                        for msg in channel_values.get("messages", [])
-                        if not isinstance(msg, SystemMessage)
-                    ]
-                })
+                # Checkpoints come newest first
+                async for checkpoint in checkpointer.alist(config, before=before_config, limit=limit):
+                    checkpoints_list.append(format_checkpoint(checkpoint, summary))
+            
+            # Newest checkpoint of the thread: the head of the first page, read separately for older pages
+            if before and not latest_only:
+                latest = await checkpointer.aget_tuple(config)
+                last_checkpoint = format_checkpoint(latest, summary) if latest is not None else None
+            else:
+                last_checkpoint = checkpoints_list[0] if checkpoints_list else None
             
-            # Find last checkpoint based on timestamp
-            last_checkpoint = max(checkpoints_list, key=lambda x: x["timestamp"]) if checkpoints_list else None
+            # Cursor for the next (older) page, only when the page is full
+            next_before = checkpoints_list[-1]["id"] if limit and len(checkpoints_list) == limit else None
             
             return {
                 "status": "success",
                 "thread_id": thread_id,
                 "checkpoints": checkpoints_list,
-                "last_checkpoint": last_checkpoint
+                "last_checkpoint": last_checkpoint,
+                "next_before": next_before
             }
             
-        finally:
-            # Close connection
-            await pool.close()
+        except OperationalError:
+            # Drop the shared pool (and graphs bound to it) so the next request reconnects
+            await reset_db_connection()
+            clear_graph_cache()
+            raise
             
     except Exception as e:
         logger.error(f"Error getting checkpoints: {str(e)}")
         return {
             "status": "error",
             "message": str(e)
-        } 
\ No newline at end of file
+        }
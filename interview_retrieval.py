@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import math
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from fast_validator import normalize_text
+from memory_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+retrieval_stats = {
+    "index_hits": 0,
+    "index_builds": 0,
+    "full_context": 0,
+    "retrieved": 0,
+}
+
+_index_cache = None
+
+def get_retrieval_settings() -> Dict:
+    """
+    Retrieval settings for /api/chat_ia_interview read from the environment:
+        CHAT_RETRIEVAL_ENABLED (default true)
+        CHAT_RETRIEVAL_MIN_TOKENS (interviewData smaller than this is sent whole, estimated
+            at 4 characters per token, default 4000)
+        CHAT_RETRIEVAL_TOP_K (chunks sent per question, default 8)
+        CHAT_RETRIEVAL_CHUNK_TOKENS (approximate chunk size, default 300)
+        CHAT_RETRIEVAL_CACHE_SIZE (indexes kept in memory, default 32)
+    """
+    return {
+        "enabled": os.getenv("CHAT_RETRIEVAL_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "min_tokens": int(os.getenv("CHAT_RETRIEVAL_MIN_TOKENS", "4000")),
+        "top_k": int(os.getenv("CHAT_RETRIEVAL_TOP_K", "8")),
+        "chunk_tokens": int(os.getenv("CHAT_RETRIEVAL_CHUNK_TOKENS", "300")),
+        "cache_size": int(os.getenv("CHAT_RETRIEVAL_CACHE_SIZE", "32")),
+    }
+
+def _get_cache(settings: Dict) -> MemoryCache:
+    global _index_cache
+    if _index_cache is None:
+        _index_cache = MemoryCache(max_entries=settings["cache_size"])
+    return _index_cache
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-free word tokens."""
+    return re.findall(r"\w+", normalize_text(text))
+
+def _leaf_lines(value: Any, path: str = "") -> List[str]:
+    """Flattens a JSON value into "path: value" lines."""
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            lines += _leaf_lines(item, f"{path}.{key}" if path else str(key))
+        return lines
+    if isinstance(value, list):
+        lines = []
+        for index, item in enumerate(value):
+            lines += _leaf_lines(item, f"{path}[{index}]")
+        return lines
+    return [f"{path}: {value}" if path else str(value)]
+
+def chunk_interview_data(interview_data: Any, chunk_tokens: int) -> List[str]:
+    """
+    Splits interviewData into chunks of about chunk_tokens tokens.
+
+    Each top-level record (an interview of a list, or a key of an object) is
+    chunked on its own, so chunks never mix participants, and every chunk
+    starts with the record it comes from and its top-level scalar fields
+    (participant name, id, ...).
+    """
+    if isinstance(interview_data, list):
+        records = [(f"[{index}]", item) for index, item in enumerate(interview_data)]
+    elif isinstance(interview_data, dict):
+        records = list(interview_data.items())
+    else:
+        records = [("", interview_data)]
+
+    chunk_chars = max(chunk_tokens, 1) * 4
+    chunks = []
+    for name, record in records:
+        header = f"Record {name}" if name else ""
+        if isinstance(record, dict):
+            fields = ", ".join(
+                f"{key}: {value}" for key, value in record.items()
+                if isinstance(value, (str, int, float, bool)) and len(str(value)) <= 100
+            )
+            header = f"{header} ({fields})" if fields else header
+        header = f"{header}\n" if header else ""
+        text = json.dumps(record, ensure_ascii=False)
+        if len(text) <= chunk_chars:
+            chunks.append(f"{header}{text}")
+            continue
+
+        current = []
+        size = 0
+        for line in _leaf_lines(record):
+            if current and size + len(line) > chunk_chars:
+                chunks.append(header + "\n".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append(header + "\n".join(current))
+    return chunks
+
+class BM25Index:
+    """BM25 index over text chunks, scored with NumPy."""
+
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        self.doc_lengths = np.zeros(len(chunks), dtype=np.float32)
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            self.doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                doc_counts = postings.setdefault(token, {})
+                doc_counts[doc_id] = doc_counts.get(doc_id, 0) + 1
+
+        self.avg_length = float(self.doc_lengths.mean()) if len(chunks) else 0.0
+        self.postings = {}
+        self.idf = {}
+        for token, doc_counts in postings.items():
+            self.postings[token] = (
+                np.fromiter(doc_counts.keys(), dtype=np.int32, count=len(doc_counts)),
+                np.fromiter(doc_counts.values(), dtype=np.float32, count=len(doc_counts)),
+            )
+            df = len(doc_counts)
+            self.idf[token] = math.log(1 + (len(chunks) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """
+        Returns the top_k (chunk index, score) pairs for the query, best first.
+        """
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / (self.avg_length or 1.0))
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            doc_ids, tfs = self.postings[token]
+            scores[doc_ids] += self.idf[token] * tfs * (BM25_K1 + 1) / (tfs + norm[doc_ids])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:top_k]]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top]
+
+def data_hash(data_text: str) -> str:
+    """Content hash of serialized interviewData."""
+    return hashlib.sha256(data_text.encode("utf-8")).hexdigest()
+
+async def get_index(interview_data: Any, data_text: Optional[str] = None, key: Optional[str] = None) -> BM25Index:
+    """
+    Gets the index of interviewData from the LRU cache, building it (off the event
+    loop) the first time this content is seen.
+    """
+    settings = get_retrieval_settings()
+    cache = _get_cache(settings)
+    if key is None:
+        data_text = data_text or json.dumps(interview_data)
+        key = data_hash(data_text)
+
+    index = cache.get(key)
+    if index is not None:
+        retrieval_stats["index_hits"] += 1
+        return index
+
+    index = await asyncio.to_thread(
+        lambda: BM25Index(chunk_interview_data(interview_data, settings["chunk_tokens"]))
+    )
+    retrieval_stats["index_builds"] += 1
+    cache.set(key, index)
+    return index
+
+async def build_interview_context(interview_data: Any, query: str, data_text: Optional[str] = None, key: Optional[str] = None) -> Tuple[str, Dict]:
+    """
+    Gets the interview context for the system prompt: the whole interviewData when it
+    is small (or retrieval is off), otherwise only the chunks most relevant to the query.
+
+    Args:
+        interview_data: interviewData from the request
+        query (str): The admin's question (plus any recent turn that gives it context)
+        data_text (str): interviewData already serialized, if available
+        key (str): Index cache key, if the data already has an ID (default: hash of data_text)
+
+    Returns:
+        tuple: (context text, retrieval info for logging)
+    """
+    settings = get_retrieval_settings()
+    data_text = data_text or json.dumps(interview_data)
+
+    if not settings["enabled"] or len(data_text) < settings["min_tokens"] * 4:
+        retrieval_stats["full_context"] += 1
+        return data_text, {"mode": "full"}
+
+    try:
+        index = await get_index(interview_data, key=key or data_hash(data_text))
+        results = index.search(query, settings["top_k"])
+    except Exception as e:
+        logger.error(f"Error in interview retrieval: {str(e)}")
+        retrieval_stats["full_context"] += 1
+        return data_text, {"mode": "full"}
+
+    if not results:
+        # Nothing matched (e.g. a generic question), fall back to the first chunks
+        results = [(doc_id, 0.0) for doc_id in range(min(settings["top_k"], len(index.chunks)))]
+
+    retrieval_stats["retrieved"] += 1
+    # Keep the original order of the chunks so records read naturally
+    excerpts = [index.chunks[doc_id] for doc_id, _ in sorted(results)]
+    context = (
+        f"(Excerpts of the interviews most relevant to the question, {len(excerpts)} of {len(index.chunks)} fragments)\n"
+        + "\n---\n".join(excerpts)
+    )
+    return context, {"mode": "retrieval", "chunks": len(excerpts), "total_chunks": len(index.chunks)}
+
+def get_retrieval_stats() -> Dict:
+    """
+    Gets index cache and retrieval counters.
+    """
+    return {
+        **retrieval_stats,
+        "cached_indexes": len(_index_cache) if _index_cache is not None else 0
+    }
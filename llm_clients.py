@@ -0,0 +1,327 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict
+import httpx
+import openai
+from langchain_openai import AzureChatOpenAI
+from rate_limiter import RateLimitedTransport, request_deployment
+from token_budget import count_prompt_tokens
+from metrics import histogram, observe, start_span, TOKEN_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Process-wide clients shared by every endpoint and graph node of the worker
+_http_client = None
+_sync_http_client = None
+_openai_client = None
+_chat_models = {}
+
+# Non-empty content deltas of a streamed completion
+_CONTENT_DELTA = re.compile(rb'"content":\s*"(?!")')
+
+llm_duration = histogram(
+    "llm_request_duration_seconds", "Duration of Azure OpenAI calls until their body is read", ("deployment", "status")
+)
+llm_first_token = histogram(
+    "llm_time_to_first_token_seconds", "Time to the first chunk of streamed Azure OpenAI calls", ("deployment",)
+)
+llm_prompt_tokens = histogram("llm_prompt_tokens", "Prompt tokens per Azure OpenAI call", ("deployment",), TOKEN_BUCKETS)
+llm_completion_tokens = histogram(
+    "llm_completion_tokens", "Completion tokens per Azure OpenAI call", ("deployment",), TOKEN_BUCKETS
+)
+
+class _ObservedStream(httpx.AsyncByteStream):
+    """Response stream that reports each chunk and the close to the instrumentation."""
+
+    def __init__(self, stream, on_chunk, on_close):
+        self._stream = stream
+        self._on_chunk = on_chunk
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._on_chunk(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+class _LLMCallObserver:
+    """
+    Measures one Azure OpenAI call: time to the first streamed chunk, total time and
+    tokens. Tokens come from the usage of the response; streams without usage are
+    estimated (the prompt with tiktoken, the completion as one token per delta).
+    """
+
+    def __init__(self, request: httpx.Request, response: httpx.Response, deployment: str, start: float, span):
+        self.request = request
+        self.response = response
+        self.deployment = deployment
+        self.start = start
+        self.span = span
+        self.streaming = response.headers.get("content-type", "").startswith("text/event-stream")
+        self.first_chunk = None
+        self.body = []
+        self.deltas = 0
+        self.usage = None
+        self.closed = False
+
+    def on_chunk(self, chunk: bytes):
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter()
+            if self.streaming:
+                observe(llm_first_token, self.first_chunk - self.start, deployment=self.deployment)
+        if not self.streaming:
+            self.body.append(chunk)
+            return
+        self.deltas += len(_CONTENT_DELTA.findall(chunk))
+        if b'"usage":{' in chunk:
+            # Final chunk when stream_options.include_usage is set
+            for line in chunk.split(b"\n"):
+                if b'"usage":{' in line and line.startswith(b"data: {"):
+                    try:
+                        self.usage = json.loads(line[6:])["usage"]
+                    except (ValueError, KeyError):
+                        pass
+
+    def _estimated_prompt_tokens(self):
+        try:
+            return count_prompt_tokens(json.loads(self.request.content).get("messages") or [])
+        except Exception:
+            return None
+
+    def on_close(self):
+        if self.closed:
+            return
+        self.closed = True
+        status = self.response.status_code
+        observe(llm_duration, time.perf_counter() - self.start, deployment=self.deployment, status=status)
+
+        if status == 200:
+            usage = self.usage
+            if not self.streaming:
+                try:
+                    usage = json.loads(b"".join(self.body)).get("usage")
+                except ValueError:
+                    usage = None
+            prompt_tokens = (usage or {}).get("prompt_tokens") or self._estimated_prompt_tokens()
+            completion_tokens = (usage or {}).get("completion_tokens", self.deltas)
+            if prompt_tokens is not None:
+                observe(llm_prompt_tokens, prompt_tokens, deployment=self.deployment)
+            observe(llm_completion_tokens, completion_tokens, deployment=self.deployment)
+            if self.span is not None:
+                self.span.set_attribute("llm.prompt_tokens", prompt_tokens or 0)
+                self.span.set_attribute("llm.completion_tokens", completion_tokens)
+
+        if self.span is not None:
+            self.span.set_attribute("http.status_code", status)
+            self.span.end()
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records the latency and tokens of each Azure OpenAI call
+    (each attempt, when the rate limiter retries a 429).
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        deployment = request_deployment(request)
+        if deployment is None:
+            return await self._transport.handle_async_request(request)
+
+        start = time.perf_counter()
+        span = start_span(f"llm {deployment}", deployment=deployment)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            observe(llm_duration, time.perf_counter() - start, deployment=deployment, status="error")
+            if span is not None:
+                span.end()
+            raise
+
+        observer = _LLMCallObserver(request, response, deployment, start, span)
+        response.stream = _ObservedStream(response.stream, observer.on_chunk, observer.on_close)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def _http2_enabled() -> bool:
+    """
+    HTTP/2 is used when AZURE_OPENAI_HTTP2 is not disabled and the h2 package is installed.
+    """
+    if os.getenv("AZURE_OPENAI_HTTP2", "true").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("h2 package not installed, Azure OpenAI clients will use HTTP/1.1")
+        return False
+
+def _get_limits() -> httpx.Limits:
+    """
+    Connection limits read from the environment:
+        AZURE_OPENAI_MAX_CONNECTIONS (default 100)
+        AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS (default 20)
+        AZURE_OPENAI_KEEPALIVE_EXPIRY (seconds, default 60)
+    """
+    return httpx.Limits(
+        max_connections=int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("AZURE_OPENAI_KEEPALIVE_EXPIRY", "60")),
+    )
+
+def _get_timeout() -> httpx.Timeout:
+    """
+    Timeouts read from the environment:
+        AZURE_OPENAI_TIMEOUT (seconds for read/write/pool, default 60)
+        AZURE_OPENAI_CONNECT_TIMEOUT (seconds, default 10)
+    """
+    return httpx.Timeout(
+        float(os.getenv("AZURE_OPENAI_TIMEOUT", "60")),
+        connect=float(os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", "10")),
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Gets the shared keep-alive HTTP client used for every Azure OpenAI call.
+    Requests go through the rate limiter (see rate_limiter.py) and are measured for /api/metrics.
+    """
+    global _http_client, _openai_client
+    if _http_client is None or _http_client.is_closed:
+        # Clients built on the previous one would keep using it
+        _openai_client = None
+        _chat_models.clear()
+        _http_client = httpx.AsyncClient(
+            transport=RateLimitedTransport(InstrumentedTransport(
+                httpx.AsyncHTTPTransport(http2=_http2_enabled(), limits=_get_limits())
+            )),
+            timeout=_get_timeout(),
+        )
+    return _http_client
+
+def get_sync_http_client() -> httpx.Client:
+    """
+    Gets the shared synchronous HTTP client. LangChain models always build a
+    sync client too; sharing it avoids creating a new pool per model.
+    """
+    global _sync_http_client
+    if _sync_http_client is None or _sync_http_client.is_closed:
+        _chat_models.clear()
+        _sync_http_client = httpx.Client(
+            http2=_http2_enabled(),
+            limits=_get_limits(),
+            timeout=_get_timeout(),
+        )
+    return _sync_http_client
+
+def get_openai_client() -> openai.AsyncAzureOpenAI:
+    """
+    Gets the shared AsyncAzureOpenAI client for the streaming endpoints. Call it on
+    every request rather than keeping the client: it is rebuilt along with the
+    shared HTTP client (see close_clients()).
+    """
+    global _openai_client
+    http_client = get_http_client()
+    if _openai_client is None:
+        _openai_client = openai.AsyncAzureOpenAI(
+            azure_endpoint=os.getenv("AZURE_OPEN_AI_ENDPOINT") or os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            http_client=http_client,
+            # 429s are retried by RateLimitedTransport only
+            max_retries=0,
+        )
+    return _openai_client
+
+def get_node_profile(node: str) -> Dict:
+    """
+    Model settings of a graph node, so cheap high-volume nodes can use a faster deployment.
+
+    LLM_PROFILE_<NODE> names the profile a node uses (default: the node itself, e.g.
+    LLM_PROFILE_FAREWELL=FAST), and each profile is read from:
+        LLM_<PROFILE>_DEPLOYMENT (default AZURE_DEPLOYMENT_NAME)
+        LLM_<PROFILE>_MODEL (model name reported by the API client, optional)
+        LLM_<PROFILE>_TEMPERATURE (default 0)
+        LLM_<PROFILE>_MAX_TOKENS (optional)
+
+    Args:
+        node (str): validate_response, interviewer, farewell, rephrase, summary or rubric
+
+    Returns:
+        Dict: profile, deployment_name, model, temperature and max_tokens (None when unset)
+    """
+    profile = os.getenv(f"LLM_PROFILE_{node.upper()}", node).upper()
+    temperature = os.getenv(f"LLM_{profile}_TEMPERATURE")
+    max_tokens = os.getenv(f"LLM_{profile}_MAX_TOKENS")
+    return {
+        "profile": profile,
+        "deployment_name": os.getenv(f"LLM_{profile}_DEPLOYMENT") or os.getenv("AZURE_DEPLOYMENT_NAME"),
+        "model": os.getenv(f"LLM_{profile}_MODEL") or None,
+        "temperature": float(temperature) if temperature else 0.0,
+        "max_tokens": int(max_tokens) if max_tokens else None,
+    }
+
+def get_chat_model(deployment_name: str = None, temperature: float = 0.0, **kwargs) -> AzureChatOpenAI:
+    """
+    Gets a LangChain chat model on top of the shared HTTP clients.
+
+    Models are cached by their settings, so graph nodes calling this on every
+    turn get the same instance back instead of building a new client.
+
+    Args:
+        deployment_name (str): Azure deployment (default AZURE_DEPLOYMENT_NAME)
+        temperature (float): Sampling temperature
+        **kwargs: Extra AzureChatOpenAI settings (max_tokens, ...)
+
+    Returns:
+        AzureChatOpenAI: The shared chat model
+    """
+    settings = {
+        "deployment_name": deployment_name or os.getenv("AZURE_DEPLOYMENT_NAME"),
+        "openai_api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+        "openai_api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+        "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_OPEN_AI_ENDPOINT"),
+        "temperature": temperature,
+        **kwargs,
+    }
+    key = tuple(sorted((k, repr(v)) for k, v in settings.items()))
+
+    # Getting the HTTP clients first drops cached models built on closed ones
+    http_async_client = get_http_client()
+    http_client = get_sync_http_client()
+    model = _chat_models.get(key)
+    if model is None:
+        model = AzureChatOpenAI(
+            **settings,
+            http_async_client=http_async_client,
+            http_client=http_client,
+            # 429s are retried by RateLimitedTransport only
+            max_retries=0,
+        )
+        _chat_models[key] = model
+    return model
+
+async def close_clients():
+    """
+    Closes the shared HTTP clients and forgets the OpenAI clients and chat models
+    built on them. Safe to call when they were never created.
+    """
+    global _http_client, _sync_http_client, _openai_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    if _sync_http_client is not None:
+        _sync_http_client.close()
+    _http_client = None
+    _sync_http_client = None
+    _openai_client = None
+    _chat_models.clear()
@@ -0,0 +1,74 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+class MemoryCache:
+    """
+    In-process LRU cache with optional TTL and size limits.
+
+    Entries are evicted least recently used first once max_entries or
+    max_bytes is exceeded, and expire ttl seconds after being stored.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = sys.getsizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        if key in self._entries:
+            self._remove(key)
+
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Larger than the whole cache, do not store it
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (value, size, expires_at)
+        self.total_bytes += size
+        self._evict()
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        if key in self._entries:
+            self._remove(key)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.total_bytes > self.max_bytes
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
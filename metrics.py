@@ -0,0 +1,224 @@
+import os
+import math
+import time
+import logging
+import threading
+import contextlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a fast DB read to a long LLM generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+_metrics: Dict[str, "_Metric"] = {}
+_collectors: List[Callable[[], List[str]]] = []
+_tracer = None
+_tracer_loaded = False
+
+def get_metrics_settings() -> Dict:
+    """
+    Instrumentation settings read from the environment:
+        METRICS_ENABLED (record histograms for /api/metrics, default true)
+        OTEL_TRACING_ENABLED (also emit OpenTelemetry spans, needs opentelemetry-api and
+            an exporter such as azure-monitor-opentelemetry, default false)
+    """
+    return {
+        "enabled": os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "tracing": os.getenv("OTEL_TRACING_ENABLED", "false").lower() in ("1", "true", "yes"),
+    }
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Monotonic counter with labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets and labels, in the Prometheus layout."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Bucket counts (the last one is +Inf), sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = entry[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    bucket = f'le="{_format_value(float(bound))}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, bucket)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+def histogram(name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    """Gets the histogram registered under name, creating it the first time."""
+    if name not in _metrics:
+        _metrics[name] = Histogram(name, documentation, labels, buckets)
+    return _metrics[name]
+
+def counter(name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+    """Gets the counter registered under name, creating it the first time."""
+    if name not in _metrics:
+        _metrics[name] = Counter(name, documentation, labels)
+    return _metrics[name]
+
+def observe(metric: Histogram, value: float, **labels):
+    """Records a value unless METRICS_ENABLED is false."""
+    if get_metrics_settings()["enabled"]:
+        metric.observe(value, **labels)
+
+def register_collector(collector: Callable[[], List[str]]):
+    """Adds a function that renders extra lines (gauges read at scrape time)."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+def register_stats(prefix: str, get_stats: Callable[[], Dict], label: Optional[str] = None):
+    """
+    Exports a get_*_stats() function as gauges named <prefix>_<key>. Stats keyed by
+    deployment, node, ... (a dict of dicts) use label for the outer key.
+    Non-numeric values are skipped.
+    """
+    def collect() -> List[str]:
+        try:
+            stats = get_stats()
+        except Exception as e:
+            logger.error(f"Error collecting {prefix} stats: {str(e)}")
+            return []
+
+        rows = []
+        if label:
+            for outer, values in stats.items():
+                for key, value in values.items():
+                    rows.append((key, f'{{{label}="{_escape(outer)}"}}', value))
+        else:
+            rows = [(key, "", value) for key, value in stats.items()]
+
+        lines = []
+        for key, labels, value in rows:
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"{prefix}_{key}{labels} {_format_value(value)}")
+        return lines
+
+    register_collector(collect)
+
+def render_metrics() -> str:
+    """Renders every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(_metrics.values()):
+        lines += metric.render()
+    for collector in list(_collectors):
+        lines += collector()
+    return "\n".join(lines) + "\n"
+
+def _get_tracer():
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer_loaded = True
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("interview-gpt-ai-api")
+        except ImportError:
+            logger.warning("opentelemetry-api not installed, OTEL_TRACING_ENABLED is ignored")
+    return _tracer
+
+def start_span(name: str, **attributes):
+    """
+    Starts an OpenTelemetry span when tracing is enabled (the caller ends it).
+
+    Returns:
+        The span, or None when tracing is off
+    """
+    if not get_metrics_settings()["tracing"]:
+        return None
+    tracer = _get_tracer()
+    return tracer.start_span(name, attributes=attributes) if tracer is not None else None
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Runs the block inside an OpenTelemetry span when tracing is enabled."""
+    if not get_metrics_settings()["tracing"] or _get_tracer() is None:
+        yield None
+        return
+    with _get_tracer().start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+@contextlib.contextmanager
+def timed(metric: Histogram, span_name: Optional[str] = None, **labels):
+    """Observes the duration of the block in metric (and traces it as span_name)."""
+    start = time.perf_counter()
+    try:
+        if span_name:
+            with span(span_name, **labels):
+                yield
+        else:
+            yield
+    finally:
+        observe(metric, time.perf_counter() - start, **labels)
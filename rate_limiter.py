@@ -0,0 +1,314 @@
+import os
+import re
+import json
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import contextvars
+from typing import Dict, Optional
+import httpx
+from token_budget import count_prompt_tokens
+from metrics import histogram, observe
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0  # Interview turns (the participant is waiting)
+PRIORITY_ADMIN = 1  # Admin chat about interview results
+PRIORITY_BULK = 2  # Result generation and summaries
+
+llm_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+_DEPLOYMENT_PATTERN = re.compile(r"/deployments/([^/]+)/")
+
+rate_limit_wait = histogram(
+    "llm_rate_limit_wait_seconds", "Time LLM calls waited for the rate limiter", ("deployment", "priority")
+)
+
+def request_deployment(request: httpx.Request) -> Optional[str]:
+    """Azure OpenAI deployment a request is sent to (None for other URLs)."""
+    match = _DEPLOYMENT_PATTERN.search(request.url.path)
+    return match.group(1) if match else None
+
+def get_rate_limit_settings() -> Dict:
+    """
+    Rate limit settings read from the environment (applied per deployment):
+        LLM_RATE_LIMIT_RPM (requests per minute, 0 = unlimited, default 0)
+        LLM_RATE_LIMIT_TPM (tokens per minute, 0 = unlimited, default 0)
+        LLM_MAX_CONCURRENCY (requests in flight, lowered on 429 and raised back on success, default 64)
+        LLM_RATE_LIMIT_MAX_RETRIES (retries of a 429 before handing it to the caller, default 3)
+        LLM_DEFAULT_COMPLETION_TOKENS (tokens budgeted for requests without max_tokens, default 500)
+    """
+    return {
+        "rpm": float(os.getenv("LLM_RATE_LIMIT_RPM", "0")),
+        "tpm": float(os.getenv("LLM_RATE_LIMIT_TPM", "0")),
+        "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+        "max_retries": int(os.getenv("LLM_RATE_LIMIT_MAX_RETRIES", "3")),
+        "default_completion_tokens": int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "500")),
+    }
+
+def set_llm_priority(priority: int):
+    """Sets the priority of the LLM calls made by the current request."""
+    llm_priority.set(priority)
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute. Its capacity is ten
+    seconds of quota, the window Azure OpenAI enforces its per-minute limits on.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(rate_per_minute / 6.0, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, factor: float):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def time_until(self, amount: float, factor: float = 1.0) -> float:
+        """Seconds until amount is available (0 when it already is)."""
+        self._refill(factor)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate * factor)
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Admits requests to one deployment in priority order, within the RPM/TPM
+    buckets and an adaptive concurrency limit.
+
+    A 429 halves the concurrency limit and the refill rate and pauses every
+    request for the Retry-After time; successes grow them back (AIMD).
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_concurrency: int = 64):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(max_concurrency, 1)
+        self.limit = float(self.max_concurrency)
+        self.factor = 1.0
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self.stats = {
+            "admitted": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _wait_time(self, tokens: int) -> float:
+        waits = [self.paused_until - time.monotonic()]
+        if self.requests is not None:
+            waits.append(self.requests.time_until(1, self.factor))
+        if self.tokens is not None:
+            waits.append(self.tokens.time_until(tokens, self.factor))
+        return max(waits)
+
+    def _wake(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self):
+        while self._waiters:
+            priority, sequence, tokens, future = self._waiters[0]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.limit):
+                # release() wakes the dispatcher again
+                return
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                # A higher priority request may arrive meanwhile, so re-check the head afterwards
+                await asyncio.sleep(min(wait, 1.0))
+                continue
+
+            heapq.heappop(self._waiters)
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            future.set_result(None)
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Waits until the request may be sent. Every acquire must be followed by release().
+        """
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted right as we were cancelled, give the slot back
+                self.release()
+            raise
+        self.stats["wait_seconds"] += time.monotonic() - start
+
+    def release(self, success: bool = True):
+        self.in_flight -= 1
+        if success:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self.factor = min(1.0, self.factor + 0.02)
+        self._wake()
+
+    def on_rate_limited(self, retry_after: Optional[float], attempt: int) -> float:
+        """
+        Slows down after a 429 and gets the delay before retrying: Retry-After plus
+        jitter, or exponential backoff with full jitter when the header is missing.
+        """
+        self.stats["rate_limited"] += 1
+        if time.monotonic() >= self.paused_until:
+            # Requests already in flight when the quota ran out fail together, slow down once per burst
+            self.limit = max(1.0, self.limit / 2)
+            self.factor = max(0.1, self.factor / 2)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 0.25 * retry_after + 0.1)
+        else:
+            delay = random.uniform(0, min(30.0, 2.0 ** attempt))
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "waiting": sum(1 for waiter in self._waiters if not waiter[3].done()),
+            "concurrency_limit": int(self.limit),
+            "rate_factor": round(self.factor, 2),
+        }
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_loop = None
+
+def get_limiter(deployment: str) -> RateLimiter:
+    """Gets the limiter of a deployment (Azure quotas are per deployment)."""
+    global _limiters_loop
+    loop = asyncio.get_running_loop()
+    if _limiters_loop is not loop:
+        # Futures are bound to their loop, start over if it changed
+        _limiters.clear()
+        _limiters_loop = loop
+    limiter = _limiters.get(deployment)
+    if limiter is None:
+        settings = get_rate_limit_settings()
+        limiter = RateLimiter(settings["rpm"], settings["tpm"], settings["max_concurrency"])
+        _limiters[deployment] = limiter
+    return limiter
+
+def estimate_request_tokens(body: bytes, default_completion_tokens: int) -> int:
+    """
+    Tokens a chat completion request counts against the TPM quota: the prompt
+    plus max_tokens, which is how Azure OpenAI budgets it when it arrives.
+    """
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return default_completion_tokens
+    prompt_tokens = count_prompt_tokens(payload.get("messages") or [])
+    completion_tokens = payload.get("max_tokens") or payload.get("max_completion_tokens") or default_completion_tokens
+    return prompt_tokens + completion_tokens
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        if response.headers.get("retry-after-ms"):
+            return float(response.headers["retry-after-ms"]) / 1000
+        if response.headers.get("retry-after"):
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream that frees the limiter slot once the body is closed (streams included)."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that sends every Azure OpenAI request through the limiter of
+    its deployment and retries 429 responses, so all call sites share one budget.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        deployment = request_deployment(request)
+        if request.method != "POST" or deployment is None:
+            return await self._transport.handle_async_request(request)
+
+        settings = get_rate_limit_settings()
+        limiter = get_limiter(deployment)
+        body = await request.aread()
+        tokens = estimate_request_tokens(body, settings["default_completion_tokens"])
+        priority = llm_priority.get()
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            await limiter.acquire(tokens, priority)
+            observe(rate_limit_wait, time.perf_counter() - start, deployment=deployment, priority=priority)
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                limiter.release(success=False)
+                raise
+
+            if response.status_code != 429 or attempt >= settings["max_retries"]:
+                released = False
+
+                def release():
+                    nonlocal released
+                    if not released:
+                        released = True
+                        limiter.release(success=response.status_code < 400)
+
+                response.stream = _ReleasingStream(response.stream, release)
+                return response
+
+            await response.aclose()
+            limiter.release(success=False)
+            delay = limiter.on_rate_limited(_retry_after(response), attempt)
+            attempt += 1
+            limiter.stats["retries"] += 1
+            logger.info(f"Azure OpenAI returned 429, retrying in {delay:.2f}s (attempt {attempt}/{settings['max_retries']})")
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def get_rate_limit_stats() -> Dict:
+    """
+    Gets limiter counters per deployment.
+    """
+    return {deployment: limiter.snapshot() for deployment, limiter in _limiters.items()}
@@ -0,0 +1,203 @@
+import os
+import hashlib
+import contextlib
+import logging
+from typing import AsyncIterator, Dict, Optional
+from memory_cache import MemoryCache
+from db_connection import get_shared_db_connection
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS response_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        expires_at TIMESTAMPTZ NOT NULL
+    )
+"""
+
+CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS response_cache_expires_at_idx ON response_cache(expires_at)"
+
+SELECT_SQL = "SELECT response FROM response_cache WHERE key = %s AND expires_at > now()"
+
+UPSERT_SQL = """
+    INSERT INTO response_cache (key, response, size, expires_at)
+    VALUES (%s, %s, %s, now() + make_interval(secs => %s))
+    ON CONFLICT (key) DO UPDATE
+    SET response = EXCLUDED.response, size = EXCLUDED.size,
+        created_at = now(), expires_at = EXCLUDED.expires_at
+"""
+
+DELETE_EXPIRED_SQL = "DELETE FROM response_cache WHERE expires_at <= now()"
+
+# Keeps the newest max_entries / max_bytes
+EVICT_SQL = """
+    DELETE FROM response_cache WHERE key IN (
+        SELECT key FROM (
+            SELECT key,
+                   row_number() OVER (ORDER BY created_at DESC) AS rn,
+                   sum(size) OVER (ORDER BY created_at DESC) AS running_size
+            FROM response_cache
+        ) ranked
+        WHERE rn > %s OR running_size > %s
+    )
+"""
+
+response_cache_stats = {
+    "memory_hits": 0,
+    "postgres_hits": 0,
+    "misses": 0,
+    "bypassed": 0,
+    "stores": 0,
+}
+
+_memory_tier = None
+_postgres_ready = False
+
+def get_cache_settings() -> Dict:
+    """
+    Response cache settings read from the environment:
+        RESPONSE_CACHE_ENABLED (default true)
+        RESPONSE_CACHE_MAX_TEMPERATURE (highest temperature considered deterministic, default 0)
+        RESPONSE_CACHE_TTL (seconds, default 86400)
+        RESPONSE_CACHE_MAX_ENTRIES (memory tier, default 512)
+        RESPONSE_CACHE_MAX_BYTES (memory tier, default 16 MB)
+        RESPONSE_CACHE_POSTGRES (also use the Postgres tier, default false)
+        RESPONSE_CACHE_POSTGRES_MAX_ENTRIES (default 10000)
+        RESPONSE_CACHE_POSTGRES_MAX_BYTES (default 256 MB)
+    """
+    return {
+        "enabled": os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "max_temperature": float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0")),
+        "ttl": float(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+        "max_entries": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")),
+        "max_bytes": int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        "postgres": os.getenv("RESPONSE_CACHE_POSTGRES", "false").lower() in ("1", "true", "yes"),
+        "postgres_max_entries": int(os.getenv("RESPONSE_CACHE_POSTGRES_MAX_ENTRIES", "10000")),
+        "postgres_max_bytes": int(os.getenv("RESPONSE_CACHE_POSTGRES_MAX_BYTES", str(256 * 1024 * 1024))),
+    }
+
+def _get_memory_tier(settings: Dict) -> MemoryCache:
+    global _memory_tier
+    if _memory_tier is None:
+        _memory_tier = MemoryCache(
+            max_entries=settings["max_entries"],
+            max_bytes=settings["max_bytes"],
+            ttl=settings["ttl"],
+            sizeof=lambda text: len(text.encode("utf-8")),
+        )
+    return _memory_tier
+
+def cache_key(deployment: str, prompt: str, temperature) -> Optional[str]:
+    """
+    Gets the cache key for a request, or None when it must not be cached
+    (cache disabled or non-deterministic temperature).
+    """
+    settings = get_cache_settings()
+    try:
+        cacheable = (
+            settings["enabled"]
+            and prompt
+            and temperature is not None
+            and float(temperature) <= settings["max_temperature"]
+        )
+    except (TypeError, ValueError):
+        cacheable = False
+
+    if not cacheable:
+        response_cache_stats["bypassed"] += 1
+        return None
+
+    payload = "\x1f".join([deployment or "", str(float(temperature)), prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def _ensure_table(pool):
+    global _postgres_ready
+    if not _postgres_ready:
+        async with pool.connection() as conn:
+            await conn.execute(CREATE_TABLE_SQL)
+            await conn.execute(CREATE_INDEX_SQL)
+        _postgres_ready = True
+
+async def get_cached_response(key: str) -> Optional[str]:
+    """
+    Looks the key up in memory, then in Postgres when that tier is enabled.
+    """
+    settings = get_cache_settings()
+    memory = _get_memory_tier(settings)
+
+    text = memory.get(key)
+    if text is not None:
+        response_cache_stats["memory_hits"] += 1
+        return text
+
+    if settings["postgres"]:
+        try:
+            _, pool = await get_shared_db_connection()
+            await _ensure_table(pool)
+            async with pool.connection() as conn:
+                row = await (await conn.execute(SELECT_SQL, (key,))).fetchone()
+            if row is not None:
+                response_cache_stats["postgres_hits"] += 1
+                memory.set(key, row["response"])
+                return row["response"]
+        except Exception as e:
+            logger.error(f"Error reading response cache: {str(e)}")
+
+    response_cache_stats["misses"] += 1
+    return None
+
+async def store_response(key: str, text: str):
+    """
+    Stores a complete response in every enabled tier.
+    """
+    settings = get_cache_settings()
+    _get_memory_tier(settings).set(key, text)
+    response_cache_stats["stores"] += 1
+
+    if settings["postgres"]:
+        try:
+            _, pool = await get_shared_db_connection()
+            await _ensure_table(pool)
+            async with pool.connection() as conn:
+                await conn.execute(UPSERT_SQL, (key, text, len(text.encode("utf-8")), settings["ttl"]))
+                # Evict now and then rather than on every write
+                if response_cache_stats["stores"] % 50 == 1:
+                    await conn.execute(DELETE_EXPIRED_SQL)
+                    await conn.execute(EVICT_SQL, (settings["postgres_max_entries"], settings["postgres_max_bytes"]))
+        except Exception as e:
+            logger.error(f"Error writing response cache: {str(e)}")
+
+async def caching_deltas(deltas: AsyncIterator[str], key: str) -> AsyncIterator[str]:
+    """
+    Passes deltas through and caches the full text once the stream completes.
+    Interrupted streams are not cached.
+    """
+    parts = []
+    async with contextlib.aclosing(deltas):
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+    if parts:
+        await store_response(key, "".join(parts))
+
+async def replay_deltas(text: str) -> AsyncIterator[str]:
+    """
+    Replays a cached response as a delta stream.
+    """
+    yield text
+
+def get_response_cache_stats() -> Dict:
+    """
+    Gets hit/miss counters and the hit rate.
+    """
+    hits = response_cache_stats["memory_hits"] + response_cache_stats["postgres_hits"]
+    lookups = hits + response_cache_stats["misses"]
+    return {
+        **response_cache_stats,
+        "memory_entries": len(_memory_tier) if _memory_tier is not None else 0,
+        "memory_bytes": _memory_tier.total_bytes if _memory_tier is not None else 0,
+        "hit_rate": hits / lookups if lookups else 0.0
+    }
@@ -0,0 +1,213 @@
+import os
+import json
+import asyncio
+import logging
+import contextlib
+from typing import AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+stream_stats = {
+    "completed": 0,
+    "disconnected": 0,
+    "abandoned_tokens": 0,
+}
+
+def format_sse(data, event: Optional[str] = None) -> str:
+    """
+    Frames a payload as a server-sent event. Non-string payloads are sent as JSON,
+    multi-line strings become several data: lines.
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+def get_pacer_settings() -> dict:
+    """
+    Output pacing settings read from the environment:
+        STREAM_MIN_CHUNK_CHARS (flush once this many characters are buffered,
+            0 passes every delta straight through, default 24)
+        STREAM_MAX_DELAY_MS (flush buffered text after this long even if it
+            is shorter, default 50)
+    """
+    return {
+        "min_chars": int(os.getenv("STREAM_MIN_CHUNK_CHARS", "24")),
+        "max_delay": float(os.getenv("STREAM_MAX_DELAY_MS", "50")) / 1000,
+    }
+
+async def coalesce_deltas(deltas: AsyncIterator[str], min_chars: int = None, max_delay: float = None) -> AsyncIterator[str]:
+    """
+    Groups small text deltas into larger chunks.
+
+    A chunk is flushed when it reaches min_chars or when max_delay seconds have
+    passed since its first delta, whichever comes first, so slow generations
+    are not held back waiting for more text.
+
+    Args:
+        deltas: Async iterator of text deltas
+        min_chars (int): Size threshold (<= 0 disables coalescing)
+        max_delay (float): Time window in seconds
+
+    Yields:
+        str: Coalesced text
+    """
+    settings = get_pacer_settings()
+    min_chars = settings["min_chars"] if min_chars is None else min_chars
+    max_delay = settings["max_delay"] if max_delay is None else max_delay
+
+    loop = asyncio.get_running_loop()
+    iterator = deltas.__aiter__()
+    buffer = []
+    buffered = 0
+    deadline = None
+    pending = None
+
+    try:
+        while min_chars <= 0:
+            try:
+                delta = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            if delta:
+                yield delta
+
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Time window elapsed, flush what we have and keep waiting
+                yield "".join(buffer)
+                buffer, buffered, deadline = [], 0, None
+                continue
+
+            try:
+                delta = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+
+            if not delta:
+                continue
+
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(delta)
+            buffered += len(delta)
+
+            if buffered >= min_chars:
+                yield "".join(buffer)
+                buffer, buffered, deadline = [], 0, None
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        # Release the source (and its upstream connection) when we stop early
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+async def openai_deltas(response, usage: Optional[Dict] = None) -> AsyncIterator[str]:
+    """
+    Extracts the text deltas from an OpenAI chat completion stream. The upstream
+    response is closed as soon as this generator is closed, even midway.
+
+    Args:
+        response: OpenAI chat completion stream
+        usage (Dict): Optional counter, its "completion_tokens" is increased per delta
+    """
+    try:
+        async for chunk in response:
+            if len(chunk.choices) > 0:
+                delta = chunk.choices[0].delta
+                if delta.content: # Get remaining generated response if applicable
+                    if usage is not None:
+                        usage["completion_tokens"] = usage.get("completion_tokens", 0) + 1
+                    yield delta.content
+    finally:
+        await response.close()
+
+async def sse_text_stream(deltas: AsyncIterator[str], **pacer_options) -> AsyncIterator[str]:
+    """
+    Paces text deltas and frames each chunk as an SSE data: event.
+    """
+    async with contextlib.aclosing(coalesce_deltas(deltas, **pacer_options)) as chunks:
+        async for text in chunks:
+            yield format_sse(text)
+
+async def wait_for_disconnect(request):
+    """Returns once the HTTP client has disconnected."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def cancel_on_disconnect(request, events: AsyncIterator[str], usage: Optional[Dict] = None) -> AsyncIterator[str]:
+    """
+    Passes events through until they end or the HTTP client disconnects. On a
+    disconnect the event generator is cancelled and closed at once, which closes
+    the upstream OpenAI stream (stopping the generation) instead of reading it to
+    the end for nobody.
+
+    Args:
+        request: Request of the HTTP function
+        events: SSE events to send
+        usage (Dict): Counter filled by openai_deltas; the tokens generated for a
+            response the client abandoned are added to stream_stats["abandoned_tokens"]
+    """
+    iterator = events.__aiter__()
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    next_event = None
+    completed = False
+    abandoned = False
+    try:
+        while True:
+            next_event = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait({next_event, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                # The client left while we were waiting for the model
+                abandoned = True
+                break
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                completed = True
+                break
+            next_event = None
+            yield event
+            if watcher.done():
+                abandoned = True
+                break
+    except (asyncio.CancelledError, GeneratorExit):
+        # The server stopped sending (client gone) while we were suspended
+        abandoned = True
+        raise
+    finally:
+        watcher.cancel()
+        if next_event is not None and not next_event.done():
+            next_event.cancel()
+            await asyncio.wait({next_event})
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+        if completed:
+            stream_stats["completed"] += 1
+        elif abandoned:
+            tokens = (usage or {}).get("completion_tokens", 0)
+            stream_stats["disconnected"] += 1
+            stream_stats["abandoned_tokens"] += tokens
+            logger.info(f"Client disconnected, upstream stream closed after {tokens} generated tokens")
+
+def get_stream_stats() -> Dict:
+    """
+    Gets how many streams completed or were cut short by a client disconnect.
+    """
+    return dict(stream_stats)
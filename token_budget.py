@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from memory_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+# Fixed overhead of every chat message (role, separators), as in OpenAI's token counting guide
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Seconds before retrying a failed encoding load, doubled on every failure
+ENCODING_RETRY_MIN = 30.0
+ENCODING_RETRY_MAX = 3600.0
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_loading = False
+_encoding_retry_at = 0.0
+_encoding_retry_delay = ENCODING_RETRY_MIN
+_summary_cache = None
+
+def get_budget_settings() -> Dict:
+    """
+    History budget settings read from the environment:
+        CHAT_HISTORY_TOKEN_BUDGET (tokens of messageHistory sent per request, 0 disables trimming, default 6000)
+        CHAT_HISTORY_SUMMARY_ENABLED (fold trimmed turns into a summary, default false)
+        CHAT_HISTORY_SUMMARY_MAX_TOKENS (size of that summary, default 400)
+        CHAT_HISTORY_SUMMARY_CACHE_SIZE (summaries kept in memory, default 256)
+        TIKTOKEN_ENCODING (default o200k_base)
+    """
+    return {
+        "budget": int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "6000")),
+        "summary_enabled": os.getenv("CHAT_HISTORY_SUMMARY_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "summary_max_tokens": int(os.getenv("CHAT_HISTORY_SUMMARY_MAX_TOKENS", "400")),
+        "summary_cache_size": int(os.getenv("CHAT_HISTORY_SUMMARY_CACHE_SIZE", "256")),
+        "encoding": os.getenv("TIKTOKEN_ENCODING", "o200k_base"),
+    }
+
+def _load_encoding():
+    global _encoding, _encoding_loading, _encoding_retry_at, _encoding_retry_delay
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(get_budget_settings()["encoding"])
+        with _encoding_lock:
+            _encoding = encoding
+    except Exception as e:
+        with _encoding_lock:
+            _encoding_retry_at = time.monotonic() + _encoding_retry_delay
+            logger.warning(f"tiktoken encoding unavailable, estimating token counts for {_encoding_retry_delay:.0f}s: {str(e)}")
+            _encoding_retry_delay = min(_encoding_retry_delay * 2, ENCODING_RETRY_MAX)
+    finally:
+        with _encoding_lock:
+            _encoding_loading = False
+
+def preload_encoding():
+    """
+    Starts loading the tiktoken encoding in a background thread. tiktoken may download
+    it on first use, which must not block the event loop.
+    """
+    global _encoding_loading
+    with _encoding_lock:
+        if _encoding is not None or _encoding_loading or time.monotonic() < _encoding_retry_at:
+            return
+        _encoding_loading = True
+    threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True).start()
+
+def _get_encoding():
+    """
+    Gets the tiktoken encoding, or None while it is loading or after a failed load
+    (counts are estimated meanwhile). Failed loads are retried with backoff.
+    """
+    if _encoding is None:
+        preload_encoding()
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Tokens of a text (about 4 characters per token when tiktoken is unavailable)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _content_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return json.dumps(content) if content is not None else ""
+
+def count_message_tokens(message: Dict) -> int:
+    """Tokens of a chat message, including its role and the per-message overhead."""
+    tokens = TOKENS_PER_MESSAGE + count_tokens(message.get("role", "")) + count_tokens(_content_text(message.get("content")))
+    if message.get("name"):
+        tokens += 1 + count_tokens(message["name"])
+    return tokens
+
+def count_prompt_tokens(messages: List[Dict]) -> int:
+    """Tokens of a whole chat prompt."""
+    return sum(count_message_tokens(message) for message in messages) + TOKENS_PER_REPLY
+
+def trim_history(history: List[Dict], budget: int) -> Tuple[List[Dict], List[Dict], int]:
+    """
+    Keeps the newest messages that fit in the budget.
+
+    Args:
+        history (List[Dict]): Chat messages, oldest first
+        budget (int): Token budget (<= 0 keeps everything)
+
+    Returns:
+        tuple: (kept messages, trimmed older messages, tokens of the kept messages)
+    """
+    counts = [count_message_tokens(message) for message in history]
+    if budget <= 0:
+        return list(history), [], sum(counts)
+
+    used = 0
+    start = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        if used + counts[index] > budget:
+            break
+        used += counts[index]
+        start = index
+
+    # Do not start the kept window with an assistant reply to a trimmed question
+    while start < len(history) and history[start].get("role") == "assistant":
+        used -= counts[start]
+        start += 1
+
+    return list(history[start:]), list(history[:start]), used
+
+def _get_summary_cache(settings: Dict) -> MemoryCache:
+    global _summary_cache
+    if _summary_cache is None:
+        _summary_cache = MemoryCache(max_entries=settings["summary_cache_size"])
+    return _summary_cache
+
+def _prefix_hashes(messages: List[Dict]) -> List[str]:
+    """Chained hash of every prefix, so a longer trimmed history can reuse a shorter one's summary."""
+    hashes = []
+    digest = b""
+    for message in messages:
+        payload = json.dumps({"role": message.get("role"), "content": message.get("content")}, sort_keys=True)
+        digest = hashlib.sha256(digest + payload.encode("utf-8")).digest()
+        hashes.append(digest.hex())
+    return hashes
+
+async def summarize_trimmed(client, deployment: str, trimmed: List[Dict]) -> Optional[str]:
+    """
+    Summary of the trimmed turns, cached by their content. When a previous request
+    already summarized the first part of them, only the newly trimmed turns are folded in.
+
+    Args:
+        client: AsyncAzureOpenAI client
+        deployment (str): Deployment used to summarize
+        trimmed (List[Dict]): Messages removed from the history, oldest first
+
+    Returns:
+        Optional[str]: The summary, or None when there is nothing to summarize or it failed
+    """
+    if not trimmed:
+        return None
+
+    settings = get_budget_settings()
+    cache = _get_summary_cache(settings)
+    hashes = _prefix_hashes(trimmed)
+
+    cached = cache.get(hashes[-1])
+    if cached is not None:
+        return cached
+
+    # Longest already summarized prefix
+    previous_summary, start = "", 0
+    for index in range(len(hashes) - 2, -1, -1):
+        summary = cache.get(hashes[index])
+        if summary is not None:
+            previous_summary, start = summary, index + 1
+            break
+
+    transcript = "\n".join(f"{message.get('role')}: {_content_text(message.get('content'))}" for message in trimmed[start:])
+    try:
+        response = await client.chat.completions.create(
+            model=deployment,
+            temperature=0,
+            max_tokens=settings["summary_max_tokens"],
+            messages=[
+                {"role": "system", "content": "Summarize the earlier part of this chat so the conversation can continue without it. Keep the questions asked, the facts and figures given and any decisions or preferences stated. Be concise."},
+                {"role": "user", "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nMessages to add:\n{transcript}"}
+            ]
+        )
+        summary = response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Error summarizing chat history: {str(e)}")
+        return None
+
+    if summary:
+        cache.set(hashes[-1], summary)
+    return summary
+
+async def fit_history(client, deployment: str, system_message: str, history: List[Dict], input_user: str) -> Tuple[List[Dict], Dict]:
+    """
+    Builds the chat prompt with the history trimmed to CHAT_HISTORY_TOKEN_BUDGET.
+
+    Args:
+        client: AsyncAzureOpenAI client (used only to summarize trimmed turns)
+        deployment (str): Deployment used to summarize
+        system_message (str): System prompt
+        history (List[Dict]): messageHistory, oldest first
+        input_user (str): New user message
+
+    Returns:
+        tuple: (messages to send, token counts)
+    """
+    settings = get_budget_settings()
+    kept, trimmed, history_tokens = trim_history(history, settings["budget"])
+
+    summary = None
+    if trimmed and settings["summary_enabled"]:
+        summary = await summarize_trimmed(client, deployment, trimmed)
+
+    messages = [{"role": "system", "content": system_message}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    messages += kept
+    messages.append({"role": "user", "content": input_user})
+
+    counts = {
+        "prompt_tokens": count_prompt_tokens(messages),
+        "system_tokens": count_message_tokens(messages[0]),
+        "history_tokens": history_tokens,
+        "summary_tokens": count_message_tokens(messages[1]) if summary else 0,
+        "input_tokens": count_message_tokens(messages[-1]),
+        "history_budget": settings["budget"],
+        "history_messages": len(kept),
+        "trimmed_messages": len(trimmed),
+        "estimated": _get_encoding() is None,
+    }
+    return messages, counts
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import contextlib
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from memory_cache import MemoryCache
+from db_connection import get_shared_db_connection, get_lock_connection
+from metrics import histogram, observe
+
+logger = logging.getLogger(__name__)
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS interview_turn_results (
+        key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        result TEXT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        expires_at TIMESTAMPTZ NOT NULL
+    )
+"""
+
+UPSERT_SQL = """
+    INSERT INTO interview_turn_results (key, fingerprint, result, expires_at)
+    VALUES (%s, %s, %s, now() + make_interval(secs => %s))
+    ON CONFLICT (key) DO UPDATE
+    SET fingerprint = EXCLUDED.fingerprint, result = EXCLUDED.result,
+        created_at = now(), expires_at = EXCLUDED.expires_at
+"""
+
+SELECT_SQL = "SELECT fingerprint, result FROM interview_turn_results WHERE key = %s AND expires_at > now()"
+
+DELETE_EXPIRED_SQL = "DELETE FROM interview_turn_results WHERE expires_at <= now()"
+
+# Session advisory locks, all held on the one lock connection of the instance
+# (turns of a thread already queue in memory, so it never takes a lock twice).
+# PostgreSQL releases them if the connection is lost.
+TRY_LOCK_SQL = "SELECT pg_try_advisory_lock(%s) AS locked"
+UNLOCK_SQL = "SELECT pg_advisory_unlock(%s)"
+
+# Seconds between attempts to take a lock held by another instance, doubled up to the max
+LOCK_POLL_MIN = 0.05
+LOCK_POLL_MAX = 1.0
+
+turn_guard_stats = {
+    "replayed": 0,
+    "joined_in_flight": 0,
+    "conflicts": 0,
+    "stores": 0,
+    "lock_waits": 0,
+    "lock_timeouts": 0,
+}
+
+lock_wait = histogram("interview_turn_lock_wait_seconds", "Time interview turns waited for their thread lock", ("backend",))
+
+_memory_tier = None
+_postgres_ready = False
+_in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}  # key -> (fingerprint, result future)
+_thread_locks: Dict[str, list] = {}  # thread_id -> [lock, users]
+_state_loop = None
+
+def get_turn_guard_settings() -> Dict:
+    """
+    Interview turn settings read from the environment:
+        IDEMPOTENCY_ENABLED (reuse the result of a turn sent again with the same key, default true)
+        IDEMPOTENCY_TTL (seconds a turn result is kept for retries, default 600)
+        IDEMPOTENCY_CACHE_SIZE (turn results kept in memory, default 1024)
+        IDEMPOTENCY_POSTGRES (also keep turn results in Postgres, so a retry that reaches
+            another instance is answered too, default false)
+        THREAD_LOCK_BACKEND ("memory" serializes the turns of a thread within the instance,
+            "postgres" also across instances with an advisory lock, default memory)
+        THREAD_LOCK_TIMEOUT (seconds a turn waits for the previous one of its thread, default 120)
+    """
+    return {
+        "enabled": os.getenv("IDEMPOTENCY_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "ttl": float(os.getenv("IDEMPOTENCY_TTL", "600")),
+        "cache_size": int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024")),
+        "postgres": os.getenv("IDEMPOTENCY_POSTGRES", "false").lower() in ("1", "true", "yes"),
+        "lock_backend": os.getenv("THREAD_LOCK_BACKEND", "memory").lower(),
+        "lock_timeout": float(os.getenv("THREAD_LOCK_TIMEOUT", "120")),
+    }
+
+def _get_memory_tier(settings: Dict) -> MemoryCache:
+    global _memory_tier
+    if _memory_tier is None:
+        _memory_tier = MemoryCache(
+            max_entries=settings["cache_size"],
+            ttl=settings["ttl"],
+        )
+    return _memory_tier
+
+def _check_loop():
+    global _state_loop
+    loop = asyncio.get_running_loop()
+    if _state_loop is not loop:
+        # Locks and futures are bound to their loop, start over if it changed
+        _in_flight.clear()
+        _thread_locks.clear()
+        _state_loop = loop
+
+def turn_key(thread_id: str, idempotency_key: str) -> str:
+    """Result key of a turn; client keys only need to be unique within their thread."""
+    return hashlib.sha256(f"{thread_id}\x1f{idempotency_key}".encode("utf-8")).hexdigest()
+
+def request_fingerprint(payload: Dict) -> str:
+    """Hash of the turn input, to tell a retry from a different turn sent with a reused key."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _advisory_lock_id(thread_id: str) -> int:
+    # pg_advisory_xact_lock takes a signed bigint
+    digest = hashlib.sha256(f"interview_turn\x1f{thread_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+async def _ensure_table(pool):
+    global _postgres_ready
+    if not _postgres_ready:
+        async with pool.connection() as conn:
+            await conn.execute(CREATE_TABLE_SQL)
+        _postgres_ready = True
+
+def check_idempotency_key(thread_id: str, idempotency_key: str, fingerprint: str) -> bool:
+    """
+    Checks that a key is not already used by a different turn of the thread
+    (stored or in flight on this instance).
+
+    Returns:
+        bool: False when the key was reused for another request
+    """
+    settings = get_turn_guard_settings()
+    if not settings["enabled"] or not idempotency_key:
+        return True
+
+    key = turn_key(thread_id, idempotency_key)
+    entry = _get_memory_tier(settings).get(key)
+    in_flight = _in_flight.get(key)
+    known = entry[0] if entry is not None else in_flight[0] if in_flight is not None else None
+    if known is not None and known != fingerprint:
+        turn_guard_stats["conflicts"] += 1
+        return False
+    return True
+
+async def _get_stored_result(key: str, fingerprint: str, settings: Dict) -> Optional[Dict]:
+    entry = _get_memory_tier(settings).get(key)
+    if entry is None and settings["postgres"]:
+        try:
+            _, pool = await get_shared_db_connection()
+            await _ensure_table(pool)
+            async with pool.connection() as conn:
+                row = await (await conn.execute(SELECT_SQL, (key,))).fetchone()
+            if row is not None:
+                entry = (row["fingerprint"], row["result"])
+                _get_memory_tier(settings).set(key, entry)
+        except Exception as e:
+            logger.error(f"Error reading turn result: {str(e)}")
+
+    if entry is None or entry[0] != fingerprint:
+        return None
+    return json.loads(entry[1])
+
+async def _store_result(key: str, fingerprint: str, result: Dict, settings: Dict):
+    entry = (fingerprint, json.dumps(result, ensure_ascii=False))
+    _get_memory_tier(settings).set(key, entry)
+    turn_guard_stats["stores"] += 1
+
+    if settings["postgres"]:
+        try:
+            _, pool = await get_shared_db_connection()
+            await _ensure_table(pool)
+            async with pool.connection() as conn:
+                await conn.execute(UPSERT_SQL, (key, entry[0], entry[1], settings["ttl"]))
+                # Clean up now and then rather than on every turn
+                if turn_guard_stats["stores"] % 50 == 1:
+                    await conn.execute(DELETE_EXPIRED_SQL)
+        except Exception as e:
+            logger.error(f"Error writing turn result: {str(e)}")
+
+@contextlib.asynccontextmanager
+async def thread_lock(thread_id: str):
+    """
+    Runs the block while holding the lock of a thread, so two turns never update
+    the same checkpoint at once. Turns of the instance queue on an asyncio.Lock;
+    with THREAD_LOCK_BACKEND=postgres the holder also takes an advisory lock on
+    the dedicated lock connection, retrying while another instance holds it.
+
+    Raises:
+        TimeoutError: the previous turn did not finish within THREAD_LOCK_TIMEOUT
+    """
+    settings = get_turn_guard_settings()
+    _check_loop()
+    holder = _thread_locks.setdefault(thread_id, [asyncio.Lock(), 0])
+    holder[1] += 1
+    start = time.perf_counter()
+    try:
+        if holder[1] > 1:
+            # Another turn of the thread holds the lock or is queued before this one
+            turn_guard_stats["lock_waits"] += 1
+        try:
+            await asyncio.wait_for(holder[0].acquire(), settings["lock_timeout"])
+        except TimeoutError:
+            turn_guard_stats["lock_timeouts"] += 1
+            raise
+
+        try:
+            if settings["lock_backend"] != "postgres":
+                observe(lock_wait, time.perf_counter() - start, backend="memory")
+                yield
+                return
+
+            conn = await get_lock_connection()
+            lock_id = _advisory_lock_id(thread_id)
+            delay = LOCK_POLL_MIN
+            while not (await (await conn.execute(TRY_LOCK_SQL, (lock_id,))).fetchone())["locked"]:
+                remaining = settings["lock_timeout"] - (time.perf_counter() - start)
+                if remaining <= 0:
+                    turn_guard_stats["lock_timeouts"] += 1
+                    raise TimeoutError(f"Thread {thread_id} is locked by another instance")
+                if delay == LOCK_POLL_MIN:
+                    turn_guard_stats["lock_waits"] += 1
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, LOCK_POLL_MAX)
+            observe(lock_wait, time.perf_counter() - start, backend="postgres")
+            try:
+                yield
+            finally:
+                try:
+                    await conn.execute(UNLOCK_SQL, (lock_id,))
+                except Exception as e:
+                    # A lost connection has already released the lock
+                    logger.error(f"Error releasing thread lock: {str(e)}")
+        finally:
+            holder[0].release()
+    finally:
+        holder[1] -= 1
+        if holder[1] == 0 and _thread_locks.get(thread_id) is holder:
+            del _thread_locks[thread_id]
+
+async def guarded_turn(thread_id: str, idempotency_key: Optional[str], fingerprint: str,
+                       run_turn: Callable[[], AsyncIterator[Tuple[str, Dict]]]) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Runs an interview turn under its thread lock and makes it idempotent.
+
+    A turn sent again with the same idempotency key while the first one is running
+    waits for it and gets its result, and once it has finished the stored result is
+    returned for IDEMPOTENCY_TTL seconds; either way no LLM call is repeated. Only
+    successful turns are kept, so retrying a failed turn runs it again.
+
+    Args:
+        thread_id (str): Interview thread ID
+        idempotency_key (Optional[str]): Client key of the turn, None to only serialize it
+        fingerprint (str): request_fingerprint of the turn input
+        run_turn: Callable returning the (event, data) stream of the turn, as
+            stream_interview_async does
+
+    Yields:
+        tuple: the events of run_turn, or a single "final" event when the result is reused
+    """
+    settings = get_turn_guard_settings()
+    if not settings["enabled"] or not idempotency_key:
+        async with thread_lock(thread_id):
+            async for item in run_turn():
+                yield item
+        return
+
+    _check_loop()
+    key = turn_key(thread_id, idempotency_key)
+    while True:
+        result = await _get_stored_result(key, fingerprint, settings)
+        if result is not None:
+            turn_guard_stats["replayed"] += 1
+            yield "final", result
+            return
+
+        in_flight = _in_flight.get(key)
+        if in_flight is None:
+            break
+        turn_guard_stats["joined_in_flight"] += 1
+        # Does not raise when the first turn fails, it is run again below
+        await asyncio.wait({in_flight[1]})
+        if not in_flight[1].cancelled() and in_flight[1].result() is not None:
+            turn_guard_stats["replayed"] += 1
+            yield "final", in_flight[1].result()
+            return
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = (fingerprint, future)
+    try:
+        async with thread_lock(thread_id):
+            # Finished by another instance while this one waited for the lock
+            result = await _get_stored_result(key, fingerprint, settings)
+            if result is not None:
+                turn_guard_stats["replayed"] += 1
+                future.set_result(result)
+                yield "final", result
+                return
+
+            final = None
+            async for event, data in run_turn():
+                if event == "final" and data.get("status") == "success":
+                    final = data
+                yield event, data
+
+        if final is not None:
+            await _store_result(key, fingerprint, final, settings)
+        future.set_result(final)
+    finally:
+        if not future.done():
+            # Interrupted, waiting duplicates run the turn themselves
+            future.cancel()
+        if _in_flight.get(key, (None, None))[1] is future:
+            del _in_flight[key]
+
+def get_turn_guard_stats() -> Dict:
+    """
+    Gets idempotency and thread lock counters.
+    """
+    return {
+        **turn_guard_stats,
+        "in_flight": len(_in_flight),
+        "locked_threads": len(_thread_locks),
+        "memory_entries": len(_memory_tier) if _memory_tier is not None else 0
+    }